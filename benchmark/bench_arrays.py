@@ -0,0 +1,47 @@
+"""Compares tracing time and payload size, with and without binary array capture.
+
+Numpy arrays used to be encoded by jsonpickle as the JSON text of their values. They
+are now captured as their raw buffer, and sent as a msgpack extension type, see
+arrays.py.
+
+Usage: python -m benchmark.bench_arrays
+"""
+
+from unittest import mock
+
+from cyberbrain import arrays
+
+from .bench_deltas import _payload_size
+from .utils import best_of, trace_call
+from .workloads import linear_regression
+
+REPEAT = 3
+
+
+def _trace_call(func, args, legacy: bool):
+    if not legacy:
+        return trace_call(func, args)
+    with mock.patch.object(arrays, "capture", return_value=None):
+        return trace_call(func, args)
+
+
+def main():
+    print(
+        f"{'workload':<24}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for num_epochs in (10, 100):
+        args = (num_epochs,)
+        before_size = _payload_size(_trace_call(linear_regression, args, legacy=True))
+        after_size = _payload_size(_trace_call(linear_regression, args, legacy=False))
+        before = best_of(REPEAT, _trace_call, linear_regression, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, linear_regression, args, legacy=False)
+        print(
+            f"{f'linear_regression_{num_epochs}':<24}"
+            f"{before_size / 1024:>13.1f}{after_size / 1024:>12.1f}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
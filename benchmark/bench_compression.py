@@ -0,0 +1,49 @@
+"""Compares compression ratio and time of frame payloads, for several codecs.
+
+send_frame used to post raw msgpack. Bodies are now compressed with zlib, at the
+level given by rpc_client.compression_level. lzma is shown for comparison only, since
+the RPC server (Node's zlib) can't decompress it.
+
+Usage: python -m benchmark.bench_compression
+"""
+
+import lzma
+import zlib
+
+from cyberbrain import rpc_client
+
+from .utils import best_of, trace_call
+from .workloads import WORKLOADS, large_values, method_calls
+
+REPEAT = 3
+CODECS = {
+    "zlib-1": lambda body: zlib.compress(body, 1),
+    "zlib-6": lambda body: zlib.compress(body, 6),
+    "zlib-9": lambda body: zlib.compress(body, 9),
+    "lzma-0": lambda body: lzma.compress(body, preset=0),
+    "chosen": lambda body: zlib.compress(body, rpc_client.compression_level(len(body))),
+}
+
+
+def main():
+    workloads = dict(
+        WORKLOADS,
+        method_calls_1000=(method_calls, (1000,)),
+        large_values_10000=(large_values, (10_000,)),
+    )
+    print(
+        f"{'workload':<20}{'raw (KB)':>10}"
+        + "".join(f"{name + ' (x, ms)':>22}" for name in CODECS)
+    )
+    for name, (func, args) in workloads.items():
+        body = rpc_client.encode_frame(trace_call(func, args).frame)
+        row = f"{name:<20}{len(body) / 1024:>10.1f}"
+        for compress in CODECS.values():
+            ratio = len(body) / len(compress(body))
+            duration = best_of(REPEAT, compress, body)
+            row += f"{ratio:>14.1f}{duration * 1000:>8.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
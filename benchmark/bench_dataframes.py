@@ -0,0 +1,61 @@
+"""Compares capture time and payload size of DataFrames, by column or with jsonpickle.
+
+DataFrames used to be encoded by the jsonpickle Pandas handler, as the CSV text of
+their rows nested in JSON, which is then cut by the encoding limits. They are now
+captured column by column, and sampled to fit in the budget of a value, see
+dataframes.py.
+
+Usage: python -m benchmark.bench_dataframes
+"""
+
+import msgpack
+import numpy as np
+import pandas as pd
+
+from cyberbrain import EncodingLimits, dataframes, utils
+
+from .utils import best_of
+
+REPEAT = 3
+LIMITS = EncodingLimits()
+
+
+def _make_frame(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "id": np.arange(num_rows),
+            "price": rng.random(num_rows),
+            "quantity": rng.integers(1, 10, num_rows),
+            "in_stock": rng.random(num_rows) > 0.5,
+            "name": [f"item{i}" for i in range(num_rows)],
+        }
+    )
+
+
+def _legacy_capture(frame):
+    return msgpack.packb(utils.to_json(frame, LIMITS.max_value_bytes, LIMITS.max_depth))
+
+
+def _capture(frame):
+    return msgpack.packb(dataframes.capture(frame, LIMITS.max_value_bytes).to_ext())
+
+
+def main():
+    print(
+        f"{'rows':<12}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for num_rows in (1_000, 10_000, 1_000_000):
+        frame = _make_frame(num_rows)
+        before = best_of(REPEAT, _legacy_capture, frame)
+        after = best_of(REPEAT, _capture, frame)
+        print(
+            f"{num_rows:<12}{len(_legacy_capture(frame)) / 1024:>13.1f}"
+            f"{len(_capture(frame)) / 1024:>12.1f}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
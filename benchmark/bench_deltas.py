@@ -0,0 +1,51 @@
+"""Compares the size of events sent to the RPC server, with and without deltas.
+
+When a container grows by one element per loop iteration, every Mutation event used
+to store its full value, so the payload grows quadratically. With keyframe_interval
+set, most mutations store a delta against the previous value instead, see delta.py.
+
+Usage: python -m benchmark.bench_deltas
+"""
+
+from cyberbrain import rpc_client
+
+from .utils import best_of, trace_call
+from .workloads import WORKLOADS, method_calls
+
+REPEAT = 3
+KEYFRAME_INTERVAL = 50
+
+
+def _payload_size(tracer) -> int:
+    """Returns the number of bytes send_frame would send for the traced frame."""
+    return len(rpc_client.encode_frame(tracer.frame))
+
+
+def main():
+    workloads = dict(
+        WORKLOADS,
+        method_calls_100=(method_calls, (100,)),
+        method_calls_1000=(method_calls, (1000,)),
+        method_calls_3000=(method_calls, (3000,)),
+    )
+    print(
+        f"{'workload':<18}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for name, (func, args) in workloads.items():
+        before_size = _payload_size(trace_call(func, args))
+        after_size = _payload_size(
+            trace_call(func, args, keyframe_interval=KEYFRAME_INTERVAL)
+        )
+        before = best_of(REPEAT, trace_call, func, args)
+        after = best_of(
+            REPEAT, trace_call, func, args, keyframe_interval=KEYFRAME_INTERVAL
+        )
+        print(
+            f"{name:<18}{before_size / 1024:>13.1f}{after_size / 1024:>12.1f}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
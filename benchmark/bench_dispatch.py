@@ -0,0 +1,73 @@
+"""Compares opcodes/sec of the opcode dispatch table against the previous dispatch.
+
+The previous implementation looked up handlers by name and built handler arguments
+from their signature on every instruction. It's reproduced here as the baseline.
+
+Usage: python -m benchmark.bench_dispatch
+"""
+
+import inspect
+
+from cyberbrain import value_stack
+
+from .utils import best_of, count_executed_instructions, trace_call
+from .workloads import WORKLOADS
+
+REPEAT = 5
+
+
+def _legacy_emit_event_and_update_stack(
+    self, instr, frame, jumped, exc_info, snapshot, lineno
+):
+    self.snapshot = snapshot
+    opname = instr.opname
+    self.last_starts_line = lineno
+
+    if opname.startswith("BINARY") or opname.startswith("INPLACE"):
+        handler = self._BINARY_operation_handler
+    else:
+        handler = getattr(self, f"_{opname}_handler")
+
+    cache = self.__dict__.setdefault("handler_signature_cache", {})
+    try:
+        parameters = cache[opname]
+    except KeyError:
+        parameters = set(inspect.signature(handler).parameters)
+        cache[opname] = parameters
+
+    return handler(
+        *[
+            arg
+            for param_name, arg in {
+                "instr": instr,
+                "jumped": jumped,
+                "frame": frame,
+                "exc_info": exc_info,
+            }.items()
+            if param_name in parameters
+        ]
+    )
+
+
+def main():
+    dispatch = value_stack.BaseValueStack.emit_event_and_update_stack
+    print(f"{'workload':<12}{'opcodes':>10}{'before (op/s)':>16}{'after (op/s)':>16}")
+    for name, (func, args) in WORKLOADS.items():
+        opcodes = count_executed_instructions(func, args)
+
+        value_stack.BaseValueStack.emit_event_and_update_stack = (
+            _legacy_emit_event_and_update_stack
+        )
+        try:
+            before = best_of(REPEAT, trace_call, func, args)
+        finally:
+            value_stack.BaseValueStack.emit_event_and_update_stack = dispatch
+        after = best_of(REPEAT, trace_call, func, args)
+
+        print(
+            f"{name:<12}{opcodes:>10}{opcodes / before:>16,.0f}{opcodes / after:>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
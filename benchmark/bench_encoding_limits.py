@@ -0,0 +1,52 @@
+"""Compares tracing time and payload size, with and without encoding limits.
+
+Values used to be encoded in full no matter their size, so tracing code that handles
+large values (e.g. datasets and models) took time and memory proportional to their
+size for every event. With limits, values are encoded partially once they reach
+max_value_bytes, see utils.EncodingLimits. The previous to_json is reproduced in
+bench_to_json as the baseline.
+
+Usage: python -m benchmark.bench_encoding_limits
+"""
+
+from cyberbrain import EncodingLimits, utils
+
+from .bench_deltas import _payload_size
+from .bench_to_json import _legacy_to_json
+from .utils import best_of, trace_call
+from .workloads import large_values
+
+REPEAT = 3
+LIMITS = EncodingLimits(max_value_bytes=100_000)
+
+
+def _trace_call(func, args, legacy: bool):
+    original = utils.to_json
+    if legacy:
+        utils.to_json = _legacy_to_json
+    try:
+        return trace_call(func, args, limits=LIMITS)
+    finally:
+        utils.to_json = original
+
+
+def main():
+    print(
+        f"{'workload':<22}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for num_items in (10_000, 100_000, 300_000):
+        args = (num_items,)
+        before_size = _payload_size(_trace_call(large_values, args, legacy=True))
+        after_size = _payload_size(_trace_call(large_values, args, legacy=False))
+        before = best_of(REPEAT, _trace_call, large_values, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, large_values, args, legacy=False)
+        print(
+            f"{f'large_values_{num_items}':<22}"
+            f"{before_size / 1024:>13.1f}{after_size / 1024:>12.1f}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compares how many times frame locals are materialized, with and without FrameView.
+
+Every read of frame.f_locals copies all fast locals into a dict. Previously, a
+single instruction could read it several times, now it's read at most once per
+event, see utils.FrameView. The previous lookup functions are reproduced here as the
+baseline.
+
+Usage: python -m benchmark.bench_frame_view
+"""
+
+from cyberbrain import utils
+
+from .utils import best_of, count_executed_instructions, trace_call
+from .workloads import WORKLOADS, make_many_locals_function
+
+REPEAT = 5
+
+
+class _CountingFrameView(utils.FrameView):
+    """FrameView that counts how many times f_locals is materialized."""
+
+    __slots__ = []
+    materializations = 0
+
+    @property
+    def f_locals(self):
+        if self._locals is None:
+            _CountingFrameView.materializations += 1
+            self._locals = self.frame.f_locals
+        return self._locals
+
+
+class _LegacyFrameView(utils.FrameView):
+    """Materializes f_locals on every read, like the frame itself."""
+
+    __slots__ = []
+
+    @property
+    def f_locals(self):
+        _CountingFrameView.materializations += 1
+        return self.frame.f_locals
+
+
+def _legacy_get_value_from_frame(name, frame):
+    assert _legacy_name_exist_in_frame(name, frame)
+    if name in frame.f_locals:
+        return frame.f_locals[name]
+    elif name in frame.f_globals:
+        return frame.f_globals[name]
+    else:
+        return frame.f_builtins[name]
+
+
+def _legacy_name_exist_in_frame(name, frame):
+    return any(
+        [name in frame.f_locals, name in frame.f_globals, name in frame.f_builtins]
+    )
+
+
+def _trace_call(func, args, legacy: bool):
+    """Traces func, returns the number of times f_locals is materialized."""
+    originals = (
+        utils.FrameView,
+        utils.get_value_from_frame,
+        utils.name_exist_in_frame,
+    )
+    if legacy:
+        utils.FrameView = _LegacyFrameView
+        utils.get_value_from_frame = _legacy_get_value_from_frame
+        utils.name_exist_in_frame = _legacy_name_exist_in_frame
+    else:
+        utils.FrameView = _CountingFrameView
+    _CountingFrameView.materializations = 0
+    try:
+        trace_call(func, args)
+    finally:
+        (
+            utils.FrameView,
+            utils.get_value_from_frame,
+            utils.name_exist_in_frame,
+        ) = originals
+    return _CountingFrameView.materializations
+
+
+def main():
+    workloads = dict(
+        WORKLOADS,
+        many_locals_10=(make_many_locals_function(10), (1000,)),
+        many_locals_200=(make_many_locals_function(200), (1000,)),
+    )
+    print(
+        f"{'workload':<16}{'opcodes':>10}{'before (dicts)':>16}{'after (dicts)':>16}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for name, (func, args) in workloads.items():
+        opcodes = count_executed_instructions(func, args)
+        before_count = _trace_call(func, args, legacy=True)
+        after_count = _trace_call(func, args, legacy=False)
+        before = best_of(REPEAT, _trace_call, func, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, func, args, legacy=False)
+        print(
+            f"{name:<16}{opcodes:>10}{before_count:>16}{after_count:>16}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
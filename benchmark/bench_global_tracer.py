@@ -0,0 +1,48 @@
+"""Compares the time to trace a function that mostly runs library code.
+
+While tracing, the global trace function is called for every function call in the
+process, even though only the traced frame is traced. Now it's replaced with a C function as soon
+as the traced frame is found, see tracer._skip_call. The previous global trace
+function is reproduced here as the baseline.
+
+Usage: python -m benchmark.bench_global_tracer
+"""
+
+import sys
+
+from cyberbrain.tracer import SETTRACE_BACKEND
+
+from .utils import best_of, trace_call
+from .workloads import library_calls
+
+REPEAT = 5
+
+# `cyberbrain.tracer` is shadowed by the tracer instance of the same name.
+_tracer_module = sys.modules["cyberbrain.tracer"]
+
+
+def _legacy_global_tracer(raw_frame, event, arg):
+    """Does what the previous global tracer did for calls of other functions."""
+    if event == "call" and id(raw_frame.f_code) == -1:
+        return None
+
+
+def main():
+    args = (3000,)
+    skip_call = _tracer_module._skip_call
+    _tracer_module._skip_call = _legacy_global_tracer
+    try:
+        before = best_of(
+            REPEAT, trace_call, library_calls, args, backend=SETTRACE_BACKEND
+        )
+    finally:
+        _tracer_module._skip_call = skip_call
+    after = best_of(REPEAT, trace_call, library_calls, args, backend=SETTRACE_BACKEND)
+    untraced = best_of(REPEAT, library_calls, *args)
+
+    print(f"{'untraced (ms)':>14}{'before (ms)':>14}{'after (ms)':>14}")
+    print(f"{untraced * 1000:>14.2f}{before * 1000:>14.2f}{after * 1000:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
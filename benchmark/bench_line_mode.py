@@ -0,0 +1,25 @@
+"""Compares the time to trace workloads in opcode mode and in line mode.
+
+Usage: python -m benchmark.bench_line_mode
+"""
+
+from .utils import best_of, trace_call
+from .workloads import WORKLOADS, make_long_function
+
+REPEAT = 5
+
+
+def main():
+    workloads = dict(WORKLOADS, long_function=(make_long_function(1000), (1,)))
+    print(f"{'workload':<14}{'opcode (ms)':>14}{'line (ms)':>14}{'speedup':>10}")
+    for name, (func, args) in workloads.items():
+        opcode = best_of(REPEAT, trace_call, func, args)
+        line = best_of(REPEAT, trace_call, func, args, mode="line")
+        print(
+            f"{name:<14}{opcode * 1000:>14.2f}{line * 1000:>14.2f}"
+            f"{opcode / line:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Measures opcodes/sec of tracing functions with thousands of instructions.
+
+Per-instruction information (instruction, lineno, jump target...) is read from the
+columns of CodeInfo on every executed instruction, so the cost of these lookups
+dominates straight-line code like this.
+
+Usage: python -m benchmark.bench_long_function
+"""
+
+import dis
+
+from cyberbrain.code_info import CodeInfo
+
+from .utils import best_of, count_executed_instructions, trace_call
+from .workloads import make_long_function
+
+REPEAT = 5
+SIZES = (200, 1000, 4000)
+
+
+def main():
+    print(
+        f"{'instructions':>12}{'executed':>10}{'analysis (ms)':>16}{'tracing (op/s)':>16}"
+    )
+    for size in SIZES:
+        func = make_long_function(size)
+        num_instructions = len(list(dis.get_instructions(func)))
+        analysis = best_of(REPEAT, CodeInfo, func.__code__)
+        executed = count_executed_instructions(func, (1,))
+        tracing = best_of(REPEAT, trace_call, func, (1,))
+        print(
+            f"{num_instructions:>12}{executed:>10}{analysis * 1000:>16.2f}"
+            f"{executed / tracing:>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compares tracing time with and without the memo of immutable values.
+
+The same immutable values used to be encoded on every event, see memo.py.
+
+Usage: python -m benchmark.bench_memo
+"""
+
+from unittest import mock
+
+from cyberbrain import memo
+
+from .utils import best_of, trace_call
+from .workloads import constant_lookups
+
+REPEAT = 5
+
+
+def _get_without_memo(self, value, kind, compute):
+    return compute(value)
+
+
+def _trace_call(func, args, legacy: bool):
+    if legacy:
+        with mock.patch.object(memo.ValueMemo, "get", _get_without_memo):
+            return trace_call(func, args)
+    return trace_call(func, args)
+
+
+def main():
+    print(f"{'workload':<24}{'before (ms)':>14}{'after (ms)':>14}{'hit rate':>10}")
+    for num_iterations in (100, 1000):
+        args = (num_iterations,)
+        before = best_of(REPEAT, _trace_call, constant_lookups, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, constant_lookups, args, legacy=False)
+        value_memo = _trace_call(constant_lookups, args, legacy=False).frame.value_memo
+        print(
+            f"{f'constant_lookups_{num_iterations}':<24}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+            f"{value_memo.hit_rate:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Compares the time to trace workloads with the settrace and monitoring backends.
+
+The monitoring backend requires Python 3.12+.
+
+Usage: python -m benchmark.bench_monitoring
+"""
+
+import sys
+
+from cyberbrain.tracer import MONITORING_BACKEND, SETTRACE_BACKEND
+
+from .utils import best_of, trace_call
+from .workloads import WORKLOADS, make_long_function
+
+REPEAT = 5
+
+
+def main():
+    if not hasattr(sys, "monitoring"):
+        sys.exit("sys.monitoring is only available since Python 3.12.")
+
+    workloads = dict(WORKLOADS, long_function=(make_long_function(1000), (1,)))
+    print(
+        f"{'workload':<14}{'settrace (ms)':>16}{'monitoring (ms)':>18}{'speedup':>10}"
+    )
+    for name, (func, args) in workloads.items():
+        settrace = best_of(REPEAT, trace_call, func, args, backend=SETTRACE_BACKEND)
+        monitoring = best_of(REPEAT, trace_call, func, args, backend=MONITORING_BACKEND)
+        print(
+            f"{name:<14}{settrace * 1000:>16.2f}{monitoring * 1000:>18.2f}"
+            f"{settrace / monitoring:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Compares how many values are serialized for mutation detection, with and without
+knowledge about method purity.
+
+Every method call on an identifier used to serialize the identifier's value, and
+compare it with the previous one. Now calls of methods known to be pure, and values
+known to be immutable, are skipped, see purity.py. The baseline treats every method as
+unknown.
+
+Usage: python -m benchmark.bench_purity
+"""
+
+from cyberbrain import frame, purity
+
+from .utils import best_of, count_executed_instructions, trace_call
+from .workloads import WORKLOADS, method_calls
+
+REPEAT = 5
+
+
+class _CountingUtils:
+    """Wraps the utils module used by frame.py, counting serialized values."""
+
+    def __init__(self, utils):
+        self._utils = utils
+        self.serialized = 0
+
+    def to_json(self, value, *args, **kwargs):
+        self.serialized += 1
+        return self._utils.to_json(value, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._utils, name)
+
+
+def _legacy_method_effect(value, method):
+    return purity.Effect.UNKNOWN
+
+
+def _legacy_is_immutable(value):
+    return False
+
+
+def _trace_call(func, args, legacy: bool):
+    """Traces func, returns the number of values serialized."""
+    originals = (frame.utils, purity.method_effect, purity.is_immutable)
+    frame.utils = counting_utils = _CountingUtils(frame.utils)
+    if legacy:
+        purity.method_effect = _legacy_method_effect
+        purity.is_immutable = _legacy_is_immutable
+    try:
+        trace_call(func, args)
+    finally:
+        frame.utils, purity.method_effect, purity.is_immutable = originals
+    return counting_utils.serialized
+
+
+def main():
+    workloads = dict(
+        WORKLOADS,
+        method_calls_100=(method_calls, (100,)),
+        method_calls_1000=(method_calls, (1000,)),
+    )
+    print(
+        f"{'workload':<18}{'opcodes':>10}{'before (json)':>15}{'after (json)':>14}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for name, (func, args) in workloads.items():
+        opcodes = count_executed_instructions(func, args)
+        before_count = _trace_call(func, args, legacy=True)
+        after_count = _trace_call(func, args, legacy=False)
+        before = best_of(REPEAT, _trace_call, func, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, func, args, legacy=False)
+        print(
+            f"{name:<18}{opcodes:>10}{before_count:>15}{after_count:>14}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compares the time the traced program is blocked sending frames to the RPC server.
+
+send_frame used to encode the frame and post it with a new connection on the calling
+thread. It now queues the frame for a background thread, see RpcClient.
+
+Usage: python -m benchmark.bench_rpc_client
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from cyberbrain import rpc_client
+
+from .utils import trace_call
+from .workloads import method_calls
+
+NUM_FRAMES = 20
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _send_synchronously(client, frame):
+    requests.post(
+        f"http://localhost:{client.port}/frame",
+        data=rpc_client.encode_frame(frame),
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+
+def _blocked_time(client, frame, legacy: bool):
+    """Returns the seconds spent sending NUM_FRAMES frames, and waiting for them."""
+    start = time.perf_counter()
+    for _ in range(NUM_FRAMES):
+        if legacy:
+            _send_synchronously(client, frame)
+        else:
+            client.send_frame(frame)
+    blocked = time.perf_counter() - start
+    client.wait_for_flush()
+    return blocked, time.perf_counter() - start
+
+
+def main():
+    server = ThreadingHTTPServer(("localhost", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = rpc_client.RpcClient(rpc_server_port=server.server_address[1])
+
+    print(
+        f"{'workload':<20}{'before (ms)':>14}{'after (ms)':>14}"
+        f"{'before total':>15}{'after total':>15}"
+    )
+    for num_items in (100, 1000):
+        frame = trace_call(method_calls, (num_items,)).frame
+        before, before_total = _blocked_time(client, frame, legacy=True)
+        after, after_total = _blocked_time(client, frame, legacy=False)
+        print(
+            f"{f'method_calls_{num_items}':<20}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+            f"{before_total * 1000:>15.2f}{after_total * 1000:>15.2f}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Compares opcodes/sec with and without applying combined stack effects of runs.
+
+Usage: python -m benchmark.bench_stack_effect
+"""
+
+from cyberbrain import logger
+
+from .utils import best_of, count_executed_instructions, trace_call
+from .workloads import WORKLOADS, make_long_function
+
+REPEAT = 5
+
+
+def _trace_call_one_by_one(func, args):
+    """Traces func with every instruction handled one by one."""
+    original_init = logger.FrameLogger.__init__
+
+    def __init__(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.applies_stack_effects = False
+
+    logger.FrameLogger.__init__ = __init__
+    try:
+        return trace_call(func, args)
+    finally:
+        logger.FrameLogger.__init__ = original_init
+
+
+def main():
+    workloads = dict(WORKLOADS, long_function=(make_long_function(1000), (1,)))
+    print(f"{'workload':<14}{'opcodes':>10}{'before (op/s)':>16}{'after (op/s)':>16}")
+    for name, (func, args) in workloads.items():
+        opcodes = count_executed_instructions(func, args)
+        before = best_of(REPEAT, _trace_call_one_by_one, func, args)
+        after = best_of(REPEAT, trace_call, func, args)
+        print(
+            f"{name:<14}{opcodes:>10}{opcodes / before:>16,.0f}{opcodes / after:>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Compares peak memory and tracing time, with and without streaming events.
+
+Every event and value of a frame used to stay in memory until tracing stopped. With
+streaming enabled, events are sent in chunks while tracing, and drop their values
+once sent, see rpc_client.FrameStream.
+
+Usage: python -m benchmark.bench_streaming
+"""
+
+import tracemalloc
+
+from cyberbrain import StreamingOptions, rpc_client
+
+from .utils import best_of, create_tracer
+from .workloads import method_calls
+
+REPEAT = 3
+STREAMING = StreamingOptions(max_events=100)
+
+
+def _trace_call(func, args, streaming):
+    """Traces func, and encodes what would be sent, without sending it."""
+    tracer = create_tracer()
+    tracer.rpc_client.send_frame = rpc_client.encode_frame
+    tracer(streaming=streaming)(func)(*args)
+
+
+def _peak_memory(func, args, streaming) -> int:
+    tracemalloc.start()
+    try:
+        _trace_call(func, args, streaming)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    print(
+        f"{'workload':<20}{'before (MB)':>13}{'after (MB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for num_items in (1000, 3000):
+        args = (num_items,)
+        before_peak = _peak_memory(method_calls, args, streaming=None)
+        after_peak = _peak_memory(method_calls, args, streaming=STREAMING)
+        before = best_of(REPEAT, _trace_call, method_calls, args, streaming=None)
+        after = best_of(REPEAT, _trace_call, method_calls, args, streaming=STREAMING)
+        print(
+            f"{f'method_calls_{num_items}':<20}"
+            f"{before_peak / 2**20:>13.1f}{after_peak / 2**20:>12.1f}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
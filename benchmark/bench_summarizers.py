@@ -0,0 +1,54 @@
+"""Compares tracing time and payload size, with and without a summarizer.
+
+Objects like models used to be encoded in full (up to the encoding limits) on every
+event. With a summarizer registered on their class, a few fields are stored instead,
+see summarizers.py.
+
+Usage: python -m benchmark.bench_summarizers
+"""
+
+from unittest import mock
+
+from cyberbrain import register_summarizer, summarizers
+
+from .bench_deltas import _payload_size
+from .utils import best_of, trace_call
+from .workloads import _Model, large_values
+
+REPEAT = 3
+
+
+def _summarize_model(model):
+    return {"layers": len(model.layers), "samples": model.num_samples}
+
+
+def _trace_call(func, args, legacy: bool):
+    if legacy:
+        with mock.patch.object(summarizers, "_registry", {}):
+            summarizers._summarizer_cache.clear()
+            return trace_call(func, args)
+    summarizers._summarizer_cache.clear()
+    return trace_call(func, args)
+
+
+def main():
+    register_summarizer(_Model, _summarize_model)
+    print(
+        f"{'workload':<22}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    for num_items in (10_000, 100_000):
+        args = (num_items,)
+        before_size = _payload_size(_trace_call(large_values, args, legacy=True))
+        after_size = _payload_size(_trace_call(large_values, args, legacy=False))
+        before = best_of(REPEAT, _trace_call, large_values, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, large_values, args, legacy=False)
+        print(
+            f"{f'large_values_{num_items}':<22}"
+            f"{before_size / 1024:>13.1f}{after_size / 1024:>12.1f}"
+            f"{before * 1000:>14.2f}{after * 1000:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Compares events logged per second, with and without the fast path of to_json.
+
+Every value used to be encoded by jsonpickle, even plain ints and strings. Now values
+that only contain builtin types are encoded by ujson directly, see utils.to_json. The
+previous to_json is reproduced here as the baseline.
+
+Usage: python -m benchmark.bench_to_json
+"""
+
+import jsonpickle
+
+from cyberbrain import utils
+
+from .utils import best_of, trace_call
+from .workloads import WORKLOADS, method_calls
+
+REPEAT = 5
+
+
+def _legacy_to_json(python_object, max_bytes=None, max_depth=None):
+    try:
+        if (
+            hasattr(python_object, "__iter__")
+            and hasattr(python_object, "__next__")
+            and iter(python_object) == python_object
+        ):
+            raise Exception("Cannot encode iterators")
+        json = jsonpickle.encode(python_object, unpicklable=False)
+    except:
+        return '{"repr": "%s"}' % utils.get_repr(python_object)
+
+    if json == "null" and python_object is not None:
+        return '{"repr": "%s"}' % utils.get_repr(python_object)
+    else:
+        return json
+
+
+def _trace_call(func, args, legacy: bool):
+    """Traces func, returns the number of events."""
+    original = utils.to_json
+    if legacy:
+        utils.to_json = _legacy_to_json
+    try:
+        return len(trace_call(func, args).events)
+    finally:
+        utils.to_json = original
+
+
+def main():
+    workloads = dict(WORKLOADS, method_calls_1000=(method_calls, (1000,)))
+    print(
+        f"{'workload':<18}{'events':>8}{'before (events/s)':>19}"
+        f"{'after (events/s)':>18}"
+    )
+    for name, (func, args) in workloads.items():
+        num_events = _trace_call(func, args, legacy=False)
+        before = best_of(REPEAT, _trace_call, func, args, legacy=True)
+        after = best_of(REPEAT, _trace_call, func, args, legacy=False)
+        print(
+            f"{name:<18}{num_events:>8}{num_events / before:>19.0f}"
+            f"{num_events / after:>18.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
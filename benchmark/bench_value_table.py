@@ -0,0 +1,72 @@
+"""Compares memory and payload size, with and without the tables of values.
+
+Equal JSON values and reprs (like "0", "true", or an unchanged config) used to be
+stored once per event, in the traced process and in the payload. They're now stored
+once per frame, see Frame._intern and WIRE_VERSION in rpc_client.py.
+
+Usage: python -m benchmark.bench_value_table
+"""
+
+import tracemalloc
+from unittest import mock
+
+import msgpack
+
+from cyberbrain import frame, rpc_client
+
+from .utils import trace_call
+from .workloads import WORKLOADS, constant_lookups, method_calls
+
+
+def _retained_memory(func, args, legacy: bool) -> int:
+    """Returns the memory still allocated once tracing is done, i.e. held by the frame."""
+    tracemalloc.start()
+    try:
+        if legacy:
+            with mock.patch.object(frame.Frame, "_intern", lambda self, text: text):
+                tracer = trace_call(func, args)
+        else:
+            tracer = trace_call(func, args)
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        del tracer
+        tracemalloc.stop()
+
+
+def _payload_sizes(func, args) -> tuple[int, int]:
+    """Returns the size of the payload without and with the table of texts."""
+    body = rpc_client.encode_frame(trace_call(func, args).frame)
+    data = msgpack.unpackb(body)
+    # Puts the texts back in the events, like before.
+    texts, columns = data.pop("texts"), data["events"]
+    columns["value"] = [
+        texts[value] if type(value) is int else value for value in columns["value"]
+    ]
+    columns["repr"] = [
+        None if text is None else texts[text] for text in columns["repr"]
+    ]
+    return len(msgpack.packb(data)), len(body)
+
+
+def main():
+    workloads = dict(
+        WORKLOADS,
+        method_calls_1000=(method_calls, (1000,)),
+        constant_lookups_1000=(constant_lookups, (1000,)),
+    )
+    print(
+        f"{'workload':<20}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (MB)':>14}{'after (MB)':>14}"
+    )
+    for name, (func, args) in workloads.items():
+        before_size, after_size = _payload_sizes(func, args)
+        before_memory = _retained_memory(func, args, legacy=True)
+        after_memory = _retained_memory(func, args, legacy=False)
+        print(
+            f"{name:<20}{before_size / 1024:>13.1f}{after_size / 1024:>12.1f}"
+            f"{before_memory / 2**20:>14.2f}{after_memory / 2**20:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compares payload size and encoding time of the two schemas of frames.
+
+Frames used to be sent as a list of event maps with repeated keys, uuids and
+filenames. They're now sent in a compact, columnar schema, see WIRE_VERSION in
+rpc_client.py. Frames are collected by running the scenarios in test/.
+
+Usage: python -m benchmark.bench_wire_schema
+"""
+
+import contextlib
+import importlib
+import io
+import inspect
+import os
+import sys
+
+from cyberbrain import _TracerFSM, rpc_client, trace
+
+from .utils import best_of
+
+REPEAT = 5
+TEST_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "test")
+# Arguments that test functions can take, which are all fixtures of conftest.py.
+_FIXTURES = {"tracer", "trace", "check_golden_file", "check_tracer_events"}
+
+
+def _reset_tracer():
+    trace.raw_frame = None
+    trace.decorated_function_code_id = None
+    trace.frame_logger = None
+    trace.tracer_state = _TracerFSM.INITIAL
+
+
+def collect_test_frames() -> dict:
+    """Runs the test functions that only use tracing fixtures, returns their frames."""
+    frames = {}
+    trace.rpc_client.send_frame = lambda frame: frames.setdefault(
+        frame.frame_name, frame
+    )
+    sys.path.insert(0, TEST_DIR)
+    for filename in sorted(os.listdir(TEST_DIR)):
+        if not (filename.startswith("test_") and filename.endswith(".py")):
+            continue
+        try:
+            module = importlib.import_module(filename[:-3])
+        except Exception:
+            continue  # E.g. a missing optional dependency.
+        for name, function in list(vars(module).items()):
+            if not name.startswith("test_") or not inspect.isfunction(function):
+                continue
+            parameters = inspect.signature(function).parameters
+            if not set(parameters) <= _FIXTURES:
+                continue
+            try:
+                function(
+                    **{
+                        parameter: trace if parameter in {"tracer", "trace"} else None
+                        for parameter in parameters
+                    }
+                )
+            except Exception:
+                pass
+            _reset_tracer()
+    return frames
+
+
+def main():
+    # Some scenarios print things.
+    with contextlib.redirect_stdout(io.StringIO()):
+        frames = collect_test_frames()
+    print(
+        f"{'scenario':<44}{'before (KB)':>13}{'after (KB)':>12}"
+        f"{'before (ms)':>14}{'after (ms)':>14}"
+    )
+    totals = [0, 0, 0.0, 0.0]
+    for name, frame in sorted(frames.items()):
+        results = (
+            len(rpc_client.encode_frame(frame, version=1)),
+            len(rpc_client.encode_frame(frame, version=2)),
+            best_of(REPEAT, rpc_client.encode_frame, frame, version=1),
+            best_of(REPEAT, rpc_client.encode_frame, frame, version=2),
+        )
+        totals = [total + result for total, result in zip(totals, results)]
+        _print_row(name, *results)
+    _print_row(f"total ({len(frames)} frames)", *totals)
+
+
+def _print_row(name, before_size, after_size, before, after):
+    print(
+        f"{name:<44}{before_size / 1024:>13.1f}{after_size / 1024:>12.1f}"
+        f"{before * 1000:>14.3f}{after * 1000:>14.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
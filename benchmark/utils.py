@@ -0,0 +1,65 @@
+"""Helpers shared by benchmarks."""
+
+import time
+
+from cyberbrain import _Tracer
+from cyberbrain.logger import FrameLogger
+from cyberbrain.tracer import SETTRACE_BACKEND
+
+
+def create_tracer(**kwargs) -> _Tracer:
+    """Creates a new tracer which does not send anything to the RPC server."""
+    tracer = _Tracer(**kwargs)
+    tracer.rpc_client.send_frame = lambda frame: None
+    tracer.rpc_client.send_chunk = lambda chunk: None
+    return tracer
+
+
+def trace_call(
+    func,
+    args=(),
+    kwargs=None,
+    mode="opcode",
+    backend=None,
+    keyframe_interval=None,
+    limits=None,
+):
+    """Calls func with a fresh tracer in the given mode, returns the tracer."""
+    tracer = create_tracer(backend=backend)
+    tracer(mode=mode, keyframe_interval=keyframe_interval, limits=limits)(func)(
+        *args, **(kwargs or {})
+    )
+    return tracer
+
+
+def count_executed_instructions(func, args=()) -> int:
+    """Returns the number of instructions executed when tracing func once.
+
+    Every executed instruction triggers one "opcode" event, which is handled by
+    FrameLogger.handle_instructions, so the settrace backend is always used.
+    """
+    count = 0
+    original_handle_instructions = FrameLogger.handle_instructions
+
+    def handle_instructions(self, *args, **kwargs):
+        nonlocal count
+        count += 1
+        return original_handle_instructions(self, *args, **kwargs)
+
+    FrameLogger.handle_instructions = handle_instructions
+    try:
+        trace_call(func, args, backend=SETTRACE_BACKEND)
+    finally:
+        FrameLogger.handle_instructions = original_handle_instructions
+
+    return count
+
+
+def best_of(repeat: int, func, *args, **kwargs) -> float:
+    """Runs func `repeat` times, returns the shortest run time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,195 @@
+"""Workloads used by benchmarks.
+
+They are adapted from the programs in examples/, taking their inputs as arguments
+instead of parsing command line arguments.
+"""
+
+import fractions
+import glob
+import os
+import random
+import re
+import statistics
+
+_EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "examples")
+
+WORD_COUNT_INPUTS = sorted(
+    glob.glob(os.path.join(_EXAMPLES_DIR, "word_count", "inputs", "*.txt"))
+    + glob.glob(os.path.join(_EXAMPLES_DIR, "password", "sonnets", "*.txt"))
+)
+
+PASSWORD_INPUTS = sorted(
+    glob.glob(os.path.join(_EXAMPLES_DIR, "password", "sonnets", "*.txt"))
+)
+
+
+def word_count(paths):
+    """See examples/word_count/wc.py."""
+    total_lines, total_bytes, total_words = 0, 0, 0
+    for path in paths:
+        num_lines, num_words, num_bytes = 0, 0, 0
+        with open(path) as fh:
+            for line in fh:
+                num_lines += 1
+                num_bytes += len(line)
+                num_words += len(line.split())
+
+        total_lines += num_lines
+        total_bytes += num_bytes
+        total_words += num_words
+
+    return total_lines, total_words, total_bytes
+
+
+def password(paths, num=3, num_words=4, min_word_len=3, max_word_len=6, seed=1):
+    """See examples/password/password.py."""
+    random.seed(seed)
+    words = set()
+
+    def word_len(word):
+        return min_word_len <= len(word) <= max_word_len
+
+    for path in paths:
+        with open(path) as fh:
+            for line in fh:
+                for word in filter(word_len, map(_clean, line.lower().split())):
+                    words.add(word.title())
+
+    words = sorted(words)
+    passwords = ["".join(random.sample(words, num_words)) for _ in range(num)]
+    return passwords
+
+
+def library_calls(num_values):
+    """Spends almost all its time in library code (statistics, fractions).
+
+    Only a few instructions of this function itself are executed, but lots of
+    functions are called.
+    """
+    variance = statistics.variance(fractions.Fraction(i, 7) for i in range(num_values))
+    return float(variance)
+
+
+def method_calls(num_items):
+    """Calls methods on containers that grow large, like most data processing code.
+
+    Every method call on an identifier is a potential mutation of it.
+    """
+    squares = []
+    index = {}
+    for i in range(num_items):
+        squares.append(i * i)
+        if index.get(i % 97) is None:
+            index.update({i % 97: len(squares)})
+    return squares.count(0) + len(index.keys())
+
+
+class _Model:
+    """Stands for a model of an ML library: an object holding large nested lists."""
+
+    def __init__(self, num_layers, layer_size):
+        self.layers = [[0.0] * layer_size for _ in range(num_layers)]
+        self.num_samples = 0
+
+    def fit(self, batch):
+        for layer in self.layers:
+            layer[len(batch) % len(layer)] += 1.0
+        self.num_samples += len(batch)
+
+
+def _make_dataset(num_items):
+    return [[i, i / 2, str(i)] for i in range(num_items)]
+
+
+def large_values(num_items):
+    """Handles values too large to be sent whole, like datasets and models in ML code.
+
+    Every fit call is a potential mutation of model, whose value has to be encoded.
+    """
+    dataset = _make_dataset(num_items)
+    model = _Model(num_layers=10, layer_size=num_items // 10)
+    batch_size = num_items // 10
+    for start in range(0, num_items, batch_size):
+        batch = dataset[start : start + batch_size]
+        model.fit(batch)
+    return model.num_samples
+
+
+def _make_vocabulary(num_words):
+    return tuple(f"word{i}" for i in range(num_words))
+
+
+def constant_lookups(num_iterations, num_words=1000):
+    """Binds the same large immutable values in every iteration, like constants.
+
+    Each binding of vocabulary and stopwords is an event whose value has to be encoded.
+    """
+    vocabulary = _make_vocabulary(num_words)
+    stopwords = frozenset(vocabulary[:100])
+    count = 0
+    for i in range(num_iterations):
+        words = vocabulary
+        ignored = stopwords
+        count += len(words) - len(ignored)
+    return count
+
+
+def linear_regression(num_epochs, num_samples=404, num_features=13, seed=22):
+    """See examples/machine_learning/linear_regression.py, with Numpy only.
+
+    The float arrays are bound and mutated on every epoch.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    x = rng.random((num_samples, num_features), dtype=np.float32)
+    y = x @ rng.random(num_features, dtype=np.float32) + 0.5
+    w = np.zeros(num_features, dtype=np.float32)
+    b = np.float32(0)
+    for _ in range(num_epochs):
+        error = x @ w + b - y
+        gradient = x.T @ error / num_samples
+        w -= 0.1 * gradient
+        b -= 0.1 * error.mean()
+    return float((error**2).mean())
+
+
+def _clean(word):
+    return re.sub("[^a-zA-Z]", "", word)
+
+
+def make_long_function(num_statements: int):
+    """Generates a straight-line function with roughly 8 * num_statements instructions.
+
+    Real code is rarely like this, but some functions (e.g. generated ones, or long
+    scripts traced at module level) do have thousands of instructions.
+    """
+    # Only a few local variables are used, so that the size of locals doesn't matter.
+    lines = ["def long_function(n):", "    x0 = n"]
+    for i in range(1, num_statements):
+        lines.append(f"    x{i % 8} = x{(i - 1) % 8} * 3 % {i + 7} - n")
+    lines.append(f"    return x{(num_statements - 1) % 8}")
+
+    namespace = {}
+    exec(compile("\n".join(lines), "<long_function>", "exec"), namespace)
+    return namespace["long_function"]
+
+
+def make_many_locals_function(num_locals: int):
+    """Generates a function with num_locals local variables and a small loop."""
+    lines = ["def many_locals(n):"]
+    lines.extend(f"    v{i} = n + {i}" for i in range(num_locals))
+    lines.append("    total = 0")
+    lines.append("    for i in range(n):")
+    lines.append(f"        total = total + v0 * i - v{num_locals - 1}")
+    lines.append("    return total")
+
+    namespace = {}
+    exec(compile("\n".join(lines), "<many_locals>", "exec"), namespace)
+    return namespace["many_locals"]
+
+
+WORKLOADS = {
+    "word_count": (word_count, (WORD_COUNT_INPUTS,)),
+    "password": (password, (PASSWORD_INPUTS,)),
+}
@@ -0,0 +1,180 @@
+import { decode, ExtensionCodec } from "@msgpack/msgpack";
+
+/*
+Decoders of the msgpack extension types sent by the Python side.
+
+Numpy arrays (see cyberbrain/arrays.py) are decoded to
+{ dtype, shape, values } where values is a nested array, or { dtype, shape, summary }
+for arrays too large to be sent.
+
+Pandas DataFrames and Series (see cyberbrain/dataframes.py) are decoded to
+{ columns, dtypes, index, data, rows, step, series } where index is an array, and data
+an array of columns.
+ */
+
+const ARRAY_EXT_TYPE = 1;
+const DATAFRAME_EXT_TYPE = 2;
+
+interface ArrayHeader {
+  dtype: string;
+  shape: number[];
+  summary?: object;
+}
+
+interface ColumnHeader {
+  range?: [number, number, number];
+  dtype?: string;
+  size?: number;
+  values?: unknown[];
+}
+
+interface DataFrameHeader {
+  columns: (string | null)[];
+  dtypes: string[];
+  index: ColumnHeader;
+  data: ColumnHeader[];
+  rows: number;
+  step: number;
+  series: boolean;
+}
+
+// Reads the element at pos of a little-endian buffer, given its kind and size.
+function readNumber(view: DataView, pos: number, kind: string, size: number) {
+  switch (kind + size) {
+    case "b1":
+      return view.getUint8(pos) !== 0;
+    case "i1":
+      return view.getInt8(pos);
+    case "u1":
+      return view.getUint8(pos);
+    case "i2":
+      return view.getInt16(pos, true);
+    case "u2":
+      return view.getUint16(pos, true);
+    case "i4":
+      return view.getInt32(pos, true);
+    case "u4":
+      return view.getUint32(pos, true);
+    // 64-bit integers lose precision beyond 2^53, which is fine for display.
+    case "i8":
+      return view.getInt32(pos + 4, true) * 2 ** 32 + view.getUint32(pos, true);
+    case "u8":
+      return view.getUint32(pos + 4, true) * 2 ** 32 + view.getUint32(pos, true);
+    case "f2":
+      return readFloat16(view.getUint16(pos, true));
+    case "f4":
+      return view.getFloat32(pos, true);
+    case "f8":
+      return view.getFloat64(pos, true);
+    default:
+      throw new Error(`Unsupported dtype: ${kind}${size}`);
+  }
+}
+
+function readFloat16(bits: number) {
+  const sign = bits & 0x8000 ? -1 : 1;
+  const exponent = (bits >> 10) & 0x1f;
+  const fraction = bits & 0x3ff;
+  if (exponent === 0) {
+    return sign * 2 ** -14 * (fraction / 1024);
+  }
+  if (exponent === 0x1f) {
+    return fraction ? NaN : sign * Infinity;
+  }
+  return sign * 2 ** (exponent - 15) * (1 + fraction / 1024);
+}
+
+// Reads the elements of a buffer of the given dtype, between start and end.
+function readValues(view: DataView, start: number, end: number, dtype: string) {
+  // dtype looks like "<f8": byte order, kind and size.
+  const kind = dtype[1];
+  const size = Number(dtype.slice(2));
+  const values = [];
+  for (let pos = start; pos < end; pos += size) {
+    values.push(readNumber(view, pos, kind, size));
+  }
+  return values;
+}
+
+// Turns a flat array into nested arrays of the given shape, in C order.
+function reshape(flat: unknown[], shape: number[]): unknown {
+  if (shape.length === 0) {
+    return flat[0];
+  }
+  if (shape.length === 1) {
+    return flat;
+  }
+  const [length, ...rest] = shape;
+  const chunkSize = flat.length / length;
+  const nested = [];
+  for (let i = 0; i < length; i++) {
+    nested.push(reshape(flat.slice(i * chunkSize, (i + 1) * chunkSize), rest));
+  }
+  return nested;
+}
+
+export function decodeArray(data: Uint8Array) {
+  const view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+  const headerSize = view.getUint32(0, true);
+  const header = decode(data.subarray(4, 4 + headerSize)) as ArrayHeader;
+  if (header.summary !== undefined) {
+    return header;
+  }
+
+  const flat = readValues(view, 4 + headerSize, data.byteLength, header.dtype);
+  return {
+    dtype: header.dtype,
+    shape: header.shape,
+    values: reshape(flat, header.shape)
+  };
+}
+
+export function decodeDataFrame(data: Uint8Array) {
+  const view = new DataView(data.buffer, data.byteOffset, data.byteLength);
+  const headerSize = view.getUint32(0, true);
+  const header = decode(data.subarray(4, 4 + headerSize)) as DataFrameHeader;
+
+  // Buffers follow the header in the order of columns, starting with the index.
+  let offset = 4 + headerSize;
+  function readColumn(column: ColumnHeader) {
+    if (column.range !== undefined) {
+      const [start, stop, step] = column.range;
+      const values = [];
+      for (let i = start; step > 0 ? i < stop : i > stop; i += step) {
+        values.push(i);
+      }
+      return values;
+    }
+    if (column.values !== undefined) {
+      return column.values;
+    }
+    const start = offset;
+    offset += column.size!;
+    return readValues(view, start, offset, column.dtype!);
+  }
+
+  return {
+    columns: header.columns,
+    dtypes: header.dtypes,
+    index: readColumn(header.index),
+    data: header.data.map(readColumn),
+    rows: header.rows,
+    step: header.step,
+    series: header.series
+  };
+}
+
+export const extensionCodec = new ExtensionCodec();
+
+extensionCodec.register({
+  type: ARRAY_EXT_TYPE,
+  // Values are never sent back to Python.
+  encode: () => null,
+  decode: decodeArray
+});
+
+extensionCodec.register({
+  type: DATAFRAME_EXT_TYPE,
+  encode: () => null,
+  decode: decodeDataFrame
+});
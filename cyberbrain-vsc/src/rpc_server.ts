@@ -4,9 +4,22 @@ import { openTraceGraph } from "./webview";
 import { isTestMode } from "./utils";
 import { decode } from "@msgpack/msgpack";
 import { Interactions } from "./interactions";
+import { extensionCodec } from "./ext_types";
 
 let cl = console.log;
 
+// A frame, or a chunk of its events. See RpcClient and FrameStream in
+// cyberbrain/rpc_client.py.
+interface TraceChunk {
+  metadata: { frame_id: string; [key: string]: unknown };
+  identifiers: string[];
+  loops?: object[];
+  events: object[];
+  tracingResult: { [eventId: string]: string[] };
+  sequence?: number;
+  final?: boolean;
+}
+
 /*
 RPC server that communicates with the running Python program.
  */
@@ -15,51 +28,95 @@ export class RpcServer {
   private readonly context: vscode.ExtensionContext;
   private readonly listeningPort = 1989; // TODO: Make it configurable.
   private interactions: Interactions;
+  // Traces being streamed, by frame id.
+  private openTraces = new Map<string, TraceChunk>();
 
   constructor(context: vscode.ExtensionContext) {
     this.context = context;
     this.server = express();
-    this.server.use(express.raw({ limit: "10GB" }));
+    // Bodies compressed by the client ("Content-Encoding: deflate" or "gzip") are
+    // decompressed as they're received, and the limit applies to the decompressed
+    // size. Following RFC 7694, responses list the accepted encodings, and bodies with
+    // other encodings are rejected with a 415 status.
+    this.server.use((req, res, next) => {
+      res.set("Accept-Encoding", "deflate, gzip");
+      next();
+    });
+    this.server.use(express.raw({ limit: "10GB", inflate: true }));
     this.interactions = new Interactions();
 
     this.server.post("/frame", (req, res) => {
       cl("get message");
-      // Hides the debug console on the bottom.
-      vscode.commands.executeCommand("workbench.action.closePanel");
+      this.showTrace(decode(req.body, { extensionCodec }) as TraceChunk);
+      res.send("success");
+    });
 
-      // Sends data to the trace graph in webview.
-      let webviewPanel = openTraceGraph(this.context);
-      webviewPanel.webview.onDidReceiveMessage(
-        (message: {
-          command: string;
-          interactionConfig?: { type: string; info?: any };
-        }) => {
-          if (message.command === "Webview ready") {
-            webviewPanel.webview.postMessage(decode(req.body));
+    // Frames traced with streaming enabled are sent in chunks, see
+    // cyberbrain/rpc_client.py. Chunks are appended to an open trace, which is shown
+    // once the final chunk arrives.
+    this.server.post("/frame/chunk", (req, res) => {
+      const chunk = decode(req.body, { extensionCodec }) as TraceChunk;
+      const frameId = chunk.metadata.frame_id;
+      let trace = this.openTraces.get(frameId);
+      if (trace === undefined || chunk.sequence === 0) {
+        trace = {
+          metadata: chunk.metadata,
+          identifiers: [],
+          loops: [],
+          events: [],
+          tracingResult: {}
+        };
+        this.openTraces.set(frameId, trace);
+      }
+      trace.identifiers.push(...chunk.identifiers);
+      // Not spread, since a chunk can have more events than the max number of args.
+      for (const event of chunk.events) {
+        trace.events.push(event);
+      }
+      Object.assign(trace.tracingResult, chunk.tracingResult);
+      if (chunk.final) {
+        trace.loops = chunk.loops!;
+        this.openTraces.delete(frameId);
+        this.showTrace(trace);
+      }
+      res.send("success");
+    });
+  }
 
-            // If under test, don't open the devtools window because it will cover the trace graph.
-            if (!isTestMode(this.context)) {
-              vscode.commands.executeCommand(
-                "workbench.action.webview.openDeveloperTools"
-              );
-            }
+  private showTrace(data: TraceChunk) {
+    // Hides the debug console on the bottom.
+    vscode.commands.executeCommand("workbench.action.closePanel");
+
+    // Sends data to the trace graph in webview.
+    let webviewPanel = openTraceGraph(this.context);
+    webviewPanel.webview.onDidReceiveMessage(
+      (message: {
+        command: string;
+        interactionConfig?: { type: string; info?: any };
+      }) => {
+        if (message.command === "Webview ready") {
+          webviewPanel.webview.postMessage(data);
+
+          // If under test, don't open the devtools window because it will cover the trace graph.
+          if (!isTestMode(this.context)) {
+            vscode.commands.executeCommand(
+              "workbench.action.webview.openDeveloperTools"
+            );
           }
-          if (message.command === "Interaction behavior") {
-            try {
-              if (message.interactionConfig) {
-                this.interactions.execute(message.interactionConfig);
-              }
-            } catch (error) {
-              cl("Failed to execute the interaction behavior: ", error);
+        }
+        if (message.command === "Interaction behavior") {
+          try {
+            if (message.interactionConfig) {
+              this.interactions.execute(message.interactionConfig);
             }
+          } catch (error) {
+            cl("Failed to execute the interaction behavior: ", error);
           }
-        },
-        undefined,
-        this.context.subscriptions
-      );
-
-      res.send("success");
-    });
+        }
+      },
+      undefined,
+      this.context.subscriptions
+    );
   }
 
   start() {
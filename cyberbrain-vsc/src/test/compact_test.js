@@ -0,0 +1,69 @@
+// Need to set isDevMode to avoid ReferenceError: isDevMode is not defined
+// https://stackoverflow.com/a/59243202/2142577
+const global = (0, eval)("this");
+global.isDevMode = false;
+
+import hamjest from "hamjest";
+
+import { TraceData } from "../trace_data.js";
+
+const { assertThat, equalTo } = hamjest;
+
+describe("Test frames sent in the compact schema", function() {
+  // a = [1]; a.append(2); b = a; del b
+  const traceData = new TraceData({
+    version: 2,
+    metadata: { frame_name: "f" },
+    identifiers: [3, 4],
+    loops: [],
+    events: {
+      type: [0, 1, 0, 2],
+      lineno: [1, 2, 3, 4],
+      offset: [0, 2, 4, 6],
+      filename: [5, 5, 5, 5],
+      target: [3, 3, 4, 4],
+      value: [0, null, 2, null],
+      repr: [0, 1, 1, null],
+      delta: [[1, 0, [["append", "[2]"]]]],
+      jumpTarget: []
+    },
+    tracingResult: [[1, 0], [2, 1]],
+    strings: ["Binding", "Mutation", "Deletion", "a", "b", "f.py"],
+    texts: ["[1]", "[1, 2]", "[1,2]"]
+  });
+
+  it("Test decoding events", function() {
+    assertThat(
+      traceData.events.map(event => [
+        event.id,
+        event.type,
+        event.target,
+        event.filename
+      ]),
+      equalTo([
+        ["e0", "Binding", "a", "f.py"],
+        ["e1", "Mutation", "a", "f.py"],
+        ["e2", "Binding", "b", "f.py"],
+        ["e3", "Deletion", "b", "f.py"]
+      ])
+    );
+    assertThat(
+      traceData.events.map(event => event.value),
+      equalTo([[1], [1, 2], [1, 2], undefined])
+    );
+    assertThat(
+      traceData.events.map(event => event.repr),
+      equalTo(["[1]", "[1, 2]", "[1, 2]", undefined])
+    );
+  });
+
+  it("Test decoding tracing result", function() {
+    assertThat(
+      Array.from(traceData.tracingResult.entries()),
+      equalTo([
+        ["e1", ["e0"]],
+        ["e2", ["e1"]]
+      ])
+    );
+  });
+});
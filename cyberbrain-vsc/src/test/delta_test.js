@@ -0,0 +1,85 @@
+// Need to set isDevMode to avoid ReferenceError: isDevMode is not defined
+// https://stackoverflow.com/a/59243202/2142577
+const global = (0, eval)("this");
+global.isDevMode = false;
+
+import hamjest from "hamjest";
+
+import { TraceData } from "../trace_data.js";
+
+const { assertThat, equalTo } = hamjest;
+
+describe("Test values stored as deltas", function() {
+  // a = [1]; a.append(2); a.insert(0, 0); del a[1]; a[0] = "x"; a.append(3)
+  // b = {"x": 1}; b["y"] = 2; del b["x"]
+  const traceData = new TraceData({
+    events: [
+      { type: "Binding", index: 0, offset: 0, lineno: 1, value: "[1]" },
+      {
+        type: "Mutation",
+        index: 1,
+        offset: 2,
+        lineno: 2,
+        delta: { base: 0, operations: [["append", "[2]"]] }
+      },
+      {
+        type: "Mutation",
+        index: 2,
+        offset: 4,
+        lineno: 3,
+        delta: { base: 1, operations: [["insert", 0, "0"]] }
+      },
+      {
+        type: "Mutation",
+        index: 3,
+        offset: 6,
+        lineno: 4,
+        delta: { base: 2, operations: [["delitem", 1]] }
+      },
+      { type: "Binding", index: 4, offset: 8, lineno: 5, value: '{"x":1}' },
+      {
+        type: "Mutation",
+        index: 5,
+        offset: 10,
+        lineno: 6,
+        delta: {
+          base: 4,
+          operations: [["setitem", "y", "2"], ["delitem", "x"]]
+        }
+      },
+      {
+        type: "Mutation",
+        index: 6,
+        offset: 12,
+        lineno: 7,
+        delta: { base: 3, operations: [["setitem", 0, '"x"']] }
+      },
+      { type: "Mutation", index: 7, offset: 14, lineno: 8, value: '["x",2,3]' }
+    ],
+    loops: [],
+    tracingResult: {}
+  });
+
+  it("Test reconstructing values", function() {
+    const values = traceData.events.map(event => event.value);
+    assertThat(
+      values,
+      equalTo([
+        [1],
+        [1, 2],
+        [0, 1, 2],
+        [0, 2],
+        { x: 1 },
+        { y: 2 },
+        ["x", 2],
+        ["x", 2, 3]
+      ])
+    );
+  });
+
+  it("Test reconstructing doesn't change previous values", function() {
+    traceData.events[3].value;
+    assertThat(traceData.events[0].value, equalTo([1]));
+    assertThat(traceData.events[1].value, equalTo([1, 2]));
+  });
+});
@@ -95,6 +95,124 @@ function decodeJson(jsonString) {
   }
 }
 
+/*
+Applies the operations of a delta to a decoded value in place, see delta.py.
+ */
+function applyDelta(value, operations) {
+  for (const operation of operations) {
+    switch (operation[0]) {
+      case "append":
+        // Not using push(...items), which fails on large arrays.
+        for (const item of decodeJson(operation[1])) {
+          value.push(item);
+        }
+        break;
+      case "insert":
+        value.splice(operation[1], 0, decodeJson(operation[2]));
+        break;
+      case "setitem":
+        value[operation[1]] = decodeJson(operation[2]);
+        break;
+      case "delitem":
+        if (Array.isArray(value)) {
+          value.splice(operation[1], 1);
+        } else {
+          delete value[operation[1]];
+        }
+        break;
+      default:
+        throw new Error(`Unknown delta operation: ${operation[0]}`);
+    }
+  }
+  return value;
+}
+
+const EVENTS_WITH_VALUE = new Set([
+  "InitialValue",
+  "Binding",
+  "Mutation",
+  "Return"
+]);
+
+/*
+Turns frame data sent in the compact schema (version 2, see WIRE_VERSION in
+rpc_client.py) into the original one: events are columns of fields, strings are
+indices into data.strings, JSON values and reprs are indices into data.texts, and
+events are identified by their index.
+
+JSON values are decoded lazily, once per distinct value, so events with equal values
+share the decoded value.
+ */
+export function decodeCompactFrame(data) {
+  const { strings, texts } = data;
+  const columns = data.events;
+  const decodedTexts = new Map();
+  const decodeText = id => {
+    if (!decodedTexts.has(id)) {
+      decodedTexts.set(id, decodeJson(texts[id]));
+    }
+    return decodedTexts.get(id);
+  };
+  // Ids are also used to build ids of edges, so they must not be plain numbers.
+  const eventId = index => `e${index}`;
+  const deltas = new Map(
+    columns.delta.map(([index, base, operations]) => [
+      index,
+      { base, operations }
+    ])
+  );
+  const jumpTargets = new Map(columns.jumpTarget);
+
+  const events = columns.type.map((typeIndex, index) => {
+    const event = {
+      type: strings[typeIndex],
+      index,
+      id: eventId(index),
+      lineno: columns.lineno[index],
+      offset: columns.offset[index],
+      filename: strings[columns.filename[index]]
+    };
+    if (columns.target[index] !== null) {
+      event.target = strings[columns.target[index]];
+    }
+    if (EVENTS_WITH_VALUE.has(event.type)) {
+      if (deltas.has(index)) {
+        event.delta = deltas.get(index);
+      } else if (typeof columns.value[index] === "number") {
+        const id = columns.value[index];
+        Object.defineProperty(event, "value", {
+          get() {
+            return decodeText(id);
+          },
+          enumerable: true
+        });
+      } else {
+        // Decoded by the extension codec, see ext_types.ts.
+        event.value = columns.value[index];
+      }
+      const reprId = columns.repr[index];
+      event.repr = reprId === null ? null : texts[reprId];
+    }
+    if (event.type === "JumpBackToLoopStart") {
+      event.jump_target = jumpTargets.get(index);
+    }
+    return event;
+  });
+
+  const tracingResult = {};
+  for (const [index, ...sources] of data.tracingResult) {
+    tracingResult[eventId(index)] = sources.map(eventId);
+  }
+
+  return {
+    metadata: data.metadata,
+    identifiers: data.identifiers.map(index => strings[index]),
+    loops: data.loops,
+    events,
+    tracingResult
+  };
+}
+
 /*
 Class that
 - Manage raw events and loops, including loops' state.
@@ -103,11 +221,26 @@ Class that
  */
 export class TraceData {
   constructor(data) {
+    if (data.version === 2) {
+      data = decodeCompactFrame(data);
+    }
     this.frameMetadata = data.metadata;
     this.events = data.events;
     this.events.forEach(event => {
-      if (event.hasOwnProperty("value")) {
+      // Values sent as msgpack extension types are already decoded by ext_types.ts,
+      // and values of compact frames are decoded by a getter.
+      const descriptor = Object.getOwnPropertyDescriptor(event, "value");
+      if (descriptor !== undefined && typeof descriptor.value === "string") {
         event.value = decodeJson(event.value); // Previously a JSON string.
+      } else if (event.hasOwnProperty("delta")) {
+        // Values stored as deltas are only reconstructed when needed.
+        const traceData = this;
+        Object.defineProperty(event, "value", {
+          get() {
+            return traceData.reconstructValue(event);
+          },
+          enumerable: true
+        });
       }
     });
     this.loops = data.loops
@@ -128,6 +261,24 @@ export class TraceData {
     this.initialize();
   }
 
+  /**
+   * Reconstructs the value of an event that has a delta, by applying the deltas of
+   * previous events of the same identifier to the latest full value.
+   */
+  reconstructValue(event) {
+    let deltas = [];
+    while (event.hasOwnProperty("delta")) {
+      deltas.push(event.delta);
+      event = this.events[event.delta.base];
+    }
+    // Deltas are applied in place, so the full value is copied first.
+    let value = JSON.parse(JSON.stringify(event.value));
+    for (let i = deltas.length - 1; i >= 0; i--) {
+      applyDelta(value, deltas[i].operations);
+    }
+    return value;
+  }
+
   get visibleEventsArray() {
     return Array.from(this.visibleEvents.values());
   }
@@ -60,6 +60,39 @@ export function displayValueInConsole(node) {
         cl(obj.repr);
         return;
       }
+      // Summaries of objects, see cyberbrain/summarizers.py.
+      if (keys.length === 2 && keys.includes("type") && keys.includes("summary")) {
+        cl(`<${obj.type} object>`);
+        cl(obj.summary);
+        return;
+      }
+      // Pandas DataFrames and Series, see ext_types.ts.
+      if (keys.includes("columns") && keys.includes("index")) {
+        displayDataFrame(obj);
+        return;
+      }
+      // Numpy arrays, see ext_types.ts.
+      if (keys.includes("dtype") && keys.includes("shape")) {
+        cl(`array(dtype=${obj.dtype}, shape=(${obj.shape.join(", ")}))`);
+        cl(obj.hasOwnProperty("values") ? obj.values : obj.summary);
+        return;
+      }
       cl(obj);
   }
 }
+
+function displayDataFrame(obj) {
+  cl(
+    `${obj.series ? "Series" : "DataFrame"} with ${obj.rows} rows` +
+      (obj.step > 1 ? `, showing every ${obj.step} rows:` : ":")
+  );
+  const rows = {};
+  obj.index.forEach((label, i) => {
+    const row = {};
+    obj.columns.forEach((name, j) => {
+      row[name] = obj.data[j][i];
+    });
+    rows[label] = row;
+  });
+  console.table(rows);
+}
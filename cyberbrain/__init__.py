@@ -10,6 +10,10 @@ from .basis import (
     Loop,
     JumpBackToLoopStart,
 )
+from .rpc_client import StreamingOptions
+from .purity import register_mutating_methods, register_pure_methods
+from .summarizers import register_summarizer
+from .utils import EncodingLimits, set_file_filters
 
 # Test only
 from .utils import pprint
@@ -0,0 +1,108 @@
+"""Binary capture of Numpy arrays.
+
+jsonpickle encodes an array as the JSON text of its values, which is slow, and several
+times larger than the array itself. Arrays of booleans and numbers are instead captured
+as their raw buffer, with their dtype and shape, and sent to the RPC server as a
+msgpack extension type, whose data is:
+
+    <header size: uint32, little-endian><header: msgpack map><buffer>
+
+The header has "dtype" (like "<f8", always little-endian) and "shape". Arrays larger
+than the budget of a value are summarized instead, in which case the header also has
+"summary" (min, max, mean, head and tail of the flattened array), and there's no
+buffer.
+
+Numpy is never imported here, arrays can only exist if the traced program did.
+"""
+
+from __future__ import annotations
+
+import struct
+import sys
+from typing import Any, Optional
+
+import attr
+import msgpack
+
+EXT_TYPE = 1
+
+# Booleans, signed and unsigned integers, and floats, which Js has typed arrays for.
+_BINARY_KINDS = frozenset("biuf")
+
+# Number of elements kept at each end of the flattened array in a summary.
+_NUM_SUMMARY_ITEMS = 5
+
+# Size of the header that starts the data of extension types, see the docstring.
+HEADER_SIZE = struct.Struct("<I")
+
+
+@attr.s(auto_attribs=True)
+class ArrayValue:
+    dtype: str
+    shape: tuple[int, ...]
+    # The buffer in C order, None if the array is summarized.
+    data: Optional[bytes] = None
+    summary: Optional[dict[str, Any]] = None
+
+    @property
+    def size(self) -> int:
+        """Approximate number of bytes sent for this value."""
+        return len(self.data) if self.data is not None else 200
+
+    def to_ext(self) -> msgpack.ExtType:
+        header = {"dtype": self.dtype, "shape": list(self.shape)}
+        if self.summary is not None:
+            header["summary"] = self.summary
+        header = msgpack.packb(header)
+        return msgpack.ExtType(
+            EXT_TYPE,
+            b"".join((HEADER_SIZE.pack(len(header)), header, self.data or b"")),
+        )
+
+    @classmethod
+    def from_ext(cls, data: bytes) -> ArrayValue:
+        (header_size,) = HEADER_SIZE.unpack_from(data)
+        header_end = HEADER_SIZE.size + header_size
+        header = msgpack.unpackb(data[HEADER_SIZE.size : header_end])
+        return cls(
+            dtype=header["dtype"],
+            shape=tuple(header["shape"]),
+            data=None if "summary" in header else data[header_end:],
+            summary=header.get("summary"),
+        )
+
+
+def _summarize(array) -> dict[str, Any]:
+    summary = {
+        "head": array.flat[:_NUM_SUMMARY_ITEMS].tolist(),
+        "tail": array.flat[-_NUM_SUMMARY_ITEMS:].tolist(),
+    }
+    if array.size:
+        summary.update(
+            min=array.min().item(), max=array.max().item(), mean=float(array.mean())
+        )
+    return summary
+
+
+def capture(value: Any, max_bytes: int) -> Optional[ArrayValue]:
+    """Captures value if it's an array of booleans or numbers, otherwise returns None.
+
+    Arrays whose buffer exceeds max_bytes are summarized.
+    """
+    numpy = sys.modules.get("numpy")
+    if numpy is None or type(value) is not numpy.ndarray:
+        return None
+    if value.dtype.kind not in _BINARY_KINDS:
+        return None
+
+    dtype = value.dtype.newbyteorder("<")
+    if value.nbytes > max_bytes:
+        return ArrayValue(dtype=dtype.str, shape=value.shape, summary=_summarize(value))
+    # The buffer has to be copied anyway, since the array can be mutated later.
+    # astype doesn't copy little-endian arrays, and tobytes copies the buffer once,
+    # making it contiguous if needed.
+    return ArrayValue(
+        dtype=dtype.str,
+        shape=value.shape,
+        data=value.astype(dtype, copy=False).tobytes(),
+    )
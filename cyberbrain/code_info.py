@@ -0,0 +1,364 @@
+"""Static analysis of code objects, shared across frames."""
+
+from __future__ import annotations
+
+import dis
+import weakref
+from array import array
+from dis import Instruction
+from types import CodeType, MappingProxyType
+from typing import Mapping, Optional
+
+from . import basis, utils, value_stack
+from .stack_effect import StackEffect, find_fusible_runs
+
+_implicit_jump_ops = {
+    "BREAK_LOOP",
+    "CONTINUE_LOOP",
+    "RAISE_VARARGS",  # maybe we can remove RERAISE and RAISE_VARARGS
+    "END_FINALLY",
+    "RERAISE",
+}
+
+PREDICT_MAP = {
+    "LIST_APPEND": {"JUMP_ABSOLUTE"},
+    "SET_ADD": {"JUMP_ABSOLUTE"},
+    "GET_ANEXT": {"LOAD_CONST"},
+    "GET_AWAITABLE": {"LOAD_CONST"},
+    "MAP_ADD": {"JUMP_ABSOLUTE"},
+    "COMPARE_OP": {"POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE"},
+    "IS_OP": {"POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE"},
+    "CONTAINS_OP": {"POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE"},
+    "GET_ITER": {"FOR_ITER", "CALL_FUNCTION"},
+    "GET_YIELD_FROM_ITER": {"LOAD_CONST"},
+    "FOR_ITER": {"STORE_FAST", "UNPACK_SEQUENCE", "POP_BLOCK"},
+    "BEFORE_ASYNC_WITH": {"GET_AWAITABLE"},
+    "WITH_CLEANUP_START": {"WITH_CLEANUP_FINISH"},
+    "WITH_CLEANUP_FINISH": {"END_FINALLY"},
+    "DICT_MERGE": {"CALL_FUNCTION_EX"},
+}
+
+# Since Python 3.12, PREDICT no longer skips updating last_i, so it behaves as if
+# computed gotos were always enabled.
+COMPUTED_GOTOS_ENABLED = basis.VERSION_INFO >= (3, 12) or utils.computed_gotos_enabled()
+
+_LOAD_IDENTIFIER_OPS = {
+    "LOAD_NAME",
+    "LOAD_GLOBAL",
+    "LOAD_FAST",
+    "LOAD_FAST_CHECK",
+    "LOAD_DEREF",
+    "LOAD_CLASSDEREF",
+    "LOAD_FROM_DICT_OR_DEREF",
+    "LOAD_FROM_DICT_OR_GLOBALS",
+}
+
+# Instructions that access an identifier, whose argval is the identifier's name.
+_IDENTIFIER_OPCODES = frozenset(dis.hasname + dis.haslocal + dis.hasfree)
+
+# Instructions after which the execution never continues to the next instruction,
+# since Python 3.12.
+_NO_FALLTHROUGH_OPS = {
+    "JUMP_FORWARD",
+    "JUMP_BACKWARD",
+    "JUMP_BACKWARD_NO_INTERRUPT",
+    "RETURN_VALUE",
+    "RETURN_CONST",
+    "RAISE_VARARGS",
+    "RERAISE",
+}
+
+# Max number of code objects whose analysis results are kept.
+_CACHE_SIZE = 256
+
+_code_info_cache: weakref.WeakKeyDictionary[
+    CodeType, CodeInfo
+] = weakref.WeakKeyDictionary()
+
+
+class CodeInfo:
+    """Information derived from a code object that does not change during execution.
+
+    Computing it requires decoding and scanning the whole bytecode, so it is done once
+    per code object, and the result is shared by every frame and logger of that code.
+    Since it's shared, all attributes are read-only.
+
+    Per-instruction information is stored in columns of equal length, indexed by
+    `offset // 2`. Every instruction is two bytes since Python 3.6, so each index maps
+    to exactly one instruction, including EXTENDED_ARG. Looking up a column is much
+    cheaper than looking up a dict keyed by offset, which matters because the tracer
+    reads them for every executed instruction.
+    """
+
+    __slots__ = [
+        "instructions",
+        "opcodes",
+        "args",
+        "identifiers",
+        "jump_targets",
+        "exception_handlers",
+        "loop_jumps",
+        "last_i_after_jump",
+        "is_implicit_jump",
+        "linenos",
+        "increasing_linenos",
+        "can_emit_event",
+        "run_ends",
+        "stack_effects",
+        "loads_by_line",
+        "method_receivers",
+        "parameters",
+    ]
+
+    def __init__(self, code: CodeType):
+        if basis.VERSION_INFO >= (3, 12):
+            # Inline cache entries are included as CACHE instructions, so that every
+            # offset still maps to an instruction. They are never executed.
+            instructions = tuple(dis.get_instructions(code, show_caches=True))
+        else:
+            instructions = tuple(dis.get_instructions(code))
+        assert all(
+            instr.offset == index * 2 for index, instr in enumerate(instructions)
+        )
+        self.instructions: tuple[Instruction, ...] = instructions
+        self.opcodes: bytes = bytes(instr.opcode for instr in instructions)
+        # Arguments with EXTENDED_ARG applied, 0 for instructions without argument.
+        self.args: array[int] = array("l", (instr.arg or 0 for instr in instructions))
+        # Names of the identifiers accessed by instructions, None for instructions that
+        # don't access one. Note that argrepr can't be used, since in 3.12 it contains
+        # more than the name, e.g. "NULL + print" for LOAD_GLOBAL.
+        self.identifiers: tuple[Optional[str], ...] = tuple(
+            instr.argval if instr.opcode in _IDENTIFIER_OPCODES else None
+            for instr in instructions
+        )
+        # Explicit jump targets, -1 for instructions that are not jumps.
+        self.jump_targets: array[int] = array("l")
+        for instr in instructions:
+            target = utils.get_jump_target_or_none(instr)
+            self.jump_targets.append(-1 if target is None else target)
+
+        # Entries of the exception table as (start, end, target, depth, lasti), used
+        # to find where an exception is handled since 3.11. The range is [start, end).
+        self.exception_handlers: tuple[tuple[int, int, int, int, bool], ...] = ()
+        if hasattr(dis, "_parse_exception_table"):
+            self.exception_handlers = tuple(
+                (entry.start, entry.end, entry.target, entry.depth, entry.lasti)
+                for entry in dis._parse_exception_table(code)
+            )
+
+        # Offsets of backward jumps that jump to the start of a loop. Before 3.12,
+        # every backward jump does. Since 3.12, exception handlers are placed at the
+        # end of the code, and they jump backward to continue the normal execution.
+        self.loop_jumps: frozenset[int] = _find_loop_jumps(
+            instructions, self.jump_targets, self.exception_handlers
+        )
+
+        # The value of last_i after the explicit jump happens, -1 for instructions
+        # that are not jumps. It's where the tracer compares last_i with to know
+        # whether a jump just happened.
+        self.last_i_after_jump: array[int] = array("l", self.jump_targets)
+        if not COMPUTED_GOTOS_ENABLED:
+            for index, target in enumerate(self.jump_targets):
+                if target == -1:
+                    continue
+                # Here we assume that PREDICT happens at most once. I'm not sure if
+                # this is always true. If not, we can modify the code.
+                # Example:
+                #              16 GET_ITER
+                #         >>   18 FOR_ITER                 4 (to 24)
+                #              20 STORE_FAST               1 (x)
+                #   5          22 JUMP_ABSOLUTE           18
+                #         >>   24 POP_BLOCK
+                #   7     >>   26 SETUP_LOOP              22 (to 50)
+                #
+                # `PREDICT(POP_BLOCK)` exists in FOR_ITER's handler.
+                # With COMPUTED_GOTOS, PREDICT is a noop, last_i is 24.
+                # Without COMPUTED_GOTOS, PREDICT causes last_i to not update for
+                # POP_BLOCK, so last_i is 26.
+                opname_next = instructions[target // 2].opname
+                if opname_next in PREDICT_MAP.get(instructions[index].opname, {}):
+                    self.last_i_after_jump[index] += 2
+
+        # Instructions that can change bytecode counter, but are not included in
+        # `dis.hasjrel` or `dis.hasjabs`. From observation, implicit jump instructions
+        # don't contain PREDICT.
+        # TODO: Verify if this is always true.
+        self.is_implicit_jump: bytes = bytes(
+            instr.opname in _implicit_jump_ops for instr in instructions
+        )
+
+        offset_to_lineno = utils.map_bytecode_offset_to_lineno(code)
+        self.linenos: array[int] = array(
+            "l", (offset_to_lineno[instr.offset] for instr in instructions)
+        )
+
+        # An increasing version of linenos for determining loops' end_lineno correctly.
+        # See https://git.io/JSLTB for details.
+        # TODO: Can we use the increasing version in all places?
+        # Since 3.12, exception handlers are placed after the rest of the code, they
+        # keep their own linenos.
+        is_handler_code = _find_handler_code(instructions, self.exception_handlers)
+        self.increasing_linenos: array[int] = array("l")
+        previous_lineno = -1
+        for index, lineno in enumerate(self.linenos):
+            if is_handler_code[index]:
+                self.increasing_linenos.append(lineno)
+                continue
+            previous_lineno = max(lineno, previous_lineno)
+            self.increasing_linenos.append(previous_lineno)
+
+        # Whether the instruction's handler could emit an event. Instructions that
+        # can't only need to update the value stack.
+        event_opcodes = value_stack.get_value_stack_class().event_opcodes
+        self.can_emit_event: bytes = bytes(
+            opcode in event_opcodes for opcode in self.opcodes
+        )
+
+        # Runs of instructions whose effects on the value stack are combined, see
+        # stack_effect.py. For the first instruction of each run, run_ends contains
+        # the offset after the run, and stack_effects the combined effect.
+        self.run_ends: array[int]
+        self.stack_effects: tuple[Optional[StackEffect], ...]
+        self.run_ends, self.stack_effects = find_fusible_runs(
+            instructions,
+            self.linenos,
+            self.jump_targets,
+            handler_targets=[handler[2] for handler in self.exception_handlers],
+        )
+
+        # Maps linenos to the instructions that load an identifier on that line, one
+        # per identifier. Used by line mode, which doesn't handle instructions.
+        loads_by_line = {}
+        for instr, identifier, lineno in zip(
+            instructions, self.identifiers, self.linenos
+        ):
+            if instr.opname in _LOAD_IDENTIFIER_OPS:
+                loads_by_line.setdefault(lineno, {}).setdefault(identifier, instr)
+        self.loads_by_line: Mapping[int, tuple[Instruction, ...]] = MappingProxyType(
+            {lineno: tuple(loads.values()) for lineno, loads in loads_by_line.items()}
+        )
+        # Maps the offsets of method loads to the identifier the method is loaded from,
+        # for methods called directly on an identifier, like `a.append(1)`.
+        self.method_receivers: Mapping[int, str] = MappingProxyType(
+            _find_method_receivers(instructions, self.identifiers, self.jump_targets)
+        )
+        self.parameters: frozenset[str] = frozenset(utils.get_parameters(code))
+
+
+def _find_method_receivers(
+    instructions: tuple[Instruction, ...],
+    identifiers: tuple[Optional[str], ...],
+    jump_targets: array[int],
+) -> dict[int, str]:
+    """Finds method loads whose receiver is an identifier loaded right before.
+
+    A method is loaded by LOAD_METHOD, or LOAD_ATTR with the low bit of its argument
+    set since 3.12. If the method load can be jumped to, the receiver is unknown.
+    """
+    targets = set(jump_targets)
+    receivers = {}
+    previous = None
+    for instr in instructions:
+        if instr.offset in targets:
+            previous = None
+        if instr.opname in {"CACHE", "EXTENDED_ARG"}:
+            continue
+        if previous is not None and (
+            instr.opname == "LOAD_METHOD"
+            or (
+                instr.opname == "LOAD_ATTR"
+                and basis.VERSION_INFO >= (3, 12)
+                and instr.arg & 0x01
+            )
+        ):
+            receivers[instr.offset] = identifiers[previous.offset // 2]
+        previous = instr if instr.opname in _LOAD_IDENTIFIER_OPS else None
+    return receivers
+
+
+def _find_handler_code(
+    instructions: tuple[Instruction, ...],
+    exception_handlers: tuple[tuple[int, int, int, int, bool], ...],
+) -> bytes:
+    """Returns a column that tells whether an instruction is part of an exception
+    handler, i.e. it is executed after the handler's start without any jump.
+    """
+    is_handler_code = bytearray(len(instructions))
+    for _, _, target, _, _ in exception_handlers:
+        for instr in instructions[target // 2 :]:
+            is_handler_code[instr.offset // 2] = True
+            if instr.opname in _NO_FALLTHROUGH_OPS:
+                break
+    return bytes(is_handler_code)
+
+
+def _find_loop_jumps(
+    instructions: tuple[Instruction, ...],
+    jump_targets: array[int],
+    exception_handlers: tuple[tuple[int, int, int, int, bool], ...],
+) -> frozenset[int]:
+    """Finds backward jumps that jump to the start of a loop.
+
+    Before 3.12, these are all the backward jumps. Since 3.12, a backward jump is
+    considered to jump to a loop start if the target dominates the jump, i.e. the jump
+    can't be reached from the entry of the code without passing through the target.
+    """
+    backward_jumps = [
+        instr.offset
+        for instr, target in zip(instructions, jump_targets)
+        if target != -1 and target < instr.offset
+    ]
+    if basis.VERSION_INFO < (3, 12) or not backward_jumps:
+        return frozenset(backward_jumps)
+
+    # Builds the control flow graph. Exceptions are considered as jumps to their
+    # handlers, so that `continue` inside an `except` clause is still a loop jump.
+    successors = [[] for _ in instructions]
+    previous = None
+    for instr in instructions:
+        if instr.opname == "CACHE":
+            continue
+        if previous is not None and previous.opname not in _NO_FALLTHROUGH_OPS:
+            successors[previous.offset // 2].append(instr.offset)
+        previous = instr
+        target = jump_targets[instr.offset // 2]
+        if target != -1:
+            successors[instr.offset // 2].append(target)
+        for start, end, handler, _, _ in exception_handlers:
+            if start <= instr.offset < end:
+                successors[instr.offset // 2].append(handler)
+                break  # Ranges of entries don't overlap.
+
+    def dominates(target: int, offset: int) -> bool:
+        reached = {target}
+        to_visit = [0]
+        while to_visit:
+            current = to_visit.pop()
+            if current == offset:
+                return False
+            if current in reached:
+                continue
+            reached.add(current)
+            to_visit.extend(successors[current // 2])
+        return True
+
+    return frozenset(
+        offset
+        for offset in backward_jumps
+        if dominates(jump_targets[offset // 2], offset)
+    )
+
+
+def get_code_info(code: CodeType) -> CodeInfo:
+    """Returns the analysis result of the given code object, computes it if needed."""
+    try:
+        return _code_info_cache[code]
+    except KeyError:
+        pass
+
+    code_info = CodeInfo(code)
+    if len(_code_info_cache) >= _CACHE_SIZE:
+        # Evicts the earliest added code object.
+        del _code_info_cache[next(iter(_code_info_cache))]
+    _code_info_cache[code] = code_info
+    return code_info
@@ -0,0 +1,220 @@
+"""Columnar capture of Pandas DataFrames and Series.
+
+jsonpickle encodes a DataFrame as the CSV text of its rows, nested in JSON, which is
+slow for large frames, and loses the types of values. DataFrames and Series are
+instead captured column by column, and sent to the RPC server as a msgpack extension
+type, whose data is:
+
+    <header size: uint32, little-endian><header: msgpack map><buffers>
+
+The header has:
+    columns: names of columns, or the name of a Series as the only column.
+    dtypes: Pandas dtypes of columns, like "int64" or "object".
+    index, data: the index, and every column, as either
+        {"range": [start, stop, step]} for a RangeIndex,
+        {"dtype": "<f8", "size": <number of bytes>} for columns of booleans and
+            numbers, whose buffers follow the header in order, see arrays.py,
+        {"values": [...]} for other columns.
+    rows: the number of rows.
+    step: frames larger than the budget of a value are sampled, only the rows at
+        0, step, 2 * step... are kept, so that the packed columns fit the budget.
+    series: whether the value is a Series.
+
+Pandas is never imported here, frames can only exist if the traced program did.
+"""
+
+from __future__ import annotations
+
+import sys
+from typing import Any, Optional, Union
+
+import attr
+import msgpack
+
+from . import arrays
+
+EXT_TYPE = 2
+
+# A range for a RangeIndex, an ArrayValue for booleans and numbers, and a list of
+# values otherwise.
+Column = Union[range, arrays.ArrayValue, list]
+
+# Values of other types are sent as their str.
+_PRIMITIVE_TYPES = frozenset({str, float, bool, type(None)})
+
+# Number of rows whose size is measured to choose the step of large frames.
+_NUM_SAMPLED_ROWS = 100
+
+
+@attr.s(auto_attribs=True)
+class DataFrameValue:
+    columns: list[Optional[str]]
+    dtypes: list[str]
+    index: Column
+    data: list[Column]
+    num_rows: int
+    step: int = 1
+    is_series: bool = False
+
+    @property
+    def size(self) -> int:
+        """Number of bytes sent for the columns of this value."""
+        return sum(map(_column_size, [self.index, *self.data]))
+
+    @property
+    def num_captured_rows(self) -> int:
+        return len(range(0, self.num_rows, self.step))
+
+    def to_ext(self) -> msgpack.ExtType:
+        buffers = []
+
+        def column_header(column: Column) -> dict[str, Any]:
+            if isinstance(column, range):
+                return {"range": [column.start, column.stop, column.step]}
+            if isinstance(column, arrays.ArrayValue):
+                buffers.append(column.data)
+                return {"dtype": column.dtype, "size": len(column.data)}
+            return {"values": column}
+
+        header = msgpack.packb(
+            {
+                "columns": self.columns,
+                "dtypes": self.dtypes,
+                "index": column_header(self.index),
+                "data": [column_header(column) for column in self.data],
+                "rows": self.num_rows,
+                "step": self.step,
+                "series": self.is_series,
+            }
+        )
+        return msgpack.ExtType(
+            EXT_TYPE,
+            b"".join((arrays.HEADER_SIZE.pack(len(header)), header, *buffers)),
+        )
+
+    @classmethod
+    def from_ext(cls, data: bytes) -> DataFrameValue:
+        (header_size,) = arrays.HEADER_SIZE.unpack_from(data)
+        offset = arrays.HEADER_SIZE.size + header_size
+        header = msgpack.unpackb(data[arrays.HEADER_SIZE.size : offset])
+
+        def read_column(column_header: dict[str, Any]) -> Column:
+            nonlocal offset
+            if "range" in column_header:
+                return range(*column_header["range"])
+            if "values" in column_header:
+                return column_header["values"]
+            dtype, size = column_header["dtype"], column_header["size"]
+            offset += size
+            return arrays.ArrayValue(
+                dtype=dtype,
+                shape=(size // int(dtype[2:]),),
+                data=data[offset - size : offset],
+            )
+
+        return cls(
+            columns=header["columns"],
+            dtypes=header["dtypes"],
+            index=read_column(header["index"]),
+            data=[read_column(column) for column in header["data"]],
+            num_rows=header["rows"],
+            step=header["step"],
+            is_series=header["series"],
+        )
+
+
+def _column_size(column: Column) -> int:
+    if isinstance(column, range):
+        return 0
+    if isinstance(column, arrays.ArrayValue):
+        return column.size
+    # Strings and other objects can be arbitrarily large.
+    return len(msgpack.packb(column))
+
+
+def _to_primitive(value: Any) -> Any:
+    if type(value) in _PRIMITIVE_TYPES:
+        return value
+    # msgpack can't pack larger integers.
+    if type(value) is int and -(2**63) <= value < 2**64:
+        return value
+    return str(value)
+
+
+def _capture_column(array) -> Column:
+    captured = arrays.capture(array, max_bytes=sys.maxsize)
+    if captured is not None:
+        return captured
+    if array.dtype.kind in "mM":
+        # Datetimes and timedeltas, whose tolist returns integers for some units.
+        return array.astype(str).tolist()
+    return [_to_primitive(value) for value in array.tolist()]
+
+
+def capture(value: Any, max_bytes: int) -> Optional[DataFrameValue]:
+    """Captures value if it's a DataFrame or a Series, otherwise returns None.
+
+    Frames whose columns exceed max_bytes are sampled. Returns None as well if even a
+    single row doesn't fit.
+    """
+    pandas = sys.modules.get("pandas")
+    if pandas is None:
+        return None
+    if type(value) is not pandas.Series and type(value) is not pandas.DataFrame:
+        return None
+
+    # The size of strings and other objects is only known once packed, so the step is
+    # first estimated from a sample of rows.
+    sample = _capture_rows(value, max(1, len(value) // _NUM_SAMPLED_ROWS), pandas)
+    captured, step = sample, _fitting_step(sample, max_bytes)
+    while step is not None:
+        if step != captured.step:
+            captured = _capture_rows(value, step, pandas)
+        # Rows out of the sample may be larger.
+        if captured.size <= max_bytes:
+            return captured
+        step = _fitting_step(captured, max_bytes)
+    return None
+
+
+def _fitting_step(captured: DataFrameValue, max_bytes: int) -> Optional[int]:
+    """Returns the step whose rows fit max_bytes, if they're as large as captured's.
+
+    Returns None if a single row doesn't fit.
+    """
+    if captured.num_captured_rows == 0 or captured.size == 0:
+        return 1
+    row_size = captured.size / captured.num_captured_rows
+    max_rows = int(max_bytes // row_size)
+    if max_rows == 0:
+        return None
+    return max(1, -(-captured.num_rows // max_rows))
+
+
+def _capture_rows(value: Any, step: int, pandas) -> DataFrameValue:
+    is_series = type(value) is pandas.Series
+    num_rows = len(value)
+    if step > 1:
+        value = value.iloc[::step]
+
+    index = value.index
+    if type(index) is pandas.RangeIndex:
+        index = range(index.start, index.stop, index.step)
+    else:
+        index = _capture_column(index.to_numpy())
+
+    if is_series:
+        columns = [value]
+        names = [None if value.name is None else str(value.name)]
+    else:
+        columns = [value.iloc[:, i] for i in range(value.shape[1])]
+        names = [str(name) for name in value.columns]
+    return DataFrameValue(
+        columns=names,
+        dtypes=[str(column.dtype) for column in columns],
+        index=index,
+        data=[_capture_column(column.to_numpy()) for column in columns],
+        num_rows=num_rows,
+        step=step,
+        is_series=is_series,
+    )
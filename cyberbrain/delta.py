@@ -0,0 +1,160 @@
+"""Structural deltas between two serialized values of the same identifier.
+
+When a container grows by one element per loop iteration, storing its full value in
+every Mutation event takes O(n²) memory and payload. With deltas enabled, a Mutation
+event can instead store how to turn the previous value of the identifier into the new
+one, as a list of operations on the decoded JSON value:
+
+    ["append", items]        Appends every element of the array `items` to a list.
+    ["insert", index, item]  Inserts item into a list at index.
+    ["setitem", key, item]   Sets a list index or a dict key to item.
+    ["delitem", key]         Deletes a list index or a dict key.
+
+Items are JSON strings, like the values of events, so they're decoded the same way.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Iterable, Optional
+
+import attr
+
+Operation = list
+
+
+@attr.s(auto_attribs=True)
+class ValueDelta:
+    # Index of the previous event of the same identifier, whose value the operations
+    # apply to. That event can itself have a delta.
+    base: int
+    operations: list[Operation]
+
+
+class _Number:
+    """A number decoded by _loads, compared by its text.
+
+    Otherwise 1, 1.0 and true would be equal after decoding, and a change between them
+    would be lost.
+    """
+
+    __slots__ = ["text"]
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __eq__(self, other):
+        return type(other) is _Number and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+
+def _loads(json_string: str) -> Any:
+    return json.loads(json_string, parse_int=_Number, parse_float=_Number)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(
+        value,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=lambda number: json.loads(number.text),
+    )
+
+
+def _diff_lists(old: list, new: list) -> Optional[list[Operation]]:
+    num_old, num_new = len(old), len(new)
+    if num_new >= num_old and old == new[:num_old]:
+        return [["append", _dumps(new[num_old:])]] if num_new > num_old else []
+
+    first_diff = next(
+        (index for index, (a, b) in enumerate(zip(old, new)) if a != b),
+        min(num_old, num_new),
+    )
+    if num_new == num_old - 1 and old[first_diff + 1 :] == new[first_diff:]:
+        return [["delitem", first_diff]]
+    if num_new == num_old + 1 and old[first_diff:] == new[first_diff + 1 :]:
+        return [["insert", first_diff, _dumps(new[first_diff])]]
+    if num_new == num_old:
+        return [
+            ["setitem", index, _dumps(new[index])]
+            for index in range(first_diff, num_new)
+            if old[index] != new[index]
+        ]
+    return None
+
+
+def _diff_dicts(old: dict, new: dict) -> Optional[list[Operation]]:
+    # New keys are appended, so the order of keys only matches if the remaining keys
+    # keep their order, and added keys come after them.
+    remaining = [key for key in old if key in new]
+    if list(new) != remaining + [key for key in new if key not in old]:
+        return None
+    operations = [["delitem", key] for key in old if key not in new]
+    operations.extend(
+        ["setitem", key, _dumps(value)]
+        for key, value in new.items()
+        if key not in old or old[key] != value
+    )
+    return operations
+
+
+def diff(old_json: str, new_json: str) -> Optional[list[Operation]]:
+    """Returns the operations that turn old_json into new_json once decoded.
+
+    Returns None if there's no delta smaller than the new value itself.
+    """
+    # Fast path for appending to a list, which doesn't need decoding. JSON values
+    # delimit themselves, except numbers, which are followed by "," in both arrays.
+    # So if the new array starts with every element of the old one followed by ",",
+    # these are the same elements.
+    if old_json.startswith("[") and new_json.startswith("["):
+        if old_json == "[]":
+            return [["append", new_json]] if new_json != "[]" else []
+        end = len(old_json) - 1
+        if new_json[end : end + 1] == "," and new_json.startswith(old_json[:end]):
+            return [["append", "[" + new_json[end + 1 :]]]
+
+    try:
+        old, new = _loads(old_json), _loads(new_json)
+    except ValueError:
+        # Values that can't be encoded are stored as their repr, which may not be
+        # valid JSON, see utils.to_json.
+        return None
+    if type(old) is not type(new):
+        return None
+    if type(new) is list:
+        operations = _diff_lists(old, new)
+    elif type(new) is dict:
+        operations = _diff_dicts(old, new)
+    else:
+        return None
+    if operations is None or len(operations) > max(1, len(new) // 2):
+        return None
+    return operations
+
+
+def apply(value: Any, operations: list[Operation]) -> Any:
+    """Applies operations to a decoded value in place, and returns it."""
+    for operation in operations:
+        kind = operation[0]
+        if kind == "append":
+            value.extend(json.loads(operation[1]))
+        elif kind == "insert":
+            value.insert(operation[1], json.loads(operation[2]))
+        elif kind == "setitem":
+            value[operation[1]] = json.loads(operation[2])
+        elif kind == "delitem":
+            del value[operation[1]]
+        else:
+            raise ValueError(f"Unknown delta operation: {kind!r}")
+    return value
+
+
+def reconstruct(keyframe: str, deltas: Iterable[ValueDelta]) -> Any:
+    """Decodes keyframe, and applies deltas to it in order."""
+    value = json.loads(keyframe)
+    for value_delta in deltas:
+        apply(value, value_delta.operations)
+    return value
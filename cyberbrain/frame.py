@@ -1,14 +1,24 @@
 from __future__ import annotations
 
-import dis
+import bisect
 from collections import defaultdict
 from dis import Instruction
 
 import os
 from types import FrameType
-from typing import Any
-
-from . import basis, value_stack, utils
+from typing import Any, Callable, Iterable, Mapping, Optional, Union
+
+from . import (
+    arrays,
+    basis,
+    dataframes,
+    delta,
+    memo,
+    purity,
+    summarizers,
+    value_stack,
+    utils,
+)
 from .basis import (
     Event,
     InitialValue,
@@ -21,11 +31,19 @@ from .basis import (
     ExceptionInfo,
     JumpBackToLoopStart,
 )
+from .code_info import CodeInfo, get_code_info
 
 _INITIAL_STATE = -1
 
 Identifier = str  # Just a type alias to make annotations more expressive.
 
+# Texts of values and reprs that can be interned, see Frame._intern.
+_MAX_INTERNED_SIZE = 1024
+_MAX_INTERNED_TEXTS = 100_000
+
+# Values captured without JSON, and sent as msgpack extension types.
+_BinaryValue = Union[arrays.ArrayValue, dataframes.DataFrameValue]
+
 
 class _EventsDict(defaultdict):
     def __contains__(self, name):
@@ -53,7 +71,12 @@ class Frame:
     Whether we still need identifier_to_events is yet to be decided.
     """
 
-    def __init__(self, raw_frame: FrameType):
+    def __init__(
+        self,
+        raw_frame: FrameType,
+        keyframe_interval: Optional[int] = None,
+        limits: Optional[utils.EncodingLimits] = None,
+    ):
         # ################### Read-only attributes ####################
         # Only stores the basename so it's consistent on all operating systems.
         # This is mainly for the ease of testing.
@@ -68,35 +91,46 @@ class Frame:
         )
         # For now, use frame name as frame id. Eventually this should be a unique uuid.
         self.frame_id: str = self.frame_name
-        self.parameters: Set[str] = utils.get_parameters(raw_frame)
         self.defined_lineno: int = raw_frame.f_code.co_firstlineno
-        self.instructions: dict[int, Instruction] = {
-            instr.offset: instr for instr in dis.get_instructions(raw_frame.f_code)
-        }
-        self.offset_to_lineno: dict[int, int] = utils.map_bytecode_offset_to_lineno(
-            raw_frame
-        )
-        # An increasing mapping for determining loops' end_lineno correctly.
-        # See https://git.io/JSLTB for details.
-        # TODO: Can we use the increasing version in all places?
-        self.increasing_offset_to_lineno = dict(sorted(self.offset_to_lineno.items()))
-        previous_lineno = -1
-        for offset, lineno in self.increasing_offset_to_lineno.items():
-            if lineno < previous_lineno:
-                self.increasing_offset_to_lineno[offset] = previous_lineno
-            else:
-                previous_lineno = lineno
+
+        # Static information is shared by all frames of the same code object.
+        self.code_info: CodeInfo = get_code_info(raw_frame.f_code)
+        self.parameters: frozenset[str] = self.code_info.parameters
+        # If set, mutations store a delta.ValueDelta against the previous value of
+        # their identifier when possible, and at most keyframe_interval - 1 deltas of
+        # an identifier are chained before its full value is stored again.
+        self.keyframe_interval: Optional[int] = keyframe_interval
+        # Bounds the size of values, so that a huge value can't stall tracing. Values
+        # exceeding them are truncated, see utils.EncodingLimits.
+        self.limits: utils.EncodingLimits = limits or utils.EncodingLimits()
 
         # ################### Mutable state ####################
-        self.value_stack: value_stack.BaseValueStack = value_stack.create_value_stack()
+        self.value_stack: value_stack.BaseValueStack = value_stack.create_value_stack(
+            self.code_info
+        )
         self.events: list[Event] = []
         self.identifier_to_events: dict[Identifier, list[Event]] = _EventsDict(list)
-        self.snapshots: list[Snapshot] = [
-            # The initial state, where pointer points to zero for every identifier.
-            Snapshot(events_pointer=defaultdict(lambda: _INITIAL_STATE))
-        ]
-        self._latest_snapshot = self.snapshots[0]
+        # Maps identifiers to the versions of snapshot at which they have a new event.
+        # It is shared by all snapshots of this frame, see Snapshot for details.
+        self.version_log: dict[Identifier, list[int]] = {}
+        # The initial state, where pointer points to zero for every identifier.
+        self._latest_snapshot = Snapshot(self.version_log, version=0)
+        # Maps identifiers to the snapshot created by their latest mutation.
+        self._latest_mutations: dict[Identifier, Snapshot] = {}
+        # Maps identifiers whose latest event has a delta to their latest full value,
+        # and the number of chained deltas.
+        self._delta_chains: dict[Identifier, tuple[str, int]] = {}
         self.loops: dict[int, Loop] = {}  # Maps loop start to loop.
+        # Total size of the values encoded in this frame, see _encode.
+        self._encoded_bytes = 0
+        # Encodings and reprs of immutable values, which are often bound or returned
+        # again, e.g. in every iteration of a loop.
+        self.value_memo = memo.ValueMemo()
+        # Texts of values and reprs, so that equal ones are stored once, see _intern.
+        # When streaming, only those of unsent events, see rpc_client.FrameStream.
+        self._interned_texts: dict[str, str] = {}
+        # Called after each new event, e.g. to stream events, see rpc_client.FrameStream.
+        self.on_event: Optional[Callable[[], None]] = None
 
         # ################### Relevant frames ####################
         # Frame that generated this frame. Could be empty if this frame is the outermost
@@ -129,40 +163,62 @@ class Frame:
     def latest_snapshot(self):
         return self._latest_snapshot
 
-    def log_return_event(self, frame: FrameType, value: Any):
-        instr = self.instructions[frame.f_lasti]
+    def log_return_event(
+        self,
+        frame: FrameType,
+        value: Any,
+        sources: Optional[Iterable[Symbol]] = None,
+    ):
+        """Logs the Return event.
+
+        Sources of the returned value come from the value stack, unless given.
+        """
+        instr = self.code_info.instructions[frame.f_lasti // 2]
 
         # Generator related instructions (e.g. YIELD_VALUE) can also trigger a return
         # event. Ignore them for now.
-        if instr.opname != "RETURN_VALUE":
+        if instr.opname == "RETURN_CONST":
+            # Since 3.12, a constant is returned without being pushed to the stack.
+            sources = sources or ()
+        elif instr.opname != "RETURN_VALUE":
             return
 
-        # There should be one and only one item left on the stack before return.
-        assert self.value_stack.stack_level == 1
+        if sources is None:
+            # There should be one and only one item left on the stack before return.
+            assert self.value_stack.stack_level == 1
+            sources = self.value_stack._pop().sources
 
         self.events.append(
             Return(
-                value=utils.to_json(value),
-                repr=utils.get_repr(value),
-                lineno=self.offset_to_lineno[frame.f_lasti],
+                value=self._encode(value),
+                repr=self._get_repr(value),
+                lineno=self.code_info.linenos[frame.f_lasti // 2],
                 filename=self.filename,
                 offset=frame.f_lasti,
-                sources=set(self.value_stack._pop().sources),
+                sources=self._resolve_sources(sources),
                 index=len(self.events),
             )
         )
 
     def log_initial_value_events(self, frame: FrameType, instr: Instruction):
-        # We must use instr.argrepr instead of instr.argval. Example:
+        # We must not use instr.argval, since it's only an identifier for certain
+        # instructions. Example:
         # x = "hello"
         # Instruction(opname='LOAD_CONST', argval='hello', argrepr="'hello'")
         # Note argval is 'hello', which can collide with identifier names in frame.
-        target: str = instr.argrepr
+        target: Optional[str] = self.code_info.identifiers[instr.offset // 2]
+        if target is None:
+            return
+        # Variables of inlined comprehensions are not visible in the frame.
+        if target in self.value_stack.comprehension_variables:
+            return
         try:
             value = utils.get_value_from_frame(target, frame)
+            exists = True
         except AssertionError:
             # The target name may not yet exist in the frame.
             value = None
+            exists = False
 
         if utils.should_ignore_event(target=target, value=value, frame=frame):
             return
@@ -177,13 +233,12 @@ class Frame:
         lineno = self.defined_lineno if target in self.parameters else -1
 
         # Logs InitialValue event if it hasn't been recorded yet.
-        if utils.name_exist_in_frame(target, frame) and not self._knows(target):
-            value = utils.get_value_from_frame(target, frame)
+        if exists and not self._knows(target):
             self._add_new_event(
                 InitialValue(
                     target=Symbol(target),
-                    value=utils.to_json(value),
-                    repr=utils.get_repr(value),
+                    value=self._encode(value),
+                    repr=self._get_repr(value),
                     lineno=lineno,
                     filename=self.filename,
                     offset=instr.offset,
@@ -198,15 +253,16 @@ class Frame:
         exc_info: ExceptionInfo,
     ):
         """Logs changed values by the given instruction, if any."""
+        index = instr.offset // 2
         event_info = self.value_stack.emit_event_and_update_stack(
             instr=instr,
             frame=frame,
             jumped=jumped,
             exc_info=exc_info,
             snapshot=self.latest_snapshot,
-            lineno=self.offset_to_lineno[instr.offset],
+            lineno=self.code_info.linenos[index],
         )
-        if not event_info:
+        if not self.code_info.can_emit_event[index] or not event_info:
             return
 
         target: Symbol = event_info.target
@@ -215,73 +271,211 @@ class Frame:
             print(event_info)
 
         if event_info.type is Mutation:
-            value = utils.get_value_from_frame(target.name, frame)
-            json = utils.to_json(value)
-            if self._latest_value_of(target.name) == json:
-                return
-
-            self._add_new_event(
-                Mutation(
-                    target=target,
-                    value=json,
-                    repr=utils.get_repr(value),
-                    filename=self.filename,
-                    lineno=event_info.lineno,
-                    sources=event_info.sources,
-                    offset=instr.offset,
-                )
+            self.log_mutation_event(
+                frame,
+                target,
+                event_info.sources,
+                event_info.lineno,
+                instr.offset,
+                method=event_info.method,
             )
         elif event_info.type is Binding:
-            value = utils.get_value_from_frame(target.name, frame)
-            self._add_new_event(
-                Binding(
-                    target=target,
-                    value=utils.to_json(value),
-                    repr=utils.get_repr(value),
-                    sources=event_info.sources,
-                    filename=self.filename,
-                    lineno=event_info.lineno,
-                    offset=instr.offset,
-                )
+            self.log_binding_event(
+                frame, target, event_info.sources, event_info.lineno, instr.offset
             )
         elif event_info.type is Deletion:
-            self._add_new_event(
-                Deletion(
-                    target=target,
-                    filename=self.filename,
-                    lineno=event_info.lineno,
-                    offset=instr.offset,
-                )
-            )
+            self.log_deletion_event(target, event_info.lineno, instr.offset)
         elif event_info.type is JumpBackToLoopStart:
-            # [start|end]_[offset|lineno] all refer to the current loop.
-            start_offset = event_info.jump_target
-            start_lineno = self.offset_to_lineno[start_offset]
-            end_offset = instr.offset
-            end_lineno = self.increasing_offset_to_lineno[end_offset]
-            self.events.append(
-                JumpBackToLoopStart(
-                    filename=self.filename,
-                    lineno=end_lineno,
-                    offset=instr.offset,
-                    index=len(self.events),
-                    jump_target=start_offset,
-                )
+            self.log_jump_back_event(
+                start_offset=event_info.jump_target, end_offset=instr.offset
             )
-            if start_offset in self.loops:
-                self.loops[start_offset].end_offset = max(
-                    self.loops[start_offset].end_offset, end_offset
-                )
-                self.loops[start_offset].end_lineno = max(
-                    self.loops[start_offset].end_lineno, end_lineno
-                )
-            else:
-                self.loops[start_offset] = Loop(
-                    start_offset=start_offset,
-                    end_offset=end_offset,
-                    start_lineno=start_lineno,
-                    end_lineno=end_lineno,
+
+    def log_mutation_event(
+        self,
+        frame: FrameType,
+        target: Symbol,
+        sources: Iterable[Symbol],
+        lineno: int,
+        offset: int,
+        method: Optional[str] = None,
+    ):
+        """Logs a mutation of target, if its value has changed.
+
+        If method is given, it's a method of target that was just called successfully,
+        and whether it mutates target is first looked up in purity.py, which avoids
+        serializing target for pure methods and comparing values for mutating ones.
+        """
+        value = utils.get_value_from_frame(target.name, frame)
+        if purity.is_immutable(value):
+            return
+        effect = (
+            purity.method_effect(value, method) if method else purity.Effect.UNKNOWN
+        )
+        if effect is purity.Effect.PURE:
+            return
+        encoded = self._encode(value)
+        if (
+            effect is purity.Effect.UNKNOWN
+            and self._latest_value_of(target.name) == encoded
+        ):
+            # Not stored, so it doesn't count towards the budget of the trace.
+            self._encoded_bytes -= _size(encoded)
+            return
+
+        self._add_new_event(
+            Mutation(
+                target=self._resolve_symbol(target),
+                value=self._delta_or_json(target.name, encoded)
+                if self.keyframe_interval and isinstance(encoded, str)
+                else encoded,
+                repr=self._get_repr(value),
+                filename=self.filename,
+                lineno=lineno,
+                sources=self._resolve_sources(sources),
+                offset=offset,
+            )
+        )
+
+    def _encode(self, value: Any) -> Union[str, _BinaryValue]:
+        """Encodes value within the limits, and charges it to the trace's budget.
+
+        Values are encoded to JSON, except Numpy arrays and Pandas frames, see
+        arrays.py and dataframes.py. Objects with a summarizer are replaced by their
+        summary, see summarizers.py. Encodings of immutable values are memoized, see
+        memo.py.
+        """
+        max_bytes = min(
+            self.limits.max_value_bytes,
+            max(self.limits.max_trace_bytes - self._encoded_bytes, 0),
+        )
+
+        def encode(value: Any) -> Union[str, _BinaryValue]:
+            summary = summarizers.summarize(value, max_bytes)
+            if summary is not None:
+                value = summary
+            return (
+                arrays.capture(value, max_bytes)
+                or dataframes.capture(value, max_bytes)
+                or utils.to_json(
+                    value, max_bytes=max_bytes, max_depth=self.limits.max_depth
                 )
+            )
+
+        # A value is encoded differently once the budget runs low, so the budget is
+        # part of the memo's key.
+        encoded = self.value_memo.get(value, ("json", max_bytes), encode)
+        self._encoded_bytes += _size(encoded)
+        return self._intern(encoded) if isinstance(encoded, str) else encoded
+
+    def _get_repr(self, value: Any) -> str:
+        text = self.value_memo.get(value, "repr", utils.get_repr)
+        return self._intern(text) if isinstance(text, str) else text
+
+    def _intern(self, text: str) -> str:
+        """Returns the stored text equal to text if any, so that it's stored once.
+
+        Small texts like "0", "true" or "None" are encoded again for every event, but
+        are only kept once. Large texts are rarely equal, and are not stored at all.
+        """
+        if len(text) > _MAX_INTERNED_SIZE:
+            return text
+        interned = self._interned_texts.get(text)
+        if interned is not None:
+            return interned
+        if len(self._interned_texts) < _MAX_INTERNED_TEXTS:
+            self._interned_texts[text] = text
+        return text
+
+    def clear_interned_texts(self):
+        """Stops keeping interned texts alive, e.g. once their events are sent."""
+        self._interned_texts.clear()
+
+    def _delta_or_json(self, name: str, json: str) -> Union[delta.ValueDelta, str]:
+        """Returns the delta of an identifier's new value, or json for a keyframe."""
+        previous = self.identifier_to_events[name][-1]
+        previous_json, num_deltas = getattr(previous, "value", None), 0
+        if isinstance(previous_json, delta.ValueDelta):
+            previous_json, num_deltas = self._delta_chains[name]
+        if isinstance(previous_json, str) and num_deltas + 1 < self.keyframe_interval:
+            operations = delta.diff(previous_json, json)
+            if operations is not None:
+                self._delta_chains[name] = (json, num_deltas + 1)
+                return delta.ValueDelta(base=previous.index, operations=operations)
+        return json
+
+    def value_of(self, event: Event) -> Any:
+        """Returns the decoded value of an event, reconstructed from deltas if needed.
+
+        Arrays and frames are returned as captured, see _encode.
+        """
+        if not isinstance(event.value, (str, delta.ValueDelta)):
+            return event.value
+        deltas = []
+        while isinstance(event.value, delta.ValueDelta):
+            deltas.append(event.value)
+            event = self.events[event.value.base]
+        return delta.reconstruct(event.value, reversed(deltas))
+
+    def log_binding_event(
+        self,
+        frame: FrameType,
+        target: Symbol,
+        sources: Iterable[Symbol],
+        lineno: int,
+        offset: int,
+    ):
+        value = utils.get_value_from_frame(target.name, frame)
+        self._add_new_event(
+            Binding(
+                target=target,
+                value=self._encode(value),
+                repr=self._get_repr(value),
+                sources=self._resolve_sources(sources),
+                filename=self.filename,
+                lineno=lineno,
+                offset=offset,
+            )
+        )
+
+    def log_deletion_event(self, target: Symbol, lineno: int, offset: int):
+        self._add_new_event(
+            Deletion(
+                target=target,
+                filename=self.filename,
+                lineno=lineno,
+                offset=offset,
+            )
+        )
+
+    def log_jump_back_event(self, start_offset: int, end_offset: int):
+        # [start|end]_[offset|lineno] all refer to the current loop.
+        start_lineno = self.code_info.linenos[start_offset // 2]
+        end_lineno = self.code_info.increasing_linenos[end_offset // 2]
+        self.events.append(
+            JumpBackToLoopStart(
+                filename=self.filename,
+                lineno=end_lineno,
+                offset=end_offset,
+                index=len(self.events),
+                jump_target=start_offset,
+            )
+        )
+        if self.on_event is not None:
+            self.on_event()
+        if start_offset in self.loops:
+            self.loops[start_offset].end_offset = max(
+                self.loops[start_offset].end_offset, end_offset
+            )
+            self.loops[start_offset].end_lineno = max(
+                self.loops[start_offset].end_lineno, end_lineno
+            )
+        else:
+            self.loops[start_offset] = Loop(
+                start_offset=start_offset,
+                end_offset=end_offset,
+                start_lineno=start_lineno,
+                end_lineno=end_lineno,
+            )
 
     def _add_new_event(self, event: Event):
         target = event.target.name
@@ -293,15 +487,39 @@ class Frame:
         self.events.append(event)
 
         # Creates a new snapshot by incrementing the target index.
-        new_events_pointer = self.snapshots[-1].events_pointer.copy()
-        new_events_pointer[target] += 1
-        new_snapshot = Snapshot(events_pointer=new_events_pointer)
+        new_snapshot = Snapshot(
+            self.version_log, version=self._latest_snapshot.version + 1
+        )
+        self.version_log.setdefault(target, []).append(new_snapshot.version)
         self._latest_snapshot = new_snapshot
-        self.snapshots.append(new_snapshot)
 
-        # If event is a mutation, updates relevant snapshots in value stack.
         if isinstance(event, Mutation):
-            self.value_stack.update_snapshot(event.target.name, self.latest_snapshot)
+            self._latest_mutations[target] = new_snapshot
+
+        if self.on_event is not None:
+            self.on_event()
+
+    def _resolve_symbol(self, symbol: Symbol) -> Symbol:
+        """Binds a symbol that just left the value stack to its final snapshot.
+
+        Symbols on the value stack keep the snapshot of the moment they were loaded
+        and are never modified. However if an identifier is mutated while its symbol
+        is still on the stack, the object on the stack has changed, so the symbol
+        should point to the mutation event instead, e.g.
+
+            e[0] += e.pop()  # e's symbols are loaded before e.pop() mutates e, and
+                             # are popped by STORE_SUBSCR after it.
+
+        A mutation that happened after a symbol was loaded must have happened while
+        the symbol was on the stack, so comparing snapshot versions is enough.
+        """
+        mutation = self._latest_mutations.get(symbol.name)
+        if mutation is not None and mutation.version > symbol.snapshot.version:
+            return Symbol(symbol.name, mutation)
+        return symbol
+
+    def _resolve_sources(self, sources: Iterable[Symbol]) -> set[Symbol]:
+        return {self._resolve_symbol(symbol) for symbol in sources}
 
     def _knows(self, name: str) -> bool:
         return name in self.identifier_to_events
@@ -315,7 +533,14 @@ class Frame:
         if not self._knows(name):
             raise AttributeError(f"'{name}' does not exist in frame.")
 
-        return self.identifier_to_events[name][-1].value
+        value = self.identifier_to_events[name][-1].value
+        if isinstance(value, delta.ValueDelta):
+            return self._delta_chains[name][0]
+        return value
+
+
+def _size(encoded: Union[str, _BinaryValue]) -> int:
+    return len(encoded) if isinstance(encoded, str) else encoded.size
 
 
 class Snapshot:
@@ -324,16 +549,66 @@ class Snapshot:
     Given an event, Snapshot can help you find other variable's value at the same
     point of program execution.
     e.g. What's `b`'s value when `a` is set to 1
+
+    Each new event creates a new snapshot. Instead of copying the whole state, all
+    snapshots of a frame share one version log, which records for each identifier
+    the snapshot versions at which a new event of that identifier was added. A
+    snapshot only stores its own version, the state is derived from the log on
+    demand. Creating a snapshot is thus O(1), and looking up an identifier is
+    O(log n), where n is the number of events of that identifier.
     """
 
     # TODO: Snapshot should contain, but not keyed by code location, because code
     #  location can duplicate.
 
-    __slots__ = ["events_pointer", "location"]
+    __slots__ = ["version_log", "version", "location"]
 
-    def __init__(self, events_pointer, location=None):
+    def __init__(
+        self, version_log: dict[Identifier, list[int]], version: int, location=None
+    ):
         self.location = location
-        self.events_pointer: dict[str, int] = events_pointer
+        self.version_log = version_log
+        self.version = version
+
+    @property
+    def events_pointer(self) -> EventsPointer:
+        return EventsPointer(self.version_log, self.version)
 
     def __repr__(self):
         return repr(self.events_pointer)
+
+
+class EventsPointer(Mapping):
+    """Maps identifiers to the index of their latest event at a snapshot.
+
+    Identifiers that don't have an event yet point to the initial state (-1).
+    """
+
+    __slots__ = ["_version_log", "_version"]
+
+    def __init__(self, version_log: dict[Identifier, list[int]], version: int):
+        self._version_log = version_log
+        self._version = version
+
+    def __getitem__(self, name: Identifier) -> int:
+        versions = self._version_log.get(name)
+        if not versions:
+            return _INITIAL_STATE
+        return bisect.bisect_right(versions, self._version) - 1
+
+    def __contains__(self, name) -> bool:
+        versions = self._version_log.get(name)
+        return bool(versions) and versions[0] <= self._version
+
+    def __iter__(self):
+        return (
+            name
+            for name, versions in self._version_log.items()
+            if versions[0] <= self._version
+        )
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -1,43 +1,22 @@
 from __future__ import annotations
 
+import dis
 from dis import Instruction
 
 from crayons import yellow, cyan
 from types import FrameType
-from typing import Optional
+from typing import Any, Optional
 
 from . import utils
-from .basis import ExcInfoType, ExceptionInfo
+from .basis import Deletion, ExcInfoType, ExceptionInfo, Symbol
+from .code_info import COMPUTED_GOTOS_ENABLED, PREDICT_MAP, CodeInfo
 from .frame import Frame
-from .utils import pprint, computed_gotos_enabled
-
-_implicit_jump_ops = {
-    "BREAK_LOOP",
-    "CONTINUE_LOOP",
-    "RAISE_VARARGS",  # maybe we can remove RERAISE and RAISE_VARARGS
-    "END_FINALLY",
-    "RERAISE",
-}
-
-PREDICT_MAP = {
-    "LIST_APPEND": {"JUMP_ABSOLUTE"},
-    "SET_ADD": {"JUMP_ABSOLUTE"},
-    "GET_ANEXT": {"LOAD_CONST"},
-    "GET_AWAITABLE": {"LOAD_CONST"},
-    "MAP_ADD": {"JUMP_ABSOLUTE"},
-    "COMPARE_OP": {"POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE"},
-    "IS_OP": {"POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE"},
-    "CONTAINS_OP": {"POP_JUMP_IF_FALSE", "POP_JUMP_IF_TRUE"},
-    "GET_ITER": {"FOR_ITER", "CALL_FUNCTION"},
-    "GET_YIELD_FROM_ITER": {"LOAD_CONST"},
-    "FOR_ITER": {"STORE_FAST", "UNPACK_SEQUENCE", "POP_BLOCK"},
-    "BEFORE_ASYNC_WITH": {"GET_AWAITABLE"},
-    "WITH_CLEANUP_START": {"WITH_CLEANUP_FINISH"},
-    "WITH_CLEANUP_FINISH": {"END_FINALLY"},
-    "DICT_MERGE": {"CALL_FUNCTION_EX"},
-}
-
-COMPUTED_GOTOS_ENABLED = computed_gotos_enabled()
+from .utils import pprint
+
+# YIELD_FROM is removed in 3.11, CACHE is added in 3.11.
+_YIELD_FROM = dis.opmap.get("YIELD_FROM", -1)
+_EXTENDED_ARG = dis.opmap["EXTENDED_ARG"]
+_CACHE = dis.opmap.get("CACHE", -1)
 
 
 class FrameLogger:
@@ -45,25 +24,38 @@ class FrameLogger:
 
     def __init__(
         self,
-        instructions: dict[int, Instruction],
+        code_info: CodeInfo,
         initial_instr_pointer: int,
         frame: Frame,
         debug_mode=False,
     ):
-        self.instructions = instructions
+        self.code_info = code_info
         self.frame = frame
         self.instr_pointer = initial_instr_pointer
-        self.jump_detector = JumpDetector(
-            instructions=self.instructions, debug_mode=debug_mode
-        )
+        self.jump_detector = JumpDetector(code_info=code_info, debug_mode=debug_mode)
         # Maybe we can just store to value_stack.last_exception.
         self.last_exception = None
         self.debug_mode = debug_mode
+        # Whether to apply the combined stack effect of runs of instructions, instead
+        # of handling them one by one. It relies on last_i being updated for every
+        # instruction, which is not true without COMPUTED_GOTOS, see PREDICT_MAP.
+        self.applies_stack_effects = COMPUTED_GOTOS_ENABLED and not debug_mode
+
+    def handle_exception(self, frame: FrameType, exc_info: ExcInfoType):
+        frame = utils.FrameView(frame)
+        # Instructions before the one raising the exception might not have been
+        # handled yet, if they are the beginning of a run whose handling is deferred
+        # (see handle_instructions). They were executed without exceptions, so handle
+        # them one by one now.
+        while self.instr_pointer < frame.f_lasti:
+            instr = self.code_info.instructions[self.instr_pointer // 2]
+            self.frame.log_events(frame, instr, jumped=False, exc_info=None)
+            self.instr_pointer += 2
 
-    def handle_exception(self, exc_info: ExcInfoType):
         # We don't need to care about explicitly raise exceptions because the
         # corresponding instruction handlers do all the job.
-        if self.instructions[self.instr_pointer].opname in {"RAISE_VARARGS", "RERAISE"}:
+        instr = self.code_info.instructions[self.instr_pointer // 2]
+        if instr.opname in {"RAISE_VARARGS", "RERAISE"}:
             return
 
         self.last_exception = ExceptionInfo(
@@ -72,6 +64,7 @@ class FrameLogger:
 
     def handle_instructions(self, frame: FrameType):
         """Handles recently executed instructions."""
+        frame = utils.FrameView(frame)
         last_i = frame.f_lasti
 
         # Skips when no instruction has been executed. Note that we should not skip
@@ -79,7 +72,9 @@ class FrameLogger:
         # could jump back to offset 0. See test_while_jump_to_zero.
         if last_i == 0 and len(self.frame.events) == 0:
             # Tracks possible initial value events of symbols in the first instruction.
-            self.frame.log_initial_value_events(frame, self.instructions[last_i])
+            self.frame.log_initial_value_events(
+                frame, self.code_info.instructions[last_i // 2]
+            )
             return
         # print(f"last_i={last_i}, frame={frame}")
 
@@ -135,23 +130,51 @@ class FrameLogger:
         # not, we set instr_pointer to last_i, because last_i == (instr_pointer + 2)
         # if jump didn't happen.
 
+        instructions = self.code_info.instructions
+        opcodes = self.code_info.opcodes
+        run_ends = self.code_info.run_ends
+        applies_stack_effects = self.applies_stack_effects and not self.last_exception
         while True:
-            instr = self.instructions[self.instr_pointer]
+            # If a run of instructions starts here, apply their combined stack effect
+            # once all of them are executed. If only some of them are executed, wait
+            # until last_i moves past the run. This is safe because none of them emits
+            # events, and InitialValue events are only relevant to loads, which are
+            # never part of a run. If an exception is raised inside the run,
+            # handle_exception handles the executed ones.
+            run_end = run_ends[self.instr_pointer // 2]
+            if applies_stack_effects and run_end:
+                if last_i < run_end:
+                    return
+                if self.frame.value_stack.apply_stack_effect(
+                    self.code_info.stack_effects[self.instr_pointer // 2]
+                ):
+                    self.instr_pointer = run_end
+                    if self.instr_pointer >= last_i:
+                        break
+                    continue
+
+            opcode = opcodes[self.instr_pointer // 2]
 
             # A YIELD_FROM instruction will repeat for N times, where N is the number
             # of items generated from the subgenerator. In this case, we shouldn't
             # advance the instr_pointer but let it stay still.
-            if instr.opname == "YIELD_FROM" and self.instr_pointer == last_i:
+            if opcode == _YIELD_FROM and self.instr_pointer == last_i:
                 return
 
-            if instr.opname == "EXTENDED_ARG":
+            # Since 3.12, EXTENDED_ARG has its own opcode event, and a CACHE entry
+            # can be right before last_i, so skipping them can reach last_i. When
+            # last_i is behind, the instruction that follows is a jump backwards.
+            if opcode == _EXTENDED_ARG or opcode == _CACHE:
                 self.instr_pointer += 2
+                if self.instr_pointer == last_i:
+                    break
                 continue
 
+            instr = instructions[self.instr_pointer // 2]
             if self.debug_mode:
                 _log(
                     f"{cyan('Executed instruction')} at line "
-                    + f"{self.frame.offset_to_lineno[instr.offset]}",
+                    + f"{self.code_info.linenos[instr.offset // 2]}",
                     instr,
                 )
 
@@ -196,7 +219,7 @@ class FrameLogger:
             if not COMPUTED_GOTOS_ENABLED:
                 try:
                     # Note that instr_pointer has been increased already.
-                    opname_next = self.instructions[self.instr_pointer].opname
+                    opname_next = instructions[self.instr_pointer // 2].opname
                     if opname_next in PREDICT_MAP.get(instr.opname, {}):
                         if self.debug_mode:
                             print(f"Found PREDICT!! {instr.opname} -> {opname_next}")
@@ -210,67 +233,324 @@ class FrameLogger:
         # Log InitialValue events that's relevant to the line that's about to be
         # executed, this way we record the value before it's (potentially) being
         # modified.
-        self.frame.log_initial_value_events(frame, self.instructions[last_i])
+        self.frame.log_initial_value_events(frame, instructions[last_i // 2])
         self.last_exception = None
 
 
 class JumpDetector:
     """Detects jump behavior."""
 
-    def __init__(self, instructions: dict[int, Instruction], debug_mode):
-        self.instructions = instructions
+    def __init__(self, code_info: CodeInfo, debug_mode):
+        self.code_info = code_info
         self.debug_mode = debug_mode
 
     def detects_jump(self, instr: Instruction, last_i) -> (bool, Optional[int]):
         """
-        An instruction could have both implicit_jump_target and implicit_jump_target.
+        Whether a jump happened is decided by comparing last_i with the value it would
+        have after the jump, which is precomputed per instruction, see CodeInfo.
+
+        An instruction could have both explicit and implicit jump targets.
         e.g. CONTINUE_LOOP, when it's inside a `with` clause, there's an implicit
         jump to the following WITH_CLEANUP_START instruction.
 
-        From observation, implicit jump instructions don't contain PREDICT. So we only
-        process PREDICT if there's explicit_jump_target.
-        TODO: Verify if this is always true.
-
         Returns: (whether jump occurred, jumped-to location)
         """
-        explicit_jump_target = utils.get_jump_target_or_none(instr)
-        implicit_jump_target = last_i if instr.opname in _implicit_jump_ops else None
-
-        if utils.all_none(implicit_jump_target, explicit_jump_target):
+        index = instr.offset // 2
+        if self.code_info.last_i_after_jump[index] == last_i:
+            jump_location = self.code_info.jump_targets[index]
+        elif self.code_info.is_implicit_jump[index]:
+            jump_location = last_i
+        else:
             return False, None
 
-        computed_last_i = explicit_jump_target
-        if not COMPUTED_GOTOS_ENABLED and explicit_jump_target is not None:
-            # Here we assume that PREDICT happens at most once. I'm not sure if this
-            # is always true. If not, we can modify the code.
-            # Example:
-            #              16 GET_ITER
-            #         >>   18 FOR_ITER                 4 (to 24)
-            #              20 STORE_FAST               1 (x)
-            #   5          22 JUMP_ABSOLUTE           18
-            #         >>   24 POP_BLOCK
-            #   7     >>   26 SETUP_LOOP              22 (to 50)
-            #
-            # `PREDICT(POP_BLOCK)` exists in FOR_ITER's handler.
-            # With COMPUTED_GOTOS, PREDICT is a noop, last_i is 24.
-            # Without COMPUTED_GOTOS, PREDICT causes last_i to not update for POP_BLOCK,
-            # so last_i is 26.
-            opname_next = self.instructions[explicit_jump_target].opname
-            if opname_next in PREDICT_MAP.get(instr.opname, {}):
-                if self.debug_mode:
-                    _log(f"Found PREDICT!! {instr.opname} -> {opname_next}")
-                computed_last_i += 2
-
-        if computed_last_i == last_i:
-            if self.debug_mode:
-                _log(f"Jumped to instruction at offset: {explicit_jump_target}")
-            return True, explicit_jump_target
-        elif implicit_jump_target:
-            if self.debug_mode:
-                _log(f"Jumped to instruction at offset: {implicit_jump_target}")
-            return True, implicit_jump_target
+        if self.debug_mode:
+            _log(f"Jumped to instruction at offset: {jump_location}")
+        return True, jump_location
+
+
+class MonitoringLogger:
+    """Logger for a frame traced with sys.monitoring (PEP 669), since Python 3.12.
+
+    Unlike FrameLogger, it doesn't need to infer what happened from last_i. Each
+    event tells the offset of the instruction about to execute, or where a jump goes
+    from and to, so instructions between two events are exactly the ones executed in
+    between, and they are handled when the later event arrives. Instructions inside
+    runs (see stack_effect.py) don't receive events at all, see monitoring.py.
+    """
+
+    def __init__(self, code_info: CodeInfo, initial_instr_pointer: int, frame: Frame):
+        self.code_info = code_info
+        self.frame = frame
+        self.instr_pointer = initial_instr_pointer
+        # Offset of the instruction that raised an exception not handled yet, and the
+        # exception. The instruction is handled at the next event, which is where the
+        # exception is handled.
+        self.raised_at = -1
+        self.last_exception: Optional[ExceptionInfo] = None
+
+    def handle_instruction(self, frame: FrameType, offset: int):
+        """Handles instructions executed before the one at offset."""
+        frame = utils.FrameView(frame)
+        self._handle_until(frame, offset)
+
+        # Log InitialValue events that's relevant to the instruction that's about to
+        # be executed, this way we record the value before it's (potentially) being
+        # modified.
+        self.frame.log_initial_value_events(
+            frame, self.code_info.instructions[offset // 2]
+        )
+
+    def handle_jump(self, frame: FrameType, source: int, destination: int):
+        """Handles a jump or branch from source to destination.
+
+        Branches that are not taken are reported too, with the next instruction as
+        the destination.
+        """
+        frame = utils.FrameView(frame)
+        self._handle_until(frame, source)
+        jumped = destination == self.code_info.jump_targets[source // 2]
+        self.frame.log_events(
+            frame,
+            self.code_info.instructions[source // 2],
+            jumped=jumped,
+            exc_info=None,
+        )
+        self.instr_pointer = destination
+
+    def handle_exception(self, frame: FrameType, offset: int, exc: BaseException):
+        """Handles an exception raised in the frame or propagated to it.
+
+        For exceptions propagated from a call, offset could point to the inline cache
+        entries of the call instruction.
+        """
+        instructions = self.code_info.instructions
+        while instructions[offset // 2].opcode == _CACHE:
+            offset -= 2
+        opname = instructions[offset // 2].opname
+
+        # Explicitly raised exceptions are taken care of by instruction handlers,
+        # and StopIteration from iterators means the iteration is over.
+        if opname in {"RAISE_VARARGS", "RERAISE"} or (
+            opname in {"FOR_ITER", "SEND"} and isinstance(exc, StopIteration)
+        ):
+            return
+
+        self._handle_until(utils.FrameView(frame), offset)
+        self.raised_at = offset
+        self.last_exception = ExceptionInfo(
+            type=type(exc), value=exc, traceback=exc.__traceback__
+        )
+
+    def handle_return(self, frame: FrameType, value: Any):
+        frame = utils.FrameView(frame)
+        self._handle_until(frame, frame.f_lasti)
+        self.frame.log_return_event(frame, value)
+
+    def _handle_until(self, frame: FrameType, offset: int):
+        """Handles instructions from instr_pointer to offset, excluding offset."""
+        if self.raised_at != -1:
+            # The exception was handled, and offset is where the handler is.
+            self.frame.log_events(
+                frame,
+                self.code_info.instructions[self.raised_at // 2],
+                jumped=True,
+                exc_info=self.last_exception,
+            )
+            self.raised_at = -1
+            self.last_exception = None
+            self.instr_pointer = offset
+            return
 
-        return False, None
+        code_info = self.code_info
+        opcodes = code_info.opcodes
+        run_ends = code_info.run_ends
+        value_stack = self.frame.value_stack
+        while self.instr_pointer < offset:
+            index = self.instr_pointer // 2
+            run_end = run_ends[index]
+            if (
+                run_end
+                and run_end <= offset
+                and value_stack.apply_stack_effect(code_info.stack_effects[index])
+            ):
+                self.instr_pointer = run_end
+                continue
+
+            opcode = opcodes[index]
+            if opcode == _EXTENDED_ARG or opcode == _CACHE:
+                self.instr_pointer += 2
+                continue
+
+            self.frame.log_events(
+                frame, code_info.instructions[index], jumped=False, exc_info=None
+            )
+            if code_info.is_implicit_jump[index]:
+                # e.g. RERAISE, offset is where the exception is handled.
+                self.instr_pointer = offset
+                return
+            self.instr_pointer += 2
+
+
+_MISSING = object()
+
+
+def _fingerprint(value: Any) -> Any:
+    """Returns a cheap fingerprint of value, which changes if value is mutated.
+
+    Only the identities of a container's direct elements are considered, so mutating
+    a nested container is not detected. None is returned for values whose in-place
+    changes can't be detected this way.
+    """
+    if isinstance(value, list):
+        return tuple(map(id, value))
+    if isinstance(value, dict):
+        return tuple(map(id, value)), tuple(map(id, value.values()))
+    if isinstance(value, set):
+        return frozenset(map(id, value))
+    if isinstance(value, bytearray):
+        return bytes(value)
+    attributes = getattr(value, "__dict__", None)
+    if isinstance(attributes, dict):
+        return _fingerprint(attributes)
+    return None
+
+
+class LineLogger:
+    """Logger for a frame traced in line mode.
+
+    Instead of handling every executed instruction, it only handles "line" events. The
+    frame's locals are compared before and after each line to find out changed
+    identifiers:
+      - An identifier bound to a different object has a Binding event.
+      - An identifier whose object has a different fingerprint has a Mutation event.
+        Only identifiers loaded by the line are checked.
+      - An identifier that no longer exists has a Deletion event.
+
+    Sources of these events are all the identifiers loaded by the line, which are known
+    from the bytecode. Events are thus less precise than the ones in opcode mode. e.g.
+    rebinding an identifier to the same object can't be seen, and global variables are
+    only checked on lines that load them.
+    """
+
+    def __init__(self, code_info: CodeInfo, frame: Frame, raw_frame: FrameType):
+        self.code_info = code_info
+        self.frame = frame
+        # The start offset and lineno of the line being executed, if any.
+        self.line_offset: Optional[int] = None
+        self.lineno: Optional[int] = None
+        # Identifier to (value, fingerprint) before the current line executes.
+        self.values: dict[str, tuple[Any, Any]] = {}
+        self._record_values(raw_frame)
+
+    def handle_line(self, frame: FrameType):
+        """Handles the line that just finished, and prepares for the next line."""
+        frame = utils.FrameView(frame)
+        last_i = frame.f_lasti
+        if self.line_offset is not None:
+            self._log_line_events(frame)
+            # A line event at or before the previous line's start means a jump back,
+            # for example to the start of a loop.
+            if last_i <= self.line_offset:
+                self.frame.log_jump_back_event(
+                    start_offset=last_i, end_offset=self._find_jump_to(last_i)
+                )
+
+        self.line_offset = last_i
+        self.lineno = self.code_info.linenos[last_i // 2]
+        for instr in self._loads():
+            self.frame.log_initial_value_events(frame, instr)
+        self._record_values(frame)
+
+    def handle_return(self, frame: FrameType, value: Any):
+        frame = utils.FrameView(frame)
+        if self.line_offset is not None:
+            self._log_line_events(frame)
+        self.frame.log_return_event(frame, value, sources=self._sources())
+
+    def _loads(self) -> tuple[Instruction, ...]:
+        return self.code_info.loads_by_line.get(self.lineno, ())
+
+    def _loaded_names(self) -> list[str]:
+        identifiers = self.code_info.identifiers
+        return [identifiers[instr.offset // 2] for instr in self._loads()]
+
+    def _sources(self) -> set[Symbol]:
+        snapshot = self.frame.latest_snapshot
+        return {
+            Symbol(name, snapshot)
+            for name in self._loaded_names()
+            if self._is_tracked(name)
+        }
+
+    def _is_tracked(self, name: str) -> bool:
+        # Not `name in identifier_to_events`, which adds an entry for every name, see
+        # _EventsDict, so builtins and globals would be sent as identifiers.
+        events = self.frame.identifier_to_events.get(name)
+        return bool(events) and not isinstance(events[-1], Deletion)
+
+    def _record_values(self, frame: FrameType):
+        self.values = {name: (value, None) for name, value in frame.f_locals.items()}
+        for name in self._loaded_names():
+            # Skips identifiers that are not tracked, e.g. modules and builtins.
+            if not self._is_tracked(name):
+                continue
+            try:
+                value = utils.get_value_from_frame(name, frame)
+            except AssertionError:
+                continue  # Deleted.
+            self.values[name] = (value, _fingerprint(value))
+
+    def _log_line_events(self, frame: FrameType):
+        sources = self._sources()
+        snapshot = self.frame.latest_snapshot
+        f_locals = frame.f_locals
+        loaded = set(self._loaded_names())
+
+        for name, (old_value, old_fingerprint) in self.values.items():
+            if name in f_locals:
+                value = f_locals[name]
+            elif name in loaded:
+                # Not a local variable, e.g. a global variable.
+                try:
+                    value = utils.get_value_from_frame(name, frame)
+                except AssertionError:
+                    value = _MISSING
+            else:
+                value = _MISSING
+
+            if value is _MISSING:
+                self.frame.log_deletion_event(
+                    Symbol(name), self.lineno, self.line_offset
+                )
+            elif value is not old_value:
+                self.frame.log_binding_event(
+                    frame, Symbol(name), sources, self.lineno, self.line_offset
+                )
+            elif old_fingerprint is not None and old_fingerprint != _fingerprint(value):
+                self.frame.log_mutation_event(
+                    frame,
+                    Symbol(name, snapshot),
+                    sources,
+                    self.lineno,
+                    self.line_offset,
+                )
+
+        for name in f_locals.keys() - self.values.keys():
+            self.frame.log_binding_event(
+                frame, Symbol(name), sources, self.lineno, self.line_offset
+            )
+
+    def _find_jump_to(self, target: int) -> int:
+        """Returns the offset of the instruction that jumped back to target.
+
+        It's the first jump to target since the start of the previous line. Falls back
+        to the start of the previous line if there isn't one.
+        """
+        jump_targets = self.code_info.jump_targets
+        for index in range(self.line_offset // 2, len(jump_targets)):
+            if jump_targets[index] == target:
+                return index * 2
+        return self.line_offset
 
 
 def _log(*msg):
@@ -0,0 +1,92 @@
+"""Memo of the encodings of immutable values.
+
+The same immutable object, like a big tuple constant or a long string, is often
+encoded again every time it's bound or returned, e.g. once per loop iteration. Since it
+can't change, its JSON and repr are cached, keyed by its identity and type.
+
+Ids are only unique among live objects, so each entry holds a reference to its object,
+which keeps the id from being recycled for another object while the entry exists.
+A weakref can't be used, since most immutable types (str, tuple, int...) don't support
+them. As entries keep their objects alive, the memo is bounded, and evicts its least
+recently used entries first.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from . import purity
+
+# Smaller values are cheap to encode, and not worth an entry.
+_MIN_CACHED_SIZE = 64
+
+
+class ValueMemo:
+    """An LRU cache of texts computed from immutable values.
+
+    The size of an entry is the length of its text. Entries are evicted once there
+    are more than max_entries of them, or their total size exceeds max_bytes.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16_000_000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # (id, type, kind) -> (value, text), from least to most recently used.
+        self._entries: OrderedDict[
+            tuple[int, type, Hashable], tuple[Any, str]
+        ] = OrderedDict()
+        self._num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def num_bytes(self) -> int:
+        return self._num_bytes
+
+    @property
+    def hit_rate(self) -> float:
+        """Ratio of lookups of memoizable values that were served from the memo."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, value: Any, kind: Hashable, compute: Callable[[Any], Any]) -> Any:
+        """Returns compute(value), memoized if value is immutable.
+
+        kind identifies compute and its parameters, since the same value can be
+        memoized for several of them (e.g. its JSON and its repr).
+        """
+        key = (id(value), type(value), kind)
+        entry = self._entries.get(key)
+        # The entry holds the value, so no other object can have the same id.
+        if entry is not None and entry[0] is value:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        result = compute(value)
+        # Only texts are memoized, binary values are never immutable anyway.
+        if (
+            isinstance(result, str)
+            and len(result) >= _MIN_CACHED_SIZE
+            and purity.is_immutable(value)
+        ):
+            self.misses += 1
+            self._add(key, value, result)
+        return result
+
+    def _add(self, key: tuple[int, type, Hashable], value: Any, text: str):
+        if len(text) > self.max_bytes:
+            return
+        self._entries[key] = (value, text)
+        self._num_bytes += len(text)
+        while len(self._entries) > self.max_entries or self._num_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._num_bytes -= len(evicted)
+
+    def clear(self):
+        self._entries.clear()
+        self._num_bytes = 0
@@ -0,0 +1,182 @@
+"""Tracing backend based on sys.monitoring (PEP 669), available since Python 3.12.
+
+With sys.settrace, every instruction of every frame triggers the tracer, and frames we
+don't care about are only filtered out in Python code. sys.monitoring lets us enable
+events for the traced code object only, so that other code runs at full speed.
+
+Locations that never need an event are not disabled by returning DISABLE, since they
+could only be re-enabled by sys.monitoring.restart_events, which also re-enables the
+locations disabled by other tools, like coverage.py.
+
+The only event that can't be enabled per code object is RAISE, so it's enabled while
+tracing, and filtered by code object in the callback.
+"""
+
+from __future__ import annotations
+
+import sys
+from types import CodeType, FrameType
+from typing import Any, Callable, Optional
+
+from .code_info import CodeInfo
+
+if hasattr(sys, "monitoring"):
+    _monitoring = sys.monitoring
+    _events = _monitoring.events
+    # Events needed to handle every executed instruction, see MonitoringLogger.
+    OPCODE_EVENTS = (
+        _events.INSTRUCTION | _events.JUMP | _events.BRANCH | _events.PY_RETURN
+    )
+    # Events needed by LineLogger.
+    LINE_EVENTS = _events.LINE | _events.PY_RETURN
+
+_TOOL_NAME = "cyberbrain"
+_tool_id: Optional[int] = None
+
+# The monitor that currently receives events. Like sys.settrace, only one function is
+# traced at a time.
+_active_monitor: Optional[Monitor] = None
+
+
+def _get_tool_id() -> int:
+    """Returns the tool id used by Cyberbrain, acquires one if needed."""
+    global _tool_id
+    if _tool_id is not None:
+        return _tool_id
+    for tool_id in (_monitoring.DEBUGGER_ID, *range(6)):
+        if _monitoring.get_tool(tool_id) is None:
+            _monitoring.use_tool_id(tool_id, _TOOL_NAME)
+            _tool_id = tool_id
+            return tool_id
+    raise RuntimeError("No sys.monitoring tool id is available.")
+
+
+def _find_interior_offsets(code_info: CodeInfo) -> bytes:
+    """Returns a column that tells whether an instruction never needs events.
+
+    Instructions inside runs (except the first one) are applied together with the
+    first one, see stack_effect.py. EXTENDED_ARG is handled with the instruction that
+    follows. Neither can be jumped to.
+    """
+    interior = bytearray(len(code_info.instructions))
+    for index, run_end in enumerate(code_info.run_ends):
+        if run_end:
+            interior[index + 1 : run_end // 2] = b"\x01" * (run_end // 2 - index - 1)
+    for index, instr in enumerate(code_info.instructions):
+        if instr.opname == "EXTENDED_ARG":
+            interior[index] = True
+    return bytes(interior)
+
+
+class Monitor:
+    """Delivers events of a code object's frame to a logger.
+
+    Events of the code object are enabled by `watch`. Nothing is delivered until a
+    frame is attached, either explicitly (tracer.start()), or by the `on_start`
+    callback when the code object starts running (the @trace decorator).
+
+    The logger is any object with the handle_* methods that correspond to the enabled
+    events, i.e. MonitoringLogger or LineLogger.
+    """
+
+    def __init__(self, code: CodeType, code_info: CodeInfo, events: int):
+        self.code = code
+        self.code_info = code_info
+        self.events = events
+        self.interior = _find_interior_offsets(code_info)
+        self.raw_frame: Optional[FrameType] = None
+        self.logger = None
+        # Called with the frame when the code starts running, returns the logger, or
+        # None if the frame should not be traced.
+        self.on_start: Optional[Callable[[FrameType], Any]] = None
+
+    def watch(self, on_start: Optional[Callable[[FrameType], Any]] = None):
+        """Enables events for the code object, replacing the active monitor."""
+        global _active_monitor
+        if _active_monitor is not None:
+            _active_monitor.stop()
+        _active_monitor = self
+
+        tool_id = _get_tool_id()
+        callbacks = {
+            _events.PY_START: self._on_py_start,
+            _events.INSTRUCTION: self._on_instruction,
+            _events.JUMP: self._on_jump,
+            _events.BRANCH: self._on_jump,
+            _events.PY_RETURN: self._on_py_return,
+            _events.LINE: self._on_line,
+            _events.RAISE: self._on_raise,
+        }
+        for event, callback in callbacks.items():
+            _monitoring.register_callback(tool_id, event, callback)
+
+        self.on_start = on_start
+        events = self.events | (_events.PY_START if on_start else 0)
+        _monitoring.set_local_events(tool_id, self.code, events)
+        if events & _events.INSTRUCTION:
+            _monitoring.set_events(tool_id, _events.RAISE)
+
+    def attach(self, raw_frame: FrameType, logger):
+        """Delivers events of raw_frame to logger from now on."""
+        self.raw_frame = raw_frame
+        self.logger = logger
+
+    def stop(self):
+        """Disables all events and detaches the frame."""
+        global _active_monitor
+        if _active_monitor is self:
+            _active_monitor = None
+            tool_id = _get_tool_id()
+            _monitoring.set_events(tool_id, 0)
+            _monitoring.set_local_events(tool_id, self.code, 0)
+            for event in (
+                _events.PY_START,
+                _events.INSTRUCTION,
+                _events.JUMP,
+                _events.BRANCH,
+                _events.PY_RETURN,
+                _events.LINE,
+                _events.RAISE,
+            ):
+                _monitoring.register_callback(tool_id, event, None)
+        self.raw_frame = None
+        self.logger = None
+
+    # Callbacks. Events of other frames of the code object, e.g. recursive calls, are
+    # ignored.
+
+    def _on_py_start(self, code: CodeType, offset: int):
+        if self.raw_frame is None and self.on_start is not None:
+            raw_frame = sys._getframe(1)
+            logger = self.on_start(raw_frame)
+            if logger is not None:
+                self.attach(raw_frame, logger)
+
+    def _on_instruction(self, code: CodeType, offset: int):
+        if self.interior[offset // 2]:
+            return
+        raw_frame = sys._getframe(1)
+        if raw_frame is self.raw_frame:
+            self.logger.handle_instruction(raw_frame, offset)
+
+    def _on_jump(self, code: CodeType, source: int, destination: int):
+        raw_frame = sys._getframe(1)
+        if raw_frame is self.raw_frame:
+            self.logger.handle_jump(raw_frame, source, destination)
+
+    def _on_py_return(self, code: CodeType, offset: int, value: Any):
+        raw_frame = sys._getframe(1)
+        if raw_frame is self.raw_frame:
+            self.logger.handle_return(raw_frame, value)
+
+    def _on_line(self, code: CodeType, lineno: int):
+        raw_frame = sys._getframe(1)
+        if raw_frame is self.raw_frame:
+            self.logger.handle_line(raw_frame)
+
+    def _on_raise(self, code: CodeType, offset: int, exc: BaseException):
+        if code is not self.code:
+            return
+        raw_frame = sys._getframe(1)
+        if raw_frame is self.raw_frame:
+            self.logger.handle_exception(raw_frame, offset, exc)
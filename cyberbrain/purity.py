@@ -0,0 +1,182 @@
+"""Knowledge about whether calling a method mutates the object it's called on.
+
+Every method call on an identifier is a potential mutation, which is confirmed by
+serializing the identifier's value and comparing it with the previous one. That's
+expensive for large objects, and unnecessary for methods known to be pure (e.g.
+dict.get) or mutating (e.g. list.append), or for immutable objects.
+
+Methods are registered on the class that defines them, by the class's full name, so
+that classes from optional dependencies like Numpy and Pandas can be registered
+without importing them. Users can register more with register_pure_methods and
+register_mutating_methods.
+"""
+
+from __future__ import annotations
+
+import enum
+from typing import Any, Union
+
+
+class Effect(enum.Enum):
+    UNKNOWN = 0  # The value has to be compared to know.
+    PURE = 1  # Never mutates the object.
+    MUTATING = 2  # Mutates the object whenever the call succeeds.
+
+
+# Full class name -> {method name: effect}.
+_registry: dict[str, dict[str, Effect]] = {}
+
+# (type of the object, method name) -> effect, see method_effect.
+_effect_cache: dict[tuple[type, str], Effect] = {}
+
+_IMMUTABLE_TYPES = frozenset(
+    {int, float, complex, bool, str, bytes, range, type(None), type(Ellipsis)}
+)
+
+
+def class_name(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def _register(cls: Union[type, str], methods: tuple[str, ...], effect: Effect):
+    name = cls if isinstance(cls, str) else class_name(cls)
+    _registry.setdefault(name, {}).update(dict.fromkeys(methods, effect))
+    _effect_cache.clear()
+
+
+def register_pure_methods(cls: Union[type, str], *methods: str):
+    """Registers methods of cls that never mutate the object they're called on.
+
+    cls is a class, or its full name like "numpy.ndarray". Calls of these methods
+    are never reported as mutations, and cost nothing to check.
+    """
+    _register(cls, methods, Effect.PURE)
+
+
+def register_mutating_methods(cls: Union[type, str], *methods: str):
+    """Registers methods of cls that mutate the object they're called on.
+
+    cls is a class, or its full name like "numpy.ndarray". Successful calls of these
+    methods are reported as mutations without comparing the object's value with the
+    previous one, so a call that happens to leave the value unchanged (e.g. sorting
+    a sorted list) is reported too.
+    """
+    _register(cls, methods, Effect.MUTATING)
+
+
+def method_effect(value: Any, method: str) -> Effect:
+    """Returns the effect of calling method on value.
+
+    The effect is looked up on the class that defines the method, so subclasses that
+    don't override a registered method share its effect.
+    """
+    cls = type(value)
+    try:
+        return _effect_cache[cls, method]
+    except KeyError:
+        pass
+
+    effect = Effect.UNKNOWN
+    for klass in cls.__mro__:
+        if method in klass.__dict__:
+            effect = _registry.get(class_name(klass), {}).get(method, Effect.UNKNOWN)
+            break
+    _effect_cache[cls, method] = effect
+    return effect
+
+
+def is_immutable(value: Any) -> bool:
+    """Whether value can never be mutated.
+
+    Only exact types are considered, since subclasses can have mutable attributes.
+    """
+    cls = type(value)
+    if cls in _IMMUTABLE_TYPES:
+        return True
+    if cls is tuple or cls is frozenset:
+        return all(map(is_immutable, value))
+    return False
+
+
+register_pure_methods(list, "copy", "count", "index")
+register_mutating_methods(
+    list, "append", "clear", "extend", "insert", "pop", "remove", "reverse", "sort"
+)
+register_pure_methods(dict, "copy", "get", "items", "keys", "values")
+register_mutating_methods(dict, "clear", "popitem", "update")
+register_pure_methods(
+    set,
+    "copy",
+    "difference",
+    "intersection",
+    "isdisjoint",
+    "issubset",
+    "issuperset",
+    "symmetric_difference",
+    "union",
+)
+register_mutating_methods(
+    set,
+    "clear",
+    "difference_update",
+    "intersection_update",
+    "pop",
+    "remove",
+    "symmetric_difference_update",
+    "update",
+)
+register_pure_methods(
+    bytearray,
+    "count",
+    "decode",
+    "endswith",
+    "find",
+    "hex",
+    "index",
+    "startswith",
+)
+register_mutating_methods(
+    bytearray, "append", "clear", "extend", "insert", "pop", "remove", "reverse"
+)
+
+# Methods with an `out` or `inplace` argument are left out, since they may or may not
+# mutate the object. Except reductions, whose `out` is hardly ever the array itself.
+register_pure_methods(
+    "numpy.ndarray",
+    "all",
+    "any",
+    "argmax",
+    "argmin",
+    "argsort",
+    "astype",
+    "copy",
+    "dot",
+    "flatten",
+    "max",
+    "mean",
+    "min",
+    "prod",
+    "ravel",
+    "reshape",
+    "std",
+    "sum",
+    "tobytes",
+    "tolist",
+    "transpose",
+    "var",
+    "view",
+)
+register_mutating_methods("numpy.ndarray", "fill", "partition", "put", "sort")
+# Pandas methods are mostly defined on base classes shared by DataFrame and Series.
+register_pure_methods("pandas.core.generic.NDFrame", "copy", "describe", "head", "tail")
+register_pure_methods("pandas.core.base.IndexOpsMixin", "nunique", "to_numpy")
+# Since Pandas 3, public classes are named after the top-level module.
+for _pandas_class in (
+    "pandas.core.frame.DataFrame",
+    "pandas.core.series.Series",
+    "pandas.DataFrame",
+    "pandas.Series",
+):
+    register_pure_methods(
+        _pandas_class, "groupby", "isna", "notna", "nunique", "to_dict", "to_numpy"
+    )
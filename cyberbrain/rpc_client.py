@@ -4,6 +4,16 @@ Server that serves requests from UI (VSC as of now).
 
 from __future__ import annotations
 
+import atexit
+import dataclasses
+import itertools
+import queue
+import threading
+import time
+import traceback
+import zlib
+from typing import Any, Iterable, Optional, Union
+
 import attr
 import msgpack
 import requests
@@ -17,10 +27,13 @@ from .basis import (
     Return,
     JumpBackToLoopStart,
 )
+from .arrays import ArrayValue
+from .dataframes import DataFrameValue
+from .delta import ValueDelta
 from .frame import Frame
 
 
-def _get_event_sources_uids(event: Event, frame: Frame) -> Optional[list[str]]:
+def _get_source_events(event: Event, frame: Frame) -> Optional[list[Event]]:
     """Do tracing.
 
     Given code like:
@@ -72,51 +85,408 @@ def _get_event_sources_uids(event: Event, frame: Frame) -> Optional[list[str]]:
     if not event.sources:
         return
 
-    sources_uids = []
+    source_events = []
     for source in sorted(event.sources, key=lambda x: x.name):
         source_event_index = source.snapshot.events_pointer[source.name]
         source_event = frame.identifier_to_events[source.name][source_event_index]
-        sources_uids.append(source_event.id)
+        source_events.append(source_event)
+
+    return source_events
+
+
+# Version of the schema of the frames sent to the RPC server.
+# 1: every event is a map of its fields, with a uuid, and tracingResult maps uuids to
+#    the uuids of the sources of events. Chunks sent by FrameStream use it.
+# 2: events are columns of fields, strings (filenames, identifiers and type names) are
+#    indices into a table, and events are identified by their index. JSON values and
+#    reprs are indices into another table, so that equal ones are sent once. Values
+#    sent as msgpack extension types are not in the table. Sparse fields
+#    (deltas and jump targets) are lists of [event index, field...], and tracingResult
+#    is a list of [event index, source event indices...].
+WIRE_VERSION = 2
+
+_EVENTS_WITH_VALUE = frozenset({"InitialValue", "Binding", "Mutation", "Return"})
+
+# Maximum number of frames and chunks waiting to be sent. Further ones wait for a free
+# slot, which bounds the memory held by unsent frames.
+MAX_PENDING_FRAMES = 16
+
+# Seconds to wait at exit for pending frames to be sent.
+FLUSH_TIMEOUT = 10
+
+
+# Request bodies smaller than this are sent uncompressed.
+MIN_COMPRESSED_SIZE = 1024
+
+
+def compression_level(size: int) -> int:
+    """Returns the zlib level used to compress a body of the given size.
+
+    Small bodies are compressed well for cheap, large ones as fast as possible, since
+    their cost grows with the size.
+    """
+    if size < 1_000_000:
+        return 6
+    if size < 16_000_000:
+        return 3
+    return 1
+
+
+@dataclasses.dataclass(frozen=True)
+class StreamingOptions:
+    """Sends the events of a frame to the RPC server while it's traced, see FrameStream.
+
+    Attributes:
+        max_events: events are sent once there are this many unsent ones.
+        interval: events are sent once this many seconds passed since the last chunk.
+    """
+
+    max_events: int = 1000
+    interval: float = 1.0
+
+
+def _event_dict(event: Event) -> dict[str, Any]:
+    event_dict = attr.asdict(
+        event,
+        filter=lambda field, _: field.name != "sources",
+        value_serializer=event.value_serializer,
+    )
+
+    # We have to explicitly write the type name because Js does not know it.
+    event_dict["type"] = type(event).__name__
+    # Values stored as deltas are reconstructed by TraceData in Js.
+    value = getattr(event, "value", None)
+    if isinstance(value, ValueDelta):
+        event_dict["delta"] = event_dict.pop("value")
+    elif isinstance(value, (ArrayValue, DataFrameValue)):
+        # Decoded by the extension codec in Js, see ext_types.ts.
+        event_dict["value"] = value.to_ext()
+    return event_dict
+
+
+def _tracing_result(events: Iterable[Event], frame: Frame) -> dict[str, list[str]]:
+    tracing_result = {}
+    for event in events:
+        source_events = _get_source_events(event, frame)
+        if source_events:
+            tracing_result[event.id] = [source.id for source in source_events]
+    return tracing_result
+
+
+def _loops(frame: Frame) -> list[dict[str, int]]:
+    return [
+        {
+            "startOffset": loop.start_offset,
+            "endOffset": loop.end_offset,
+            "startLineno": loop.start_lineno,
+            "endLineno": loop.end_lineno,
+        }
+        for loop in frame.loops.values()
+    ]
+
+
+def _frame_data(frame: Frame) -> dict[str, Any]:
+    return {
+        "metadata": frame.metadata,
+        "identifiers": list(frame.identifier_to_events.keys()),
+        "loops": _loops(frame),
+        "events": [_event_dict(event) for event in frame.events],
+        "tracingResult": _tracing_result(frame.events, frame),
+    }
+
+
+def _compact_frame_data(frame: Frame) -> dict[str, Any]:
+    """Returns the data of frame in the compact schema, see WIRE_VERSION."""
+    strings: dict[str, int] = {}
+    texts: dict[str, int] = {}
+
+    def intern(string: str) -> int:
+        return strings.setdefault(string, len(strings))
+
+    def intern_text(text: str) -> int:
+        return texts.setdefault(text, len(texts))
+
+    types, linenos, offsets, filenames, targets, values, reprs = ([] for _ in range(7))
+    deltas, jump_targets, tracing_result = [], [], []
+    for event in frame.events:
+        types.append(intern(type(event).__name__))
+        linenos.append(event.lineno)
+        offsets.append(event.offset)
+        filenames.append(intern(event.filename))
+        target = getattr(event, "target", None)
+        targets.append(None if target is None else intern(target.name))
+        value = getattr(event, "value", None)
+        if isinstance(value, ValueDelta):
+            deltas.append([event.index, value.base, value.operations])
+            value = None
+        elif isinstance(value, (ArrayValue, DataFrameValue)):
+            value = value.to_ext()
+        elif value is not None:
+            value = intern_text(value)
+        values.append(value)
+        text = getattr(event, "repr", None)
+        reprs.append(None if text is None else intern_text(text))
+        if type(event) is JumpBackToLoopStart:
+            jump_targets.append([event.index, event.jump_target])
+        source_events = _get_source_events(event, frame)
+        if source_events:
+            tracing_result.append(
+                [event.index, *(source.index for source in source_events)]
+            )
+
+    identifiers = [intern(name) for name in frame.identifier_to_events]
+    return {
+        "version": 2,
+        "metadata": frame.metadata,
+        "identifiers": identifiers,
+        "loops": _loops(frame),
+        "events": {
+            "type": types,
+            "lineno": linenos,
+            "offset": offsets,
+            "filename": filenames,
+            "target": targets,
+            "value": values,
+            "repr": reprs,
+            "delta": deltas,
+            "jumpTarget": jump_targets,
+        },
+        "tracingResult": tracing_result,
+        "strings": list(strings),
+        "texts": list(texts),
+    }
 
-    return sources_uids
+
+def encode_frame(frame: Frame, version: int = WIRE_VERSION) -> bytes:
+    """Returns the body of the request that sends frame to the RPC server."""
+    if version == 1:
+        return msgpack.packb(_frame_data(frame))
+    return msgpack.packb(_compact_frame_data(frame))
+
+
+def decode_compact_frame(data: dict[str, Any]) -> dict[str, Any]:
+    """Turns frame data in the compact schema back into the first one.
+
+    Event ids are replaced by indices. Like decodeCompactFrame in trace_data.js.
+    """
+    strings, texts = data["strings"], data["texts"]
+    columns = data["events"]
+    deltas = {index: (base, operations) for index, base, operations in columns["delta"]}
+    jump_targets = dict(columns["jumpTarget"])
+    events = []
+    for index, type_index in enumerate(columns["type"]):
+        event_type = strings[type_index]
+        event = {
+            "lineno": columns["lineno"][index],
+            "index": index,
+            "offset": columns["offset"][index],
+            "filename": strings[columns["filename"][index]],
+            "id": index,
+            "type": event_type,
+        }
+        if columns["target"][index] is not None:
+            event["target"] = strings[columns["target"][index]]
+        if event_type in _EVENTS_WITH_VALUE:
+            if index in deltas:
+                base, operations = deltas[index]
+                event["delta"] = {"base": base, "operations": operations}
+            else:
+                value = columns["value"][index]
+                event["value"] = texts[value] if type(value) is int else value
+            text = columns["repr"][index]
+            event["repr"] = None if text is None else texts[text]
+        if event_type == "JumpBackToLoopStart":
+            event["jump_target"] = jump_targets[index]
+        events.append(event)
+
+    return {
+        "metadata": data["metadata"],
+        "identifiers": [strings[index] for index in data["identifiers"]],
+        "loops": data["loops"],
+        "events": events,
+        "tracingResult": {
+            adjacency[0]: adjacency[1:] for adjacency in data["tracingResult"]
+        },
+    }
 
 
 class RpcClient:
-    def __init__(self, rpc_server_port=1989):
+    """Sends traced frames to the RPC server.
+
+    Frames are encoded and sent by a background thread, so that a large trace doesn't
+    block the traced program. Requests reuse the connections of a session.
+
+    If compress is set, bodies are compressed with zlib ("Content-Encoding: deflate").
+    Following RFC 7694, the server lists the encodings it accepts in the
+    Accept-Encoding header of its responses, and rejects the others with a 415
+    status, in which case the body is sent again uncompressed, and compression is
+    disabled until the server accepts it.
+    """
+
+    def __init__(self, rpc_server_port=1989, compress=True):
         self.port = rpc_server_port
+        self.compress = compress
+        # Whether the server accepts deflate, until it says otherwise.
+        self._deflate_accepted = True
+        self._session = requests.Session()
+        # (path, frame or encoded body) of the requests to send.
+        self._queue: queue.Queue[tuple[str, Union[Frame, bytes]]] = queue.Queue(
+            maxsize=MAX_PENDING_FRAMES
+        )
+        self._sender: Optional[threading.Thread] = None
+        # Number of requests queued or being sent.
+        self._num_pending = 0
+        self._flushed = threading.Condition()
 
     def send_frame(self, frame: Frame):
-        frame_data: dict[str, Any] = {
-            "metadata": frame.metadata,
-            "identifiers": list(frame.identifier_to_events.keys()),
-            "loops": [
-                {
-                    "startOffset": loop.start_offset,
-                    "endOffset": loop.end_offset,
-                    "startLineno": loop.start_lineno,
-                    "endLineno": loop.end_lineno,
-                }
-                for loop in frame.loops.values()
-            ],
-            "events": [],
-            "tracingResult": {},
-        }
-        for event in frame.events:
-            event_dict = attr.asdict(
-                event,
-                filter=lambda field, _: field.name != "sources",
-                value_serializer=event.value_serializer,
+        """Queues frame to be sent. The frame must not be modified afterwards."""
+        self._enqueue("/frame", frame)
+
+    def send_chunk(self, chunk: bytes):
+        """Queues a chunk of the events of a frame, see FrameStream."""
+        self._enqueue("/frame/chunk", chunk)
+
+    def wait_for_flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until every queued frame is sent, or timeout seconds have passed.
+
+        Returns whether all frames were sent.
+        """
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._num_pending == 0, timeout)
+
+    def _enqueue(self, path: str, body: Union[Frame, bytes]):
+        if self._sender is None:
+            self._sender = threading.Thread(
+                target=self._send_requests, name="cyberbrain-rpc-client", daemon=True
             )
+            self._sender.start()
+            atexit.register(self.wait_for_flush, FLUSH_TIMEOUT)
+        with self._flushed:
+            self._num_pending += 1
+        self._queue.put((path, body))
 
-            # We have to explicitly write the type name because Js does not know it.
-            event_dict["type"] = type(event).__name__
-            frame_data["events"].append(event_dict)
-            event_ids = _get_event_sources_uids(event, frame)
-            if event_ids:
-                frame_data["tracingResult"][event.id] = event_ids
-
-        requests.post(
-            f"http://localhost:{self.port}/frame",
-            data=msgpack.packb(frame_data),
-            headers={"Content-Type": "application/octet-stream"},
+    def _send_requests(self):
+        while True:
+            path, body = self._queue.get()
+            try:
+                self._post(
+                    path, body if isinstance(body, bytes) else encode_frame(body)
+                )
+            except requests.exceptions.ConnectionError:
+                print("Can't connect to RPC server")
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._flushed:
+                    self._num_pending -= 1
+                    self._flushed.notify_all()
+
+    def _post(self, path: str, body: bytes):
+        url = f"http://localhost:{self.port}{path}"
+        headers = {"Content-Type": "application/octet-stream"}
+        if (
+            self.compress
+            and self._deflate_accepted
+            and len(body) >= MIN_COMPRESSED_SIZE
+        ):
+            response = self._session.post(
+                url,
+                data=zlib.compress(body, compression_level(len(body))),
+                headers=dict(headers, **{"Content-Encoding": "deflate"}),
+            )
+            self._update_accepted_encodings(response)
+            if response.status_code != 415:
+                return
+        self._update_accepted_encodings(
+            self._session.post(url, data=body, headers=headers)
+        )
+
+    def _update_accepted_encodings(self, response: requests.Response):
+        accepted = response.headers.get("Accept-Encoding")
+        if accepted is not None:
+            self._deflate_accepted = "deflate" in accepted.lower()
+        elif response.status_code == 415:
+            self._deflate_accepted = False
+
+
+class FrameStream:
+    """Sends the events of a frame in chunks while it's traced.
+
+    Otherwise nothing is sent until tracing stops, and every event and value of the
+    frame stays in memory until then. A chunk is a msgpack map like the one sent by
+    send_frame, with the events logged since the previous chunk, the identifiers that
+    appeared since then, and the tracing results of these events. Chunks have a
+    "sequence" number, and the last one has "final" set and the loops of the frame.
+    The RPC server appends chunks to an open trace until the final one.
+
+    Once sent, events drop their values, except the latest event of each identifier,
+    whose value is needed to detect and encode mutations. So only the values of the
+    unsent events and of live identifiers are kept. Interned texts are forgotten too,
+    as chunks don't share a table of texts, see Frame._intern.
+    """
+
+    def __init__(self, client: RpcClient, frame: Frame, options: StreamingOptions):
+        self.client = client
+        self.frame = frame
+        self.options = options
+        self._packer = msgpack.Packer()
+        self._sequence = 0
+        self._num_sent_events = 0
+        self._num_sent_identifiers = 0
+        self._last_sent = time.monotonic()
+        # Sent events that keep their value, as the latest event of their identifier.
+        self._retained: list[Event] = []
+
+    def on_event(self):
+        """Sends a chunk if there are enough unsent events, or enough time passed."""
+        if (
+            len(self.frame.events) - self._num_sent_events >= self.options.max_events
+            or time.monotonic() - self._last_sent >= self.options.interval
+        ):
+            self.send_chunk()
+
+    def send_chunk(self, final: bool = False):
+        frame = self.frame
+        events = frame.events[self._num_sent_events :]
+        identifiers = list(
+            itertools.islice(
+                frame.identifier_to_events, self._num_sent_identifiers, None
+            )
         )
+        chunk = {
+            "metadata": frame.metadata,
+            "sequence": self._sequence,
+            "final": final,
+            "identifiers": identifiers,
+            "tracingResult": _tracing_result(events, frame),
+        }
+        if final:
+            chunk["loops"] = _loops(frame)
+
+        # Events are packed one by one, instead of building all their dicts first.
+        pack = self._packer.pack
+        parts = [self._packer.pack_map_header(len(chunk) + 1)]
+        for key, value in chunk.items():
+            parts.extend((pack(key), pack(value)))
+        parts.extend((pack("events"), self._packer.pack_array_header(len(events))))
+        parts.extend(pack(_event_dict(event)) for event in events)
+        self.client.send_chunk(b"".join(parts))
+
+        self._sequence += 1
+        self._num_sent_events += len(events)
+        self._num_sent_identifiers += len(identifiers)
+        self._last_sent = time.monotonic()
+        self._release_values(events)
+
+    def _release_values(self, sent_events: list[Event]):
+        retained = []
+        for event in itertools.chain(self._retained, sent_events):
+            if not isinstance(event, (InitialValue, Binding, Mutation)):
+                continue
+            if self.frame.identifier_to_events[event.target.name][-1] is event:
+                retained.append(event)
+            else:
+                event.value = None
+                event.repr = ""
+        self._retained = retained
+        self.frame.clear_interned_texts()
@@ -0,0 +1,274 @@
+"""Static analysis that combines the stack effects of runs of instructions.
+
+Most executed instructions (LOAD_CONST, BUILD_TUPLE, ROT_TWO, arithmetic...) never
+emit events, they only reshuffle the value stack. Inside a basic block, a run of such
+instructions always executes as a whole unless an exception is raised, so their
+effect on the value stack can be computed once per code object, and applied in one
+step instead of calling a handler per instruction.
+
+The effect is computed by running the handlers' logic on symbolic stack items, see
+StackEffect for how it's represented.
+"""
+
+from __future__ import annotations
+
+from array import array
+from dis import Instruction
+from typing import Optional, Sequence
+
+
+class _Input:
+    """An item that was on the stack before the run, 0 being the top of stack."""
+
+    __slots__ = ["index"]
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class _Const:
+    """An item pushed by LOAD_CONST."""
+
+    __slots__ = ["lineno", "is_none"]
+
+    def __init__(self, lineno: int, is_none: bool):
+        self.lineno = lineno
+        self.is_none = is_none
+
+
+class _Merge:
+    """An item created by merge_stack_items.
+
+    Merging is associative, so nested merges are flattened: inputs are the indices of
+    input items whose sources are concatenated, and lineno is the start_lineno coming
+    from merged constants.
+    """
+
+    __slots__ = ["inputs", "lineno"]
+
+    def __init__(self, parts: Sequence):
+        self.inputs = []
+        self.lineno = -1
+        for part in parts:
+            if isinstance(part, _Input):
+                self.inputs.append(part.index)
+                continue
+            self.inputs.extend(getattr(part, "inputs", ()))
+            if part.lineno != -1:
+                self.lineno = (
+                    part.lineno if self.lineno == -1 else min(self.lineno, part.lineno)
+                )
+
+
+class _SymbolicStack:
+    """Stack of symbolic items, pulling inputs from below when it runs out."""
+
+    def __init__(self):
+        self.items = []
+        self.num_inputs = 0
+
+    def pop(self, n=1) -> list:
+        """Pops n items, top of stack first, like BaseValueStack._pop."""
+        popped = []
+        for _ in range(n):
+            if self.items:
+                popped.append(self.items.pop())
+            else:
+                popped.append(_Input(self.num_inputs))
+                self.num_inputs += 1
+        return popped
+
+    def push(self, *items):
+        self.items.extend(items)
+
+    def pop_n_push_one(self, n):
+        self.push(_Merge(self.pop(n)))
+
+
+def _rot_two(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    tos, tos1 = stack.pop(2)
+    stack.push(tos, tos1)
+
+
+def _rot_three(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    tos, tos1, tos2 = stack.pop(3)
+    stack.push(tos, tos2, tos1)
+
+
+def _dup_top(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    (tos,) = stack.pop()
+    stack.push(tos, tos)
+
+
+def _dup_top_two(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    tos, tos1 = stack.pop(2)
+    stack.push(tos1, tos, tos1, tos)
+
+
+def _copy(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    items = stack.pop(instr.arg)
+    stack.push(*reversed(items), items[-1])
+
+
+def _swap(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    items = stack.pop(instr.arg)
+    items[0], items[-1] = items[-1], items[0]
+    stack.push(*reversed(items))
+
+
+def _load_const(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    stack.push(_Const(lineno, is_none=instr.argrepr == "None"))
+
+
+def _binary_operation(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    stack.pop_n_push_one(2)
+
+
+def _build_slice(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    stack.pop_n_push_one(instr.arg)
+
+
+def _nop(stack: _SymbolicStack, instr: Instruction, lineno: int):
+    pass
+
+
+# Maps opnames to functions that simulate the corresponding handlers of
+# BaseValueStack on a symbolic stack. Instructions that can emit events, access the
+# frame, or touch the block stack must not be added here.
+_SYMBOLIC_HANDLERS = {
+    "NOP": _nop,
+    "CACHE": _nop,
+    "RESUME": _nop,
+    "POP_TOP": lambda stack, instr, lineno: stack.pop(),
+    "END_FOR": lambda stack, instr, lineno: stack.pop(2),
+    "ROT_TWO": _rot_two,
+    "ROT_THREE": _rot_three,
+    "DUP_TOP": _dup_top,
+    "DUP_TOP_TWO": _dup_top_two,
+    "COPY": _copy,
+    "SWAP": _swap,
+    "UNARY_POSITIVE": _nop,
+    "UNARY_NEGATIVE": _nop,
+    "UNARY_NOT": _nop,
+    "UNARY_INVERT": _nop,
+    "COMPARE_OP": _binary_operation,
+    "IS_OP": _binary_operation,
+    "CONTAINS_OP": _binary_operation,
+    "LOAD_CONST": _load_const,
+    "BUILD_TUPLE": lambda stack, instr, lineno: stack.pop_n_push_one(instr.arg),
+    "BUILD_LIST": lambda stack, instr, lineno: stack.pop_n_push_one(instr.arg),
+    "BUILD_SET": lambda stack, instr, lineno: stack.pop_n_push_one(instr.arg),
+    "BUILD_MAP": lambda stack, instr, lineno: stack.pop_n_push_one(instr.arg * 2),
+    "BUILD_CONST_KEY_MAP": (
+        lambda stack, instr, lineno: stack.pop_n_push_one(instr.arg + 1)
+    ),
+    "BUILD_STRING": lambda stack, instr, lineno: stack.pop_n_push_one(instr.arg),
+    "BUILD_SLICE": _build_slice,
+    "BINARY_SLICE": lambda stack, instr, lineno: stack.pop_n_push_one(3),
+    "LIST_TO_TUPLE": _nop,
+}
+
+
+def _get_symbolic_handler(opname: str):
+    handler = _SYMBOLIC_HANDLERS.get(opname)
+    if handler is None and (
+        opname.startswith("BINARY") or opname.startswith("INPLACE")
+    ):
+        return _binary_operation
+    return handler
+
+
+class StackEffect:
+    """The combined effect of a run of instructions on the value stack.
+
+    Applying it pops `num_inputs` items, then pushes `outputs`. Outputs are indices
+    into the list of values, in which the first `num_inputs` values are the popped
+    items (top of stack first), followed by the items built from `nodes`. Each node
+    describes how to build an item:
+
+        (lineno, None, is_none): an item pushed by LOAD_CONST.
+        (lineno, inputs, False): an item merged from the given input items.
+
+    Items built by merging must come from SymbolStackItem, which is what
+    `checked_inputs` are for.
+    """
+
+    __slots__ = ["num_inputs", "nodes", "outputs", "checked_inputs"]
+
+    def __init__(self, stack: _SymbolicStack):
+        nodes = []
+        outputs = []
+        checked_inputs = set()
+        node_indices = {}
+        for item in stack.items:
+            if isinstance(item, _Input):
+                outputs.append(item.index)
+                continue
+            # The same item can be pushed multiple times, e.g. by DUP_TOP.
+            if id(item) not in node_indices:
+                node_indices[id(item)] = stack.num_inputs + len(nodes)
+                if isinstance(item, _Const):
+                    nodes.append((item.lineno, None, item.is_none))
+                else:
+                    nodes.append((item.lineno, tuple(item.inputs), False))
+                    checked_inputs.update(item.inputs)
+            outputs.append(node_indices[id(item)])
+
+        self.num_inputs: int = stack.num_inputs
+        self.nodes: tuple[tuple, ...] = tuple(nodes)
+        self.outputs: tuple[int, ...] = tuple(outputs)
+        self.checked_inputs: tuple[int, ...] = tuple(sorted(checked_inputs))
+
+    def __repr__(self):
+        return (
+            f"StackEffect(num_inputs={self.num_inputs}, nodes={self.nodes}, "
+            f"outputs={self.outputs})"
+        )
+
+
+def find_fusible_runs(
+    instructions: Sequence[Instruction],
+    linenos: Sequence[int],
+    jump_targets: Sequence[int],
+    handler_targets: Sequence[int] = (),
+) -> tuple[array, tuple[Optional[StackEffect], ...]]:
+    """Finds runs of instructions whose stack effects can be combined.
+
+    A run never spans multiple basic blocks, i.e. only its first instruction can be a
+    jump target or an exception handler. Since none of the instructions in a run
+    jumps, once the first instruction is executed, either the whole run is executed, or
+    an exception is raised in the middle.
+
+    Returns two columns indexed by `offset // 2`. For the first instruction of a run,
+    they contain the offset right after the run, and the run's StackEffect.
+    Otherwise they contain 0 and None.
+    """
+    is_jump_target = bytearray(len(instructions))
+    for target in jump_targets:
+        if target != -1:
+            is_jump_target[target // 2] = True
+    for target in handler_targets:
+        is_jump_target[target // 2] = True
+
+    run_ends = array("l", [0]) * len(instructions)
+    stack_effects = [None] * len(instructions)
+
+    index = 0
+    while index < len(instructions):
+        end = index
+        stack = _SymbolicStack()
+        while end < len(instructions):
+            handler = _get_symbolic_handler(instructions[end].opname)
+            if handler is None or (end > index and is_jump_target[end]):
+                break
+            handler(stack, instructions[end], linenos[end])
+            end += 1
+
+        # Applying a run of a single instruction is no cheaper than calling its
+        # handler, so only runs of at least two instructions are combined.
+        if end - index >= 2:
+            run_ends[index] = end * 2
+            stack_effects[index] = StackEffect(stack)
+        index = max(end, index + 1)
+
+    return run_ends, tuple(stack_effects)
@@ -0,0 +1,157 @@
+"""Cheap summaries of objects that are costly or impossible to encode.
+
+Objects like tensors, models, files or database cursors are either huge, or can't be
+encoded to JSON at all, in which case encoding them fails after walking them. A
+summarizer turns such an object into a few fields (e.g. shape, dtype, device), which
+are stored instead of its value:
+
+    {"type": <full class name>, "summary": <fields returned by the summarizer>}
+
+Like in purity.py, summarizers are registered on a class or its full name, so that
+classes from optional dependencies can be registered without importing them. They
+apply to subclasses too.
+"""
+
+from __future__ import annotations
+
+import _io
+from typing import Any, Callable, Optional, Union
+
+import attr
+
+from . import purity
+
+Summarize = Callable[[Any], dict]
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Summarizer:
+    function: Summarize
+    # Approximate size in bytes of the JSON of such objects, see register_summarizer.
+    cost_hint: Optional[int] = None
+
+
+# Full class name -> summarizer.
+_registry: dict[str, Summarizer] = {}
+
+# Type of the object -> summarizer of the closest class in its MRO, if any.
+_summarizer_cache: dict[type, Optional[Summarizer]] = {}
+
+
+def register_summarizer(
+    cls: Union[type, str], function: Summarize, cost_hint: Optional[int] = None
+):
+    """Registers a function that summarizes instances of cls.
+
+    cls is a class, or its full name like "torch.Tensor". function takes an instance,
+    and returns a dict of JSON serializable fields. If it raises, the object is
+    encoded as usual.
+
+    cost_hint is the approximate size of the JSON of such objects. If given, objects
+    are only summarized when it exceeds the size budget of a value (see
+    EncodingLimits). Otherwise, they're always summarized.
+    """
+    name = cls if isinstance(cls, str) else purity.class_name(cls)
+    _registry[name] = Summarizer(function, cost_hint)
+    _summarizer_cache.clear()
+
+
+def find_summarizer(cls: type) -> Optional[Summarizer]:
+    """Returns the summarizer registered on the closest class in the MRO of cls."""
+    try:
+        return _summarizer_cache[cls]
+    except KeyError:
+        pass
+
+    summarizer = None
+    for klass in cls.__mro__:
+        summarizer = _registry.get(purity.class_name(klass))
+        if summarizer is not None:
+            break
+    _summarizer_cache[cls] = summarizer
+    return summarizer
+
+
+def summarize(value: Any, max_bytes: int) -> Optional[dict[str, Any]]:
+    """Returns the summary of value, or None if it should be encoded as usual."""
+    summarizer = find_summarizer(type(value))
+    if summarizer is None:
+        return None
+    if summarizer.cost_hint is not None and summarizer.cost_hint <= max_bytes:
+        return None
+    try:
+        fields = summarizer.function(value)
+    except Exception:
+        return None
+    return {"type": purity.class_name(type(value)), "summary": fields}
+
+
+def _summarize_file(file) -> dict[str, Any]:
+    return {
+        "name": getattr(file, "name", None),
+        "mode": getattr(file, "mode", None),
+        "closed": file.closed,
+    }
+
+
+def _summarize_sqlite_cursor(cursor) -> dict[str, Any]:
+    return {
+        "columns": [column[0] for column in cursor.description or ()],
+        "rowcount": cursor.rowcount,
+        "lastrowid": cursor.lastrowid,
+    }
+
+
+def _summarize_sqlite_connection(connection) -> dict[str, Any]:
+    return {
+        "in_transaction": connection.in_transaction,
+        "total_changes": connection.total_changes,
+    }
+
+
+def _summarize_tensor(tensor) -> dict[str, Any]:
+    return {
+        "shape": list(tensor.shape),
+        "dtype": str(tensor.dtype),
+        "device": str(tensor.device),
+    }
+
+
+def _summarize_torch_module(module) -> dict[str, Any]:
+    return {
+        "parameters": sum(parameter.numel() for parameter in module.parameters()),
+        "training": module.training,
+    }
+
+
+def _summarize_keras_layer(layer) -> dict[str, Any]:
+    return {
+        "name": layer.name,
+        "parameters": layer.count_params() if layer.built else None,
+        "trainable": layer.trainable,
+    }
+
+
+def _summarize_image(image) -> dict[str, Any]:
+    return {"size": list(image.size), "mode": image.mode, "format": image.format}
+
+
+# Base class of all file objects. io.IOBase is only an ABC, so it's not in their MRO.
+register_summarizer(_io._IOBase, _summarize_file)
+register_summarizer("sqlite3.Connection", _summarize_sqlite_connection)
+register_summarizer("sqlite3.Cursor", _summarize_sqlite_cursor)
+register_summarizer("torch.Tensor", _summarize_tensor)
+register_summarizer("torch.nn.modules.module.Module", _summarize_torch_module)
+# Class names differ between versions of TensorFlow and Keras.
+for _class in (
+    "tensorflow.python.framework.ops.Tensor",
+    "tensorflow.python.framework.tensor.Tensor",
+):
+    register_summarizer(_class, _summarize_tensor)
+for _class in (
+    "keras.engine.base_layer.Layer",
+    "keras.src.engine.base_layer.Layer",
+    "keras.src.layers.layer.Layer",
+):
+    register_summarizer(_class, _summarize_keras_layer)
+register_summarizer("PIL.Image.Image", _summarize_image)
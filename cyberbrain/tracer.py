@@ -3,12 +3,12 @@ import traceback
 import argparse
 import functools
 import inspect
-import requests
 import sys
 from types import MethodType, FunctionType, FrameType
 from typing import Optional, Union
 
-from . import basis, logger, utils, rpc_client
+from . import basis, logger, monitoring, utils, rpc_client
+from .code_info import get_code_info
 from .frame import Frame
 from .frame_tree import FrameTree
 
@@ -29,6 +29,44 @@ if not basis.RUN_IN_TEST:
     _debug_mode = cb_args.debug_mode
 
 
+# Handles every executed instruction. This is the default mode.
+OPCODE_MODE = "opcode"
+# Only handles "line" events, and compares the frame's locals before and after each
+# line, see logger.LineLogger. Much faster than OPCODE_MODE, but events are less
+# precise, e.g. all identifiers loaded by a line are sources of its events.
+LINE_MODE = "line"
+
+
+# Traces with sys.settrace.
+SETTRACE_BACKEND = "settrace"
+# Traces with sys.monitoring (PEP 669), which only has overhead in the traced code, see
+# monitoring.py. Available and used by default since Python 3.12.
+MONITORING_BACKEND = "monitoring"
+
+
+# Installed with sys.settrace once the traced frame has its own f_trace. Tracing stays
+# active only while there's a global trace function, which is called for every
+# function call. getattr is a C function, and getattr(frame, "call", None) is None, so
+# calls made while tracing don't run any Python code, and are not traced.
+_skip_call = getattr
+
+
+def _default_backend() -> str:
+    return MONITORING_BACKEND if hasattr(sys, "monitoring") else SETTRACE_BACKEND
+
+
+def _check_mode(mode: str) -> str:
+    if mode not in {OPCODE_MODE, LINE_MODE}:
+        raise ValueError(f"mode should be {OPCODE_MODE!r} or {LINE_MODE!r}: {mode!r}")
+    return mode
+
+
+def _check_keyframe_interval(keyframe_interval: Optional[int]) -> Optional[int]:
+    if keyframe_interval is not None and keyframe_interval < 1:
+        raise ValueError(f"keyframe_interval should be positive: {keyframe_interval}")
+    return keyframe_interval
+
+
 class TracerFSM:
     # States
     INITIAL = 0
@@ -50,12 +88,25 @@ class Tracer:
 
     debug_mode = _debug_mode
 
-    def __init__(self, debug_mode=None):
+    def __init__(self, debug_mode=None, backend=None):
+        self.mode = OPCODE_MODE
+        self.keyframe_interval: Optional[int] = None
+        self.limits: Optional[utils.EncodingLimits] = None
+        self.streaming: Optional[rpc_client.StreamingOptions] = None
+        self.stream: Optional[rpc_client.FrameStream] = None
+        self.backend = backend or _default_backend()
+        if self.backend not in {SETTRACE_BACKEND, MONITORING_BACKEND}:
+            raise ValueError(f"Unknown backend: {self.backend!r}")
+        if self.backend == MONITORING_BACKEND and not hasattr(sys, "monitoring"):
+            raise ValueError("sys.monitoring is only available since Python 3.12.")
+        self.monitor: Optional[monitoring.Monitor] = None
         self.frame = None
         self.raw_frame = None
         self.is_generator_function = False
         self.decorated_function_code_id = None
-        self.frame_logger: Optional[logger.FrameLogger] = None
+        self.frame_logger: Optional[
+            Union[logger.FrameLogger, logger.LineLogger, logger.MonitoringLogger]
+        ] = None
         self.tracer_state = TracerFSM.INITIAL
         self.function_lineno = None
         if debug_mode is not None:
@@ -74,27 +125,83 @@ class Tracer:
         self, raw_frame: FrameType, initial_instr_pointer: int
     ):
         self.tracer_state = TracerFSM.next_state(self.tracer_state, TracerFSM.START)
-        self.frame = Frame(raw_frame=raw_frame)
-        FrameTree.add_frame(self.frame.frame_id, self.frame)
-        self.frame_logger = logger.FrameLogger(
-            instructions=self.frame.instructions,
-            initial_instr_pointer=initial_instr_pointer,
-            frame=self.frame,
-            debug_mode=self.debug_mode,
+        self.frame = Frame(
+            raw_frame=raw_frame,
+            keyframe_interval=self.keyframe_interval,
+            limits=self.limits,
         )
+        FrameTree.add_frame(self.frame.frame_id, self.frame)
+        if self.streaming:
+            self.stream = rpc_client.FrameStream(
+                self.rpc_client, self.frame, self.streaming
+            )
+            self.frame.on_event = self.stream.on_event
+        if self.mode == LINE_MODE:
+            self.frame_logger = logger.LineLogger(
+                code_info=self.frame.code_info, frame=self.frame, raw_frame=raw_frame
+            )
+        elif self.backend == MONITORING_BACKEND:
+            self.frame_logger = logger.MonitoringLogger(
+                code_info=self.frame.code_info,
+                initial_instr_pointer=initial_instr_pointer,
+                frame=self.frame,
+            )
+        else:
+            self.frame_logger = logger.FrameLogger(
+                code_info=self.frame.code_info,
+                initial_instr_pointer=initial_instr_pointer,
+                frame=self.frame,
+                debug_mode=self.debug_mode,
+            )
         # If not none assign to frame defined_lineno. When the tracer stop is run
         # you set the function_lineno to none to avoid state carry over
         if self.function_lineno:
             self.frame.defined_lineno = self.function_lineno
         # print(f"Logger initialized {self.frame_logger}")
+        return self.frame_logger
+
+    def _create_monitor(self, code) -> monitoring.Monitor:
+        return monitoring.Monitor(
+            code,
+            get_code_info(code),
+            monitoring.LINE_EVENTS
+            if self.mode == LINE_MODE
+            else monitoring.OPCODE_EVENTS,
+        )
 
-    def start(self, *, disabled=False):
-        """Initializes tracing."""
+    def start(
+        self,
+        *,
+        disabled=False,
+        mode=OPCODE_MODE,
+        keyframe_interval=None,
+        limits=None,
+        streaming=None,
+    ):
+        """Initializes tracing.
+
+        Args:
+            disabled: whether to skip tracing.
+            mode: OPCODE_MODE ("opcode") or LINE_MODE ("line"), see LINE_MODE.
+            keyframe_interval: if set, mutations of lists and dicts are stored as
+                deltas against the previous value when possible, with the full value
+                stored every keyframe_interval mutations of an identifier. See
+                delta.py.
+            limits: a utils.EncodingLimits bounding the size of encoded values. Values
+                exceeding it are truncated. Defaults to EncodingLimits().
+            streaming: a rpc_client.StreamingOptions. If set, events are sent in
+                chunks while tracing, instead of all at once when tracing stops. See
+                rpc_client.FrameStream.
+        """
         # For now, we only allow triggering tracing once. This might change in the
         # future.
         if disabled or self.tracer_state != TracerFSM.INITIAL:
             return
 
+        self.mode = _check_mode(mode)
+        self.keyframe_interval = _check_keyframe_interval(keyframe_interval)
+        self.limits = limits
+        self.streaming = streaming
         self.raw_frame = sys._getframe(1)
         # tracer.start() contains the following instructions:
         #               0 LOAD_FAST                0 (tracer)
@@ -105,12 +212,27 @@ class Tracer:
         # at 4. This will make value stack don't have enough elements. So we need to
         # move the instr_pointer back to LOAD_FAST, and make sure LOAD_FAST and
         # LOAD_METHOD are scanned, so that value stack can be in correct state.
-        self._initialize_frame_and_logger(
-            self.raw_frame, initial_instr_pointer=self.raw_frame.f_lasti - 4
+        # Since the instructions differ across versions (e.g. PUSH_NULL and inline
+        # cache entries since 3.11), we move back to the start of the line.
+        linenos = get_code_info(self.raw_frame.f_code).linenos
+        initial_instr_pointer = self.raw_frame.f_lasti
+        lineno = linenos[initial_instr_pointer // 2]
+        while (
+            initial_instr_pointer > 0
+            and linenos[initial_instr_pointer // 2 - 1] == lineno
+        ):
+            initial_instr_pointer -= 2
+        frame_logger = self._initialize_frame_and_logger(
+            self.raw_frame, initial_instr_pointer=initial_instr_pointer
         )
-        self.raw_frame.f_trace_opcodes = True
+        if self.backend == MONITORING_BACKEND:
+            self.monitor = self._create_monitor(self.raw_frame.f_code)
+            self.monitor.watch()
+            self.monitor.attach(self.raw_frame, frame_logger)
+            return
+        self.raw_frame.f_trace_opcodes = self.mode == OPCODE_MODE
         self.raw_frame.f_trace = self.local_tracer
-        sys.settrace(self.global_tracer)
+        sys.settrace(_skip_call)
 
     def stop(self):
         # print(self.frame_logger, self.tracer_state)
@@ -120,35 +242,57 @@ class Tracer:
             return
 
         self.tracer_state = TracerFSM.next_state(self.tracer_state, TracerFSM.STOP)
-        sys.settrace(None)
+        if self.monitor:
+            self.monitor.stop()
+            self.monitor = None
+        else:
+            sys.settrace(None)
 
         # self.global_frame is set means tracer.start() was called explicitly.
         # Otherwise the @trace decorator is used.
+        # There's no value stack in line mode, so it's only checked in opcode mode.
         if self.raw_frame:
             self.raw_frame.f_trace = None
             del self.raw_frame
             # Checks the value stack is in correct state: no extra elements left on
             # stack.These two are tracers replaced with placeholders.
-            assert (
+            assert self.mode == LINE_MODE or (
                 self.frame_logger.frame.value_stack.stack_level == 2
                 and self.frame_logger.frame.value_stack.tos.sources == []
                 and self.frame_logger.frame.value_stack.tos1.sources == []
             )
         else:
-            assert len(self.frame_logger.frame.value_stack.stack) == 0
+            assert (
+                self.mode == LINE_MODE
+                or len(self.frame_logger.frame.value_stack.stack) == 0
+            )
 
-        try:
+        # Sent in the background, see RpcClient.
+        if self.stream:
+            self.stream.send_chunk(final=True)
+            self.stream = None
+        else:
             self.rpc_client.send_frame(self.frame)
-        except requests.exceptions.ConnectionError:
-            print("Can't connect to RPC server")
 
-    def __call__(self, disabled: Union[Union[FunctionType, MethodType], bool] = False):
+    def __call__(
+        self,
+        disabled: Union[Union[FunctionType, MethodType], bool] = False,
+        *,
+        mode=OPCODE_MODE,
+        keyframe_interval=None,
+        limits=None,
+        streaming=None,
+    ):
         """Enables the tracer object to be used as a decorator.
 
-        Note that the decorator can take a `disabled` argument, or no argument:
+        Note that the decorator can take `disabled`, `mode`, `keyframe_interval`,
+        `limits` and `streaming` arguments (see start()), or no argument:
 
             @tracer(disabled=True)
             def f():
+        or
+            @tracer(mode="line")
+            def f():
         or
             @tracer
             def f():
@@ -164,11 +308,15 @@ class Tracer:
         not ideal either as it requires putting method implementation outside of class.
         """
 
+        _check_mode(mode)
+        _check_keyframe_interval(keyframe_interval)
+
         def decorator(f, disabled_by_user=False):
-            # Get function line no
+            # Get function line no. In 3.7 and since 3.11, the lineno of the decorator
+            # is reported instead.
             self.function_lineno = (
                 self.get_function_lineno_from_tracer() + 1
-                if basis.VERSION_INFO < (3, 8)
+                if basis.VERSION_INFO < (3, 8) or basis.VERSION_INFO >= (3, 11)
                 else self.get_function_lineno_from_tracer()
             )
 
@@ -183,8 +331,16 @@ class Tracer:
                     TracerFSM.CALLED,
                 }:
                     return f(*args, **kwargs)
+                self.mode = mode
+                self.keyframe_interval = keyframe_interval
+                self.limits = limits
+                self.streaming = streaming
                 self.decorated_function_code_id = id(f.__code__)
-                sys.settrace(self.global_tracer)
+                if self.backend == MONITORING_BACKEND:
+                    self.monitor = self._create_monitor(f.__code__)
+                    self.monitor.watch(on_start=self._on_decorated_function_start)
+                else:
+                    sys.settrace(self.global_tracer)
                 result = f(*args, **kwargs)
                 # Generator function is special, because the 'call' event is not
                 # triggered when creating the function, but when each `yield` is called.
@@ -227,16 +383,30 @@ class Tracer:
             and self.tracer_state == TracerFSM.INITIAL
         ):
             # print(raw_frame, event)
-            raw_frame.f_trace_opcodes = True
+            raw_frame.f_trace_opcodes = self.mode == OPCODE_MODE
+            # The decorated function is found, no need to check other calls. Since
+            # 3.12, this is also what enables opcode events, because setting
+            # f_trace_opcodes in the call event alone doesn't re-instrument the code.
+            sys.settrace(_skip_call)
             self._initialize_frame_and_logger(raw_frame, initial_instr_pointer=0)
             return self.local_tracer
 
+    def _on_decorated_function_start(self, raw_frame: FrameType):
+        if self.tracer_state == TracerFSM.INITIAL:
+            return self._initialize_frame_and_logger(raw_frame, initial_instr_pointer=0)
+
     def local_tracer(self, raw_frame, event, arg):
         if utils.should_exclude(raw_frame):
             return
+        if self.mode == LINE_MODE:
+            if event == "line":
+                self.frame_logger.handle_line(raw_frame)
+            elif event == "return":
+                self.frame_logger.handle_return(raw_frame, value=arg)
+            return
         if event == "exception":
             # print("Exception 🐍", raw_frame.f_lasti, arg)
-            self.frame_logger.handle_exception(arg)
+            self.frame_logger.handle_exception(raw_frame, arg)
         if event == "opcode":
             # print(raw_frame, event, arg, raw_frame.f_lasti)
             self.frame_logger.handle_instructions(raw_frame)
@@ -7,22 +7,26 @@ import sysconfig
 
 import argparse
 import cheap_repr
+import dataclasses
+import fnmatch
 import gc
 import inspect
+import itertools
 import jsonpickle
 import more_itertools
 import os
 import re
 import subprocess
 import sys
+import ujson
 from functools import lru_cache
 from pathlib import Path
 from pprint import pformat
 from pygments import highlight
 from pygments.formatters import Terminal256Formatter
 from pygments.lexers import PythonLexer
-from types import FrameType
-from typing import Any, Optional, Set
+from types import CodeType, FrameType
+from typing import Any, Iterable, Optional, Set, Union
 
 from . import basis, tracer
 
@@ -44,7 +48,10 @@ try:
 except (ImportError, RuntimeError):
     pass
 
-_INSTALLATION_PATHS = list(sysconfig.get_paths().values())
+# Matches files under any of the installation paths.
+_INSTALLATION_PATHS_REGEX = re.compile(
+    "|".join(re.escape(path) for path in set(sysconfig.get_paths().values()))
+)
 _PYTHON_EXECUTABLE_PATH = sys.executable
 
 jsonpickle.set_preferred_backend("ujson")
@@ -68,18 +75,18 @@ def get_current_callable(frame: FrameType):
     ][0]
 
 
-def get_parameters(frame: FrameType) -> Set[str]:
-    """Get the parameters' names from a frame.
+def get_parameters(code: CodeType) -> Set[str]:
+    """Get the parameters' names from a code object.
 
     e.g. f(a, b, *args, **kwargs)
-    If called with f(1, 2, 3, x=1), returns {'a', 'b', 'args', 'kwargs'}.
+    Returns {'a', 'b', 'args', 'kwargs'}.
     """
-    arg_info = inspect.getargvalues(frame)
+    arg_info = inspect.getargs(code)
     parameters = set(arg_info.args)
     if arg_info.varargs is not None:
         parameters.add(arg_info.varargs)
-    if arg_info.keywords is not None:
-        parameters.add(arg_info.keywords)
+    if arg_info.varkw is not None:
+        parameters.add(arg_info.varkw)
     return parameters
 
 
@@ -100,14 +107,14 @@ def should_ignore_event(
     return frame and target in frame.f_builtins
 
 
-def map_bytecode_offset_to_lineno(frame: FrameType) -> dict[int, int]:
+def map_bytecode_offset_to_lineno(code: CodeType) -> dict[int, int]:
     """Maps bytecode offset to lineno in source code.
 
     Note that the lineno may not be accurate for multi-line statements. If we find
     this to be blocking, we might need to use a Range to represent lineno.
     """
-    mapping = dict(dis.findlinestarts(frame.f_code))
-    frame_byte_count = len(frame.f_code.co_code)
+    mapping = dict(dis.findlinestarts(code))
+    frame_byte_count = len(code.co_code)
     for offset, lineno in mapping.copy().items():
         while offset <= frame_byte_count:
             offset += 2
@@ -115,9 +122,11 @@ def map_bytecode_offset_to_lineno(frame: FrameType) -> dict[int, int]:
                 break
             mapping[offset] = lineno
 
-    # This is for handling GEN_START, which is at offset 0 without a lineno.
-    if 0 not in mapping:
-        mapping[0] = mapping[2]
+    # This is for handling instructions before the first line without a lineno, e.g.
+    # GEN_START, or MAKE_CELL and COPY_FREE_VARS since 3.11.
+    first_offset = min(mapping)
+    for offset in range(0, first_offset, 2):
+        mapping[offset] = mapping[first_offset]
 
     return mapping
 
@@ -125,6 +134,19 @@ def map_bytecode_offset_to_lineno(frame: FrameType) -> dict[int, int]:
 # get_jump_target_or_none is called for every instruction, as a micro-optimization,
 # we avoid checking basis.VERSION_INFO everytime by generating the correct function.
 def _compute_get_jump_target_or_none():
+    if basis.VERSION_INFO >= (3, 12):
+        # Jump arguments are relative to the inline cache entries following the
+        # instruction, let dis do the math.
+        def function_to_return(instr):
+            if instr.opcode in dis.hasjrel:
+                # When the iterator is exhausted, FOR_ITER skips over the END_FOR
+                # instruction it points to.
+                if instr.opname == "FOR_ITER":
+                    return instr.argval + 2
+                return instr.argval
+
+        return function_to_return
+
     # bpo-27129, use instruction offsets (as opposed to byte offsets).
     bytes_per_offset = 1 if basis.VERSION_INFO < (3, 10) else 2
 
@@ -143,7 +165,236 @@ get_jump_target_or_none: Callable[
 ] = _compute_get_jump_target_or_none()
 
 
-def to_json(python_object: Any):
+# Same options as jsonpickle's ujson backend, so that the fast path of to_json produces
+# the same output.
+_UJSON_OPTIONS = {"sort_keys": False, "escape_forward_slashes": False}
+
+_PRIMITIVE_TYPES = frozenset({str, int, float, bool, type(None)})
+
+
+@dataclasses.dataclass(frozen=True)
+class EncodingLimits:
+    """Limits on the cost of encoding values, so that tracing has a bounded cost.
+
+    Values that don't fit are encoded partially: containers keep their first items and
+    end with a {"...": <number of omitted items>} marker, and other values are replaced
+    by {"repr": <short repr>}.
+
+    Attributes:
+        max_value_bytes: max size of the JSON of a value.
+        max_trace_bytes: max size of the JSON of all values of a trace. Once reached,
+            every value is replaced by its repr.
+        max_depth: max nesting depth of containers and objects.
+    """
+
+    max_value_bytes: int = 1_000_000
+    max_trace_bytes: int = 100_000_000
+    max_depth: int = 20
+
+
+class _NotBuiltin(Exception):
+    """Raised when a value can't be encoded by the fast path of to_json."""
+
+
+class _BudgetExceeded(Exception):
+    """Raised when a value is too large or too deep to be encoded in full."""
+
+
+class _Budget:
+    __slots__ = ["bytes", "max_depth"]
+
+    def __init__(self, max_bytes: int, max_depth: int):
+        self.bytes = max_bytes
+        self.max_depth = max_depth
+
+
+def _flatten_builtin(obj: Any, ancestors: Set[int], budget: Optional[_Budget]) -> Any:
+    """Converts obj to what jsonpickle.encode(obj, unpicklable=False) would flatten it
+    to, if it only contains primitives, lists, tuples, sets and dicts.
+
+    Only exact types are accepted, since jsonpickle handles subclasses differently.
+    Raises _NotBuiltin otherwise, or if obj contains itself. The budget is charged two
+    bytes per item, the least an item takes in JSON.
+    """
+    cls = type(obj)
+    if cls in _PRIMITIVE_TYPES:
+        return obj
+    if cls is not list and cls is not tuple and cls is not set and cls is not dict:
+        raise _NotBuiltin
+    if id(obj) in ancestors:
+        raise _NotBuiltin
+    if budget is not None:
+        budget.bytes -= 2 * len(obj)
+        if budget.bytes < 0 or len(ancestors) >= budget.max_depth:
+            raise _BudgetExceeded
+    ancestors.add(id(obj))
+
+    if cls is dict:
+        result = {}
+        for key, value in obj.items():
+            key = _flatten_key(key)
+            if key is None:
+                continue
+            result[key] = (
+                value
+                if type(value) in _PRIMITIVE_TYPES
+                else _flatten_builtin(value, ancestors, budget)
+            )
+    else:
+        # Tuples and sets are encoded as lists.
+        result = [
+            value
+            if type(value) in _PRIMITIVE_TYPES
+            else _flatten_builtin(value, ancestors, budget)
+            for value in obj
+        ]
+
+    ancestors.discard(id(obj))
+    return result
+
+
+def _flatten_key(key: Any) -> Optional[str]:
+    """Converts a dict key like jsonpickle.pickler.Pickler._flatten_key_value_pair.
+
+    Returns None for keys that jsonpickle drops.
+    """
+    if type(key) is str:
+        return None if key in jsonpickle.tags.RESERVED else key
+    return "null" if key is None else repr(key)
+
+
+class _BudgetedPickler(jsonpickle.pickler.Pickler):
+    """Pickler that stops as soon as the budget is exceeded.
+
+    Encoding arbitrary objects, like a machine learning model, can walk a huge object
+    graph. Charging the budget for every flattened object bounds the time spent.
+    """
+
+    def __init__(self, budget: _Budget):
+        super().__init__(unpicklable=False)
+        self._budget = budget
+
+    def _flatten_impl(self, obj):
+        self._budget.bytes -= len(obj) + 2 if type(obj) is str else 2
+        if self._budget.bytes < 0 or self._depth >= self._budget.max_depth:
+            raise _BudgetExceeded
+        return super()._flatten_impl(obj)
+
+
+def _min_encoded_size(obj: Any) -> int:
+    """Cheaply estimates the least number of bytes the JSON of obj takes.
+
+    Every item of a container, and every element of a Numpy array or Pandas object
+    takes at least two bytes, the item and a separator.
+    """
+    cls = type(obj)
+    if cls is str:
+        return len(obj) + 2
+    if cls is bytes or cls is bytearray:
+        return len(obj) * 4 // 3  # Encoded as base64.
+    if isinstance(obj, (list, tuple, set, frozenset, dict)):
+        return 2 * len(obj)
+    size = getattr(obj, "size", None) if hasattr(obj, "nbytes") else None
+    if isinstance(size, int):
+        return 2 * size
+    return 0
+
+
+def _repr_json(python_object: Any) -> str:
+    # A string's repr given by get_repr is the whole string, so it's truncated.
+    if type(python_object) is str:
+        text = cheap_repr.cheap_repr(python_object)
+    else:
+        text = get_repr(python_object)
+    return ujson.dumps({"repr": text}, **_UJSON_OPTIONS)
+
+
+def _to_json_partially(python_object: Any, max_bytes: int, max_depth: int) -> str:
+    """Encodes as many items of a container as the limits allow, see EncodingLimits.
+
+    Items are encoded in chunks of growing size, and one by one once a chunk doesn't
+    fit, so that the time spent is proportional to max_bytes, not to the number of
+    items. Values that aren't containers are replaced by their repr.
+    """
+    is_dict = isinstance(python_object, dict)
+    if max_depth <= 0 or not (
+        is_dict or isinstance(python_object, (list, tuple, set, frozenset))
+    ):
+        return _repr_json(python_object)
+
+    items = iter(python_object.items() if is_dict else python_object)
+    # Leaves room for the brackets and the marker.
+    remaining = max_bytes - 24
+    parts = []
+    num_encoded = 0
+    pending = []  # Items taken from the iterator, but not encoded yet.
+    chunk_size = 64
+    can_grow = True
+    while True:
+        if len(pending) < chunk_size:
+            pending.extend(itertools.islice(items, chunk_size - len(pending)))
+        if not pending:
+            break
+        chunk = pending[:chunk_size]
+        json = _to_json_within(
+            dict(chunk) if is_dict else chunk, max(remaining, 0), max_depth
+        )
+        if json is not None:
+            if len(json) > 2:
+                parts.append(json[1:-1])  # Without the brackets.
+                remaining -= len(json) - 1
+            del pending[:chunk_size]
+            num_encoded += len(chunk)
+            if can_grow:
+                chunk_size *= 2
+            continue
+        if chunk_size > 1:
+            chunk_size //= 2
+            can_grow = False
+            continue
+
+        # The next item doesn't fit by itself, it's the last one to be encoded.
+        if is_dict:
+            part = ujson.dumps(_flatten_key(chunk[0][0]), **_UJSON_OPTIONS) + ":"
+            part += to_json(chunk[0][1], max(remaining - len(part), 0), max_depth - 1)
+        else:
+            part = to_json(chunk[0], max(remaining, 0), max_depth - 1)
+        if len(part) < remaining:
+            parts.append(part)
+            num_encoded += 1
+        break
+
+    num_omitted = len(python_object) - num_encoded
+    if is_dict:
+        if num_omitted:
+            parts.append('"...":%d' % num_omitted)
+        return "{" + ",".join(parts) + "}"
+    if num_omitted:
+        parts.append('{"...":%d}' % num_omitted)
+    return "[" + ",".join(parts) + "]"
+
+
+def _to_json_within(
+    python_object: Any, max_bytes: Optional[int], max_depth: Optional[int]
+) -> Optional[str]:
+    """Encodes python_object to JSON, or returns None if it exceeds the limits."""
+    budget = None if max_bytes is None else _Budget(max_bytes, max_depth)
+
+    # Fast path for builtin types, which are the majority of values, and don't need to
+    # go through jsonpickle's handlers.
+    try:
+        json = ujson.dumps(
+            _flatten_builtin(python_object, set(), budget), **_UJSON_OPTIONS
+        )
+    except _BudgetExceeded:
+        return None
+    except Exception:
+        # Not a builtin value, or one that can't be encoded, which jsonpickle takes
+        # care of below.
+        pass
+    else:
+        return None if budget is not None and len(json) > max_bytes else json
+
     # TODO: Once we implemented better deserialization in Js, use unpicklable=True.
     try:
         if (
@@ -152,7 +403,13 @@ def to_json(python_object: Any):
             and iter(python_object) == python_object
         ):
             raise Exception("Cannot encode iterators")
-        json = jsonpickle.encode(python_object, unpicklable=False)
+        json = jsonpickle.encode(
+            python_object,
+            unpicklable=False,
+            context=_BudgetedPickler(budget) if budget is not None else None,
+        )
+    except _BudgetExceeded:
+        return None
     except:
         # There are always things we just cannot encode, like a ML model.
         # In this case, use its repr.
@@ -160,8 +417,27 @@ def to_json(python_object: Any):
 
     if json == "null" and python_object is not None:
         return '{"repr": "%s"}' % get_repr(python_object)
-    else:
-        return json
+    return None if budget is not None and len(json) > max_bytes else json
+
+
+def to_json(
+    python_object: Any,
+    max_bytes: Optional[int] = None,
+    max_depth: Optional[int] = None,
+) -> str:
+    """Encodes python_object to JSON.
+
+    If max_bytes and max_depth are given, values that exceed them are encoded
+    partially, see EncodingLimits.
+    """
+    if max_bytes is None:
+        return _to_json_within(python_object, None, None)
+    if _min_encoded_size(python_object) > max_bytes:
+        return _to_json_partially(python_object, max_bytes, max_depth)
+    json = _to_json_within(python_object, max_bytes, max_depth)
+    if json is None:
+        return _to_json_partially(python_object, max_bytes, max_depth)
+    return json
 
 
 @lru_cache(maxsize=1)
@@ -192,6 +468,35 @@ def is_exception_class(obj) -> bool:
     return inspect.isclass(obj) and issubclass(obj, BaseException)
 
 
+# Glob patterns set by set_file_filters, compiled to regexes. None means no pattern.
+_include_regex: Optional[re.Pattern] = None
+_exclude_regex: Optional[re.Pattern] = None
+
+# Whether frames from a file should be excluded, see should_exclude.
+_exclusion_cache: dict[str, bool] = {}
+
+
+def _compile_globs(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def set_file_filters(*, include: Iterable[str] = (), exclude: Iterable[str] = ()):
+    """Sets glob patterns of files whose frames should be or not be traced.
+
+    Files matching `include` are traced even if they would be excluded otherwise, e.g.
+    files of installed packages. Files matching `exclude` are never traced. Patterns
+    are matched against the full filename, so usually they should start with "*".
+    Calling it again replaces the patterns, calling it without arguments removes them.
+    """
+    global _include_regex, _exclude_regex
+    _include_regex = _compile_globs(include)
+    _exclude_regex = _compile_globs(exclude)
+    _exclusion_cache.clear()
+
+
 def should_exclude(frame):
     """Determines whether we should log events from this frame.
 
@@ -200,17 +505,37 @@ def should_exclude(frame):
     .../3.7.1/include/python3.7m
     .../lib/python3.7/site-packages
 
-    Also we exclude frozen modules, as well as some weird cases.
-    """
+    Also we exclude frozen modules, as well as some weird cases. Patterns set by
+    set_file_filters take precedence.
 
+    It's called for every event, but the result only depends on the filename, so it's
+    computed once per file. It's not cached by code object, because unlike strings,
+    code objects compute their hash from all their fields on every lookup.
+    """
     filename = frame.f_code.co_filename
+    try:
+        return _exclusion_cache[filename]
+    except KeyError:
+        pass
+
+    excluded = _should_exclude_file(filename)
+    _exclusion_cache[filename] = excluded
+    return excluded
+
 
+def _should_exclude_file(filename: str) -> bool:
     # Exclude 'call' event of "tracer.start/end()", so that the execution of
     # these methods will never be traced.
     if filename.endswith(os.path.join("cyberbrain", "tracer.py")):
         return True
 
-    if any(filename.startswith(path) for path in _INSTALLATION_PATHS):
+    if _include_regex and _include_regex.match(filename):
+        return False
+
+    if _exclude_regex and _exclude_regex.match(filename):
+        return True
+
+    if _INSTALLATION_PATHS_REGEX.match(filename):
         return True
 
     return any(
@@ -244,21 +569,44 @@ def pprint(*args):
     print(output)
 
 
-def get_value_from_frame(name: str, frame: FrameType):
-    assert name_exist_in_frame(name, frame)
-    if name in frame.f_locals:
-        return frame.f_locals[name]
-    elif name in frame.f_globals:
-        return frame.f_globals[name]
-    else:
-        return frame.f_builtins[name]
+class FrameView:
+    """A frame whose f_locals is read at most once.
 
+    Reading frame.f_locals copies the values of fast locals into a dict every time
+    (PyFrame_FastToLocals), which costs as much as the number of locals. Handling an
+    event can look up identifiers several times, while the frame doesn't change, so
+    the logger wraps the frame in a view for each event, and the dict is only built
+    the first time it's needed. Other attributes are read from the frame.
 
-# TODO: we can use a id(frame) -> name cache.
-def name_exist_in_frame(name: str, frame: FrameType) -> bool:
-    return any(
-        [name in frame.f_locals, name in frame.f_globals, name in frame.f_builtins]
-    )
+    A view must not be kept after the event is handled, as it won't see later changes.
+    """
+
+    __slots__ = ["frame", "_locals"]
+
+    def __init__(self, frame: FrameType):
+        self.frame = frame
+        self._locals: Optional[dict[str, Any]] = None
+
+    @property
+    def f_locals(self) -> dict[str, Any]:
+        if self._locals is None:
+            self._locals = self.frame.f_locals
+        return self._locals
+
+    def __getattr__(self, name: str):
+        return getattr(self.frame, name)
+
+
+def get_value_from_frame(name: str, frame: Union[FrameType, FrameView]):
+    """Returns the value of name in frame, raises AssertionError if it doesn't exist."""
+    for namespace in (frame.f_locals, frame.f_globals, frame.f_builtins):
+        if name in namespace:
+            return namespace[name]
+    raise AssertionError(f"{name!r} does not exist in frame.")
+
+
+def name_exist_in_frame(name: str, frame: Union[FrameType, FrameView]) -> bool:
+    return name in frame.f_locals or name in frame.f_globals or name in frame.f_builtins
 
 
 def get_repr(obj: Any) -> str:
@@ -5,8 +5,8 @@
 from __future__ import annotations
 
 import dataclasses
+import dis
 import enum
-from copy import copy
 from dis import Instruction
 
 import functools
@@ -32,7 +32,9 @@ from .basis import (
 from .block_stack import BlockStack, BlockType, Block
 
 if TYPE_CHECKING:
+    from .code_info import CodeInfo
     from .frame import Snapshot
+    from .stack_effect import StackEffect
 
 
 class ValueStackException(Exception):
@@ -71,6 +73,8 @@ class EventInfo:
     sources: set[Symbol] = dataclasses.field(default_factory=set)
     jump_target: int = None
     lineno: int = -1
+    # Name of the method whose successful call emitted the event, see MethodStackItem.
+    method: Optional[str] = None
 
 
 class Why(enum.Enum):
@@ -113,8 +117,17 @@ class SymbolStackItem:
             return None
         return self.sources[0]
 
-    def copy(self) -> SymbolStackItem:
-        return SymbolStackItem(self.start_lineno, [copy(sym) for sym in self.sources])
+
+class MethodStackItem(SymbolStackItem):
+    """A method loaded from an identifier, like `a.append` in `a.append(1)`.
+
+    Knowing the method lets mutation detection skip comparing values for methods
+    known to be pure or mutating, see purity.py.
+    """
+
+    def __init__(self, start_lineno: int, sources: List[Symbol], method: str):
+        super().__init__(start_lineno, sources)
+        self.method = method
 
 
 class CustomValueStackItem:
@@ -133,9 +146,6 @@ class CustomValueStackItem:
     def __repr__(self) -> str:
         return repr(self.custom_value)
 
-    def copy(self) -> CustomValueStackItem:
-        return CustomValueStackItem(self.custom_value)
-
 
 class SymbolWithCustomValueStackItem(SymbolStackItem, CustomValueStackItem):
     """Class representing a both a symbol and a custom value on the value stack
@@ -149,11 +159,6 @@ class SymbolWithCustomValueStackItem(SymbolStackItem, CustomValueStackItem):
         SymbolStackItem.__init__(self, start_lineno, sources)
         CustomValueStackItem.__init__(self, custom_value)
 
-    def copy(self) -> SymbolWithCustomValueStackItem:
-        return SymbolWithCustomValueStackItem(
-            self.start_lineno, self.sources, self.custom_value
-        )
-
     def __repr__(self) -> str:
         return "SymbolWithCustomValueStackItem{" + repr(self.custom_value) + "}"
 
@@ -184,37 +189,108 @@ def merge_stack_items(
     return SymbolStackItem(start_lineno, sources)
 
 
+# Handlers only declare the arguments they need, in the order of (instr, jumped,
+# frame, exc_info). Each supported argument shape maps to a factory that wraps a
+# handler into a function with a fixed signature, so that the dispatch table can call
+# every handler the same way without inspecting its signature at runtime.
+_HANDLER_ADAPTERS = {
+    (): lambda h: lambda self, instr, jumped, frame, exc_info: h(self),
+    ("instr",): lambda h: lambda self, instr, jumped, frame, exc_info: h(self, instr),
+    ("exc_info",): (
+        lambda h: lambda self, instr, jumped, frame, exc_info: h(self, exc_info)
+    ),
+    ("instr", "exc_info"): (
+        lambda h: lambda self, instr, jumped, frame, exc_info: h(self, instr, exc_info)
+    ),
+    ("instr", "jumped"): (
+        lambda h: lambda self, instr, jumped, frame, exc_info: h(self, instr, jumped)
+    ),
+    ("instr", "jumped", "exc_info"): (
+        lambda h: lambda self, instr, jumped, frame, exc_info: h(
+            self, instr, jumped, exc_info
+        )
+    ),
+    ("instr", "frame", "exc_info"): (
+        lambda h: lambda self, instr, jumped, frame, exc_info: h(
+            self, instr, frame, exc_info
+        )
+    ),
+}
+
+
+def _make_not_implemented_handler(opname: str):
+    def handler(self, instr, jumped, frame, exc_info):
+        raise NotImplementedError(
+            f"Bytecode {opname} not implemented.\n"
+            "Please open git.io/JYSlG to report this issue.",
+        )
+
+    return handler
+
+
+def _build_dispatch_table(cls) -> tuple:
+    """Builds a table that maps opcodes to handlers of the given value stack class.
+
+    The table is indexed by opcode, and each entry accepts the same arguments:
+    (value_stack, instr, jumped, frame, exc_info).
+    """
+    table = []
+    for opname in dis.opname:
+        handler = getattr(cls, f"_{opname}_handler", None)
+        if handler is None and (
+            opname.startswith("BINARY") or opname.startswith("INPLACE")
+        ):
+            # Binary operations are all the same.
+            handler = cls._BINARY_operation_handler
+
+        if handler is None:
+            table.append(_make_not_implemented_handler(opname))
+            continue
+
+        parameters = tuple(inspect.signature(handler).parameters)[1:]  # Drops self.
+        try:
+            adapter = _HANDLER_ADAPTERS[parameters]
+        except KeyError:
+            raise ValueStackException(
+                f"Handler of {opname} has unsupported parameters: {parameters}"
+            )
+        # Calls the undecorated handler directly, @emit_event is only a marker.
+        table.append(adapter(inspect.unwrap(handler)))
+
+    return tuple(table)
+
+
 class BaseValueStack:
     """Class that simulates the a frame's value stack.
 
     This class contains instr handlers that are the same across different versions.
     """
 
-    def __init__(self):
+    # Maps opcode to instr handler, built once for each subclass.
+    _dispatch_table: tuple = ()
+    # Opcodes whose handler is marked with @emit_event.
+    event_opcodes: frozenset[int] = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch_table = _build_dispatch_table(cls)
+        cls.event_opcodes = frozenset(
+            opcode
+            for opcode, opname in enumerate(dis.opname)
+            if getattr(getattr(cls, f"_{opname}_handler", None), "emit_event", False)
+        )
+
+    def __init__(self, code_info: CodeInfo):
+        self.code_info = code_info
         self.stack = []
         self.block_stack = BlockStack()
         self.last_exception: Optional[ExceptionInfo] = None
         self.last_starts_line = -1
         self.return_value = SymbolStackItem(-1, [])
-        self.handler_signature_cache: dict[str, set[str]] = {}  # keyed by opname.
         self.snapshot = None
-
-    def update_snapshot(self, mutated_identifier: str, new_snapshot: Snapshot):
-        """Updates snapshot after an identifier has been mutated.
-
-        e.g. `a`'s value is pushed to value stack, then `a` is mutated. We need to
-            update the snapshot bound to `a`'s symbol so that later doing tracing,
-            we can get the correct predecessor event of `a`, which is the mutation
-            event.
-
-        Note that Binding event does not change the object on value stack, so no need
-        to update.
-        """
-        for item in self.stack:
-            if isinstance(item, SymbolStackItem):
-                for symbol in item.sources:
-                    if symbol.name == mutated_identifier:
-                        symbol.snapshot = new_snapshot
+        # Maps names of the variables of running inlined comprehensions (3.12+) to the
+        # items stored in them, innermost comprehension last.
+        self.comprehension_variables: dict[str, list[SymbolStackItem]] = {}
 
     def emit_event_and_update_stack(
         self,
@@ -235,41 +311,51 @@ class BaseValueStack:
             snapshot: frame state snapshot.
         """
         self.snapshot = snapshot
-        opname = instr.opname
         self.last_starts_line = lineno
+        return self._dispatch_table[instr.opcode](self, instr, jumped, frame, exc_info)
 
-        if opname.startswith("BINARY") or opname.startswith("INPLACE"):
-            # Binary operations are all the same.
-            handler = self._BINARY_operation_handler
-        else:
-            try:
-                handler = getattr(self, f"_{opname}_handler")
-            except AttributeError:
-                raise NotImplementedError(
-                    f"Bytecode {opname} not implemented.\n"
-                    "Please open git.io/JYSlG to report this issue.",
-                )
+    def apply_stack_effect(self, effect: StackEffect) -> bool:
+        """Applies the combined stack effect of a run of instructions.
 
-        # Pass arguments on demand.
-        try:
-            parameters = self.handler_signature_cache[opname]
-        except KeyError:
-            parameters = set(inspect.signature(handler).parameters)
-            self.handler_signature_cache[opname] = parameters
-
-        # noinspection PyArgumentList
-        return handler(
-            *[
-                arg
-                for param_name, arg in {
-                    "instr": instr,
-                    "jumped": jumped,
-                    "frame": frame,
-                    "exc_info": exc_info,
-                }.items()
-                if param_name in parameters
-            ]
-        )
+        It is equivalent to calling the handlers of these instructions one by one
+        without exceptions, see stack_effect.py. Returns False if the stack is not in a
+        state that the effect can be applied to, in which case the stack is unchanged
+        and the handlers should be called instead.
+        """
+        stack = self.stack
+        num_inputs = effect.num_inputs
+        if num_inputs > len(stack):
+            return False
+        values = stack[: -num_inputs - 1 : -1] if num_inputs else []
+        for index in effect.checked_inputs:
+            if not isinstance(values[index], SymbolStackItem):
+                return False
+
+        for lineno, inputs, is_none in effect.nodes:
+            if inputs is None:
+                values.append(
+                    SymbolWithCustomValueStackItem(lineno, [], None)
+                    if is_none
+                    else SymbolStackItem(lineno, [])
+                )
+                continue
+            start_lineno = lineno
+            sources = []
+            for index in inputs:
+                item = values[index]
+                if item.start_lineno != -1:
+                    start_lineno = (
+                        min(item.start_lineno, start_lineno)
+                        if start_lineno != -1
+                        else item.start_lineno
+                    )
+                sources.extend(item.sources)
+            values.append(SymbolStackItem(start_lineno, sources))
+
+        if num_inputs:
+            del stack[-num_inputs:]
+        stack.extend([values[index] for index in effect.outputs])
+        return True
 
     @property
     def stack_level(self):
@@ -310,21 +396,12 @@ class BaseValueStack:
     def _push(self, *values: Union[SymbolStackItem, CustomValueStackItem]):
         """Pushes values onto the simulated value stack.
 
-        StackItems are copied onto the stack
-        Str (name of variable) is converted to Symbol and then wrapped into a SymbolStackItem.
-        If it is none of the above, the value is stored as a custom value.
+        Stack items and the symbols they contain are never modified once created, so
+        the same item can be pushed multiple times without being copied.
         """
         for value in values:
-            if isinstance(value, SymbolStackItem) or isinstance(
-                value, CustomValueStackItem
-            ):
-                # Why copy? Because the symbols on the stack might be modified
-                # later in the update_snapshot method. If we don't copy, a
-                # symbol that's already been popped out of the stack will be
-                # affected by the change (if it has the same name with the
-                # modified symbol on the stack). A copy will make symbols
-                # isolated from each other.
-                self.stack.append(value.copy())
+            if isinstance(value, (SymbolStackItem, CustomValueStackItem)):
+                self.stack.append(value)
             else:
                 raise ValueStackException("Pushed an unknown item to the stack.")
 
@@ -740,12 +817,31 @@ class BaseValueStack:
                 lineno=self.last_starts_line,
             )
 
-    def _LOAD_METHOD_handler(self, exc_info):
+    def _method_item(self, instr, receiver):
+        """Returns the item pushed for a method loaded from receiver.
+
+        The item is a MethodStackItem if the receiver is the identifier loaded right
+        before, otherwise receiver itself.
+        """
+        identifier = self.code_info.method_receivers.get(instr.offset)
+        if (
+            identifier is not None
+            and type(receiver) is SymbolStackItem
+            and len(receiver.sources) == 1
+            and receiver.sources[0].name == identifier
+        ):
+            return MethodStackItem(
+                receiver.start_lineno, receiver.sources, instr.argval
+            )
+        return receiver
+
+    def _LOAD_METHOD_handler(self, instr, exc_info):
         if self._instruction_successfully_executed(exc_info, "LOAD_METHOD"):
             # NULL should be pushed if method lookup failed, but this would lead to an
             # exception anyway, and should be very rare, so ignoring it.
             # See https://docs.python.org/3/library/dis.html#opcode-LOAD_METHOD.
-            self._push(self.tos)
+            receiver = self._pop()
+            self._push(self._method_item(instr, receiver), receiver)
 
     def _push_arguments_or_exception(self, callable_obj, args):
         if isinstance(callable_obj, SymbolStackItem):
@@ -787,7 +883,8 @@ class BaseValueStack:
         args = self._pop(instr.arg, return_list=True)
         inst_or_callable = self._pop()
         method_or_null = self._pop()  # method or NULL
-        if self._instruction_successfully_executed(exc_info, "CALL_METHOD"):
+        succeeded = self._instruction_successfully_executed(exc_info, "CALL_METHOD")
+        if succeeded:
             self._push(merge_stack_items(inst_or_callable, method_or_null, *args))
 
         # The real callable can be omitted for various reasons.
@@ -799,8 +896,9 @@ class BaseValueStack:
             return EventInfo(
                 type=Mutation,
                 target=inst_or_callable.top_source,
-                sources=set(merge_stack_items(inst_or_callable, *args).copy().sources),
+                sources=set(merge_stack_items(inst_or_callable, *args).sources),
                 lineno=inst_or_callable.start_lineno,
+                method=getattr(method_or_null, "method", None) if succeeded else None,
             )
 
     def _MAKE_FUNCTION_handler(self, instr):
@@ -909,11 +1007,10 @@ class BaseValueStack:
             self._push(enter_func)  # The return value of __enter__()
 
     def _return_jump_back_event_if_exists(self, instr):
-        jump_target = utils.get_jump_target_or_none(instr)
-        if jump_target is not None and jump_target < instr.offset:
+        if instr.offset in self.code_info.loop_jumps:
             return EventInfo(
                 type=JumpBackToLoopStart,
-                jump_target=jump_target,
+                jump_target=self.code_info.jump_targets[instr.offset // 2],
                 lineno=self.last_starts_line,
             )
 
@@ -964,9 +1061,9 @@ class BaseValueStack:
 class Py37ValueStack(BaseValueStack):
     """Value stack for Python 3.7."""
 
-    def __init__(self):
+    def __init__(self, code_info: CodeInfo):
         self.why = Why.UNINITIALIZED
-        super().__init__()
+        super().__init__(code_info)
 
     def _store_exception(self, exc_info: ExceptionInfo):
         """When an exception is raised implicitly (aka not by calling `raise`), use
@@ -1390,15 +1487,345 @@ class Py310ValueStack(Py39ValueStack):
         pass
 
 
-def create_value_stack():
+class _SavedVariableClass:
+    def __repr__(self):
+        return "SAVED_VARIABLE"
+
+
+# The value pushed by LOAD_FAST_AND_CLEAR, which is the variable's value before an
+# inlined comprehension reuses its name.
+SAVED_VARIABLE = _SavedVariableClass()
+
+
+class Py312ValueStack(Py310ValueStack):
+    """Value stack for Python 3.12.
+
+    There's no block stack anymore. When an exception is raised, the exception table
+    tells where the exception is handled, and how many items are kept on the stack.
+    """
+
+    def __init__(self, code_info: CodeInfo):
+        super().__init__(code_info)
+        # Offset of the instruction being handled, used to look up exception handlers.
+        self.instr_offset = -1
+
+    def emit_event_and_update_stack(
+        self,
+        instr: Instruction,
+        frame: FrameType,
+        jumped: bool,
+        exc_info: Optional[ExceptionInfo],
+        snapshot: Snapshot,
+        lineno: int,
+    ) -> Optional[EventInfo]:
+        self.instr_offset = instr.offset
+        return super().emit_event_and_update_stack(
+            instr, frame, jumped, exc_info, snapshot, lineno
+        )
+
+    @property
+    def _null(self) -> SymbolWithCustomValueStackItem:
+        return SymbolWithCustomValueStackItem(-1, [], NULL)
+
+    @staticmethod
+    def _is_null(item) -> bool:
+        return isinstance(item, CustomValueStackItem) and item.custom_value is NULL
+
+    def _exception_unwind(self):
+        offset = self.instr_offset
+        for start, end, target, depth, lasti in self.code_info.exception_handlers:
+            if start <= offset < end:
+                break
+        else:
+            return  # Not handled in this frame.
+
+        while self.stack_level > depth:
+            self._pop()
+        if lasti:
+            self._push(CustomValueStackItem(offset))
+        self._push(CustomValueStackItem(self.last_exception.value))
+
+    def _RESUME_handler(self):
+        pass
+
+    def _CACHE_handler(self):
+        pass
+
+    def _MAKE_CELL_handler(self):
+        pass
+
+    def _COPY_FREE_VARS_handler(self):
+        pass
+
+    def _RETURN_GENERATOR_handler(self):
+        self._push(self._placeholder)
+
+    def _RETURN_CONST_handler(self):
+        pass
+
+    def _PUSH_NULL_handler(self):
+        self._push(self._null)
+
+    def _COPY_handler(self, instr):
+        self._push(self._tos(instr.arg - 1))
+
+    def _SWAP_handler(self, instr):
+        stack = self.stack
+        stack[-1], stack[-instr.arg] = stack[-instr.arg], stack[-1]
+
+    def _END_FOR_handler(self):
+        self._pop(2)
+
+    def _END_SEND_handler(self):
+        value = self._pop()
+        self._pop()
+        self._push(value)
+
+    def _SEND_handler(self, exc_info):
+        self._pop()
+        if self._instruction_successfully_executed(exc_info, "SEND"):
+            self._push(self._placeholder)
+
+    def _CLEANUP_THROW_handler(self):
+        self._pop(3)
+        self._push(self._placeholder, self._placeholder)
+
+    def _BINARY_SLICE_handler(self, exc_info):
+        items = self._pop(3)
+        if self._instruction_successfully_executed(exc_info, "BINARY_SLICE"):
+            self._push(merge_stack_items(*items))
+
+    @emit_event
+    def _STORE_SLICE_handler(self, exc_info):
+        stop, start, container, value = self._pop(4)
+        if self._instruction_successfully_executed(exc_info, "STORE_SLICE"):
+            if container.top_source:
+                return EventInfo(
+                    type=Mutation,
+                    target=container.top_source,
+                    sources=set(merge_stack_items(value, start, stop).sources),
+                    lineno=value.start_lineno,
+                )
+
+    def _LOAD_GLOBAL_handler(self, instr, frame, exc_info):
+        if self._instruction_successfully_executed(exc_info, "LOAD_GLOBAL"):
+            if instr.arg & 0x01:
+                self._push(self._null)
+            self._push(self._fetch_value_for_load_instruction(instr.argval, frame))
+
+    def _LOAD_ATTR_handler(self, instr, exc_info):
+        if self._instruction_successfully_executed(exc_info, "LOAD_ATTR"):
+            # Like LOAD_METHOD before 3.12, see its handler.
+            if instr.arg & 0x01:
+                receiver = self._pop()
+                self._push(self._method_item(instr, receiver), receiver)
+
+    def _LOAD_SUPER_ATTR_handler(self, instr, exc_info):
+        self._pop(3)  # super, class, self
+        if self._instruction_successfully_executed(exc_info, "LOAD_SUPER_ATTR"):
+            self._push(self._placeholder)
+            if instr.arg & 0x01:
+                self._push(self._placeholder)
+
+    def _LOAD_FAST_handler(self, instr, frame, exc_info):
+        items = self.comprehension_variables.get(instr.argval)
+        if items:
+            self._push(items[-1])
+        else:
+            super()._LOAD_FAST_handler(instr, frame, exc_info)
+
+    def _LOAD_FAST_CHECK_handler(self, instr, frame, exc_info):
+        self._LOAD_FAST_handler(instr, frame, exc_info)
+
+    def _LOAD_FAST_AND_CLEAR_handler(self, instr):
+        # Since 3.12, comprehensions are inlined (PEP 709). Their variables are saved
+        # before, and restored after the comprehension runs. Operations on them are
+        # not recorded, like before 3.12 when comprehensions have their own frames.
+        self._push(CustomValueStackItem(SAVED_VARIABLE))
+        self.comprehension_variables.setdefault(instr.argval, []).append(
+            self._placeholder
+        )
+
+    @emit_event
+    def _STORE_FAST_handler(self, instr):
+        name = instr.argval
+        items = self.comprehension_variables.get(name)
+        if not items:
+            return super()._STORE_FAST_handler(instr)
+
+        item = self._pop()
+        if isinstance(item, CustomValueStackItem) and item.custom_value is (
+            SAVED_VARIABLE
+        ):
+            items.pop()
+            if not items:
+                del self.comprehension_variables[name]
+        else:
+            items[-1] = item
+
+    def _LOAD_LOCALS_handler(self):
+        self._push(self._placeholder)
+
+    def _LOAD_FROM_DICT_OR_GLOBALS_handler(self, instr, frame, exc_info):
+        self._pop()
+        if self._instruction_successfully_executed(
+            exc_info, "LOAD_FROM_DICT_OR_GLOBALS"
+        ):
+            self._push(self._fetch_value_for_load_instruction(instr.argval, frame))
+
+    def _LOAD_FROM_DICT_OR_DEREF_handler(self, instr, frame, exc_info):
+        self._pop()
+        if self._instruction_successfully_executed(exc_info, "LOAD_FROM_DICT_OR_DEREF"):
+            try:
+                value = self._fetch_value_for_load_instruction(instr.argval, frame)
+            except AssertionError:
+                value = self._placeholder
+            self._push(value)
+
+    def _LIST_APPEND_handler(self, instr):
+        item = self._pop()
+        self.stack[-instr.arg] = merge_stack_items(self.stack[-instr.arg], item)
+
+    def _SET_ADD_handler(self, instr, exc_info):
+        item = self._pop()
+        if self._instruction_successfully_executed(exc_info, "SET_ADD"):
+            self.stack[-instr.arg] = merge_stack_items(self.stack[-instr.arg], item)
+
+    def _MAP_ADD_handler(self, instr, exc_info):
+        value, key = self._pop(2)
+        if self._instruction_successfully_executed(exc_info, "MAP_ADD"):
+            self.stack[-instr.arg] = merge_stack_items(
+                self.stack[-instr.arg], key, value
+            )
+
+    def _KW_NAMES_handler(self):
+        pass
+
+    @emit_event
+    def _CALL_handler(self, instr, exc_info):
+        """Handles both function and method calls.
+
+        The stack is either [NULL, callable, args...] or [method, self, args...], see
+        LOAD_GLOBAL and LOAD_ATTR. A method call is handled like CALL_METHOD before.
+        """
+        args = self._pop(instr.arg, return_list=True)
+        callable_or_self = self._pop()
+        method_or_null = self._pop()
+        if self._is_null(method_or_null):
+            if self._instruction_successfully_executed(exc_info, "CALL"):
+                self._push_arguments_or_exception(callable_or_self, args)
+            return
+
+        succeeded = self._instruction_successfully_executed(exc_info, "CALL")
+        if succeeded:
+            self._push(merge_stack_items(callable_or_self, method_or_null, *args))
+
+        # Exceptions are kept as CustomValueStackItem, which has no sources.
+        if (
+            isinstance(callable_or_self, SymbolStackItem)
+            and callable_or_self.top_source
+        ):
+            return EventInfo(
+                type=Mutation,
+                target=callable_or_self.top_source,
+                sources=set(merge_stack_items(callable_or_self, *args).sources),
+                lineno=callable_or_self.start_lineno,
+                method=getattr(method_or_null, "method", None) if succeeded else None,
+            )
+
+    def _CALL_FUNCTION_EX_handler(self, instr, exc_info):
+        kwargs = self._pop() if (instr.arg & 0x01) else SymbolStackItem(-1, [])
+        args = merge_stack_items(self._pop(), kwargs)
+        callable_obj = self._pop()
+        self._pop()  # NULL
+        if self._instruction_successfully_executed(exc_info, "CALL_FUNCTION_EX"):
+            self._push_arguments_or_exception(callable_obj, (args,))
+
+    def _CALL_INTRINSIC_1_handler(self, exc_info):
+        self._instruction_successfully_executed(exc_info, "CALL_INTRINSIC_1")
+
+    def _CALL_INTRINSIC_2_handler(self, exc_info):
+        items = self._pop(2)
+        if self._instruction_successfully_executed(exc_info, "CALL_INTRINSIC_2"):
+            self._push(merge_stack_items(*items))
+
+    def _MAKE_FUNCTION_handler(self, instr):
+        function_obj = [self._pop()]  # code_obj
+        for flag in (0x08, 0x04, 0x02, 0x01):
+            if instr.argval & flag:
+                function_obj.append(self._pop())
+        self._push(merge_stack_items(*function_obj))
+
+    @emit_event
+    def _POP_JUMP_IF_NONE_handler(self, instr, jumped):
+        self._pop()
+
+    @emit_event
+    def _POP_JUMP_IF_NOT_NONE_handler(self, instr, jumped):
+        self._pop()
+
+    @emit_event
+    def _JUMP_BACKWARD_handler(self, instr):
+        # Loops of inlined comprehensions are not recorded, see LOAD_FAST_AND_CLEAR.
+        if not self.comprehension_variables:
+            return self._return_jump_back_event_if_exists(instr)
+
+    def _JUMP_BACKWARD_NO_INTERRUPT_handler(self):
+        # Only used by `yield from` and `await`, which are not loops in the code.
+        pass
+
+    def _BEFORE_WITH_handler(self, exc_info):
+        if self._instruction_successfully_executed(exc_info, "BEFORE_WITH"):
+            # The context manager is replaced with __exit__, which is a noop in our
+            # stack. Then the return value of __enter__() is pushed.
+            self._push(self.tos)
+
+    def _WITH_EXCEPT_START_handler(self):
+        # Stack is [exit_func, lasti, prev_exc, exc].
+        self._push(self._tos(3))
+
+    def _PUSH_EXC_INFO_handler(self):
+        exc = self._pop()
+        self._push(CustomValueStackItem(None))  # The previously handled exception.
+        self._push(exc)
+
+    def _POP_EXCEPT_handler(self):
+        self._pop()
+
+    def _CHECK_EXC_MATCH_handler(self):
+        self._pop()
+        self._push(self._placeholder)
+
+    def _CHECK_EG_MATCH_handler(self, exc_info):
+        self._pop(2)
+        if self._instruction_successfully_executed(exc_info, "CHECK_EG_MATCH"):
+            self._push(CustomValueStackItem(None), CustomValueStackItem(None))
+
+    def _RERAISE_handler(self):
+        value = self._pop().custom_value
+        self.last_exception = ExceptionInfo(
+            type=type(value),
+            value=value,
+            traceback=getattr(value, "__traceback__", None),
+        )
+        self._exception_unwind()
+
+
+def get_value_stack_class() -> type[BaseValueStack]:
     version_info = basis.VERSION_INFO
     if version_info == (3, 7):
-        return Py37ValueStack()
+        return Py37ValueStack
     elif version_info == (3, 8):
-        return Py38ValueStack()
+        return Py38ValueStack
     elif version_info == (3, 9):
-        return Py39ValueStack()
+        return Py39ValueStack
     elif version_info == (3, 10):
-        return Py310ValueStack()
+        return Py310ValueStack
+    elif version_info == (3, 12):
+        return Py312ValueStack
     else:
         raise Exception(f"Unsupported Python version: {version_info}")
+
+
+def create_value_stack(code_info: CodeInfo):
+    return get_value_stack_class()(code_info)
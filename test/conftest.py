@@ -9,11 +9,20 @@ import responses
 import attr
 
 from cyberbrain import _TracerFSM, trace, Symbol
-from utils import python_version, get_os_type
+from cyberbrain import arrays, dataframes, rpc_client
+from utils import python_version, get_os_type, get_request_body
 
 
 def pytest_addoption(parser):
     parser.addoption("--debug_mode", action="store_true", default=False)
+    # Defaults to the backend of the Python version, i.e. monitoring since 3.12.
+    parser.addoption("--backend", choices=["settrace", "monitoring"], default=None)
+
+
+def pytest_configure(config):
+    backend = config.getoption("--backend")
+    if backend is not None:
+        trace.backend = backend
 
 
 @pytest.fixture(scope="function", name="tracer")
@@ -22,6 +31,8 @@ def fixture_tracer(request):
 
     yield trace
 
+    # Frames are sent in the background, don't let them reach the next test.
+    trace.rpc_client.wait_for_flush()
     # Do cleanup because the trace decorator is reused across tests.
     trace.raw_frame = None
     trace.decorated_function_code_id = None
@@ -35,6 +46,8 @@ def fixture_trace(request):
 
     yield trace
 
+    # Frames are sent in the background, don't let them reach the next test.
+    trace.rpc_client.wait_for_flush()
     # Do cleanup because the trace decorator is reused across tests.
     trace.raw_frame = None
     trace.decorated_function_code_id = None
@@ -70,11 +83,39 @@ def update_golden_data(golden_filepath: str, key: str, value: Any):
 def serialize_symbol(symbol: Symbol):
     snapshot = symbol.snapshot and {
         "location": symbol.snapshot.location,
-        "events_pointer": symbol.snapshot.events_pointer,
+        "events_pointer": dict(symbol.snapshot.events_pointer),
     }
     return {"name": symbol.name, "snapshot": snapshot}
 
 
+def serialize_value(value):
+    """Makes a value captured without JSON serializable, with buffers as hex strings."""
+    if isinstance(value, range):
+        return [value.start, value.stop, value.step]
+    if isinstance(value, arrays.ArrayValue):
+        return {
+            "dtype": value.dtype,
+            "shape": list(value.shape),
+            "data": value.data and value.data.hex(),
+            "summary": value.summary,
+        }
+    if isinstance(value, dataframes.DataFrameValue):
+        return dict(
+            attr.asdict(value, recurse=False),
+            index=serialize_value(value.index),
+            data=[serialize_value(column) for column in value.data],
+        )
+    return value
+
+
+def decode_ext(code: int, data: bytes):
+    value_class = {
+        arrays.EXT_TYPE: arrays.ArrayValue,
+        dataframes.EXT_TYPE: dataframes.DataFrameValue,
+    }[code]
+    return serialize_value(value_class.from_ext(data))
+
+
 def get_serialized_events():
     """
     Parses and serializes the current events stored in the tracer's frame.
@@ -112,6 +153,9 @@ def get_serialized_events():
     tracer_events = []
     for event in trace.events:
         event_dict = attr.asdict(event)
+        value = getattr(event, "value", None)
+        if isinstance(value, (arrays.ArrayValue, dataframes.DataFrameValue)):
+            event_dict["value"] = serialize_value(value)
         for key, val in event_dict.items():
             if type(val) == Symbol:
                 event_dict[key] = serialize_symbol(val)
@@ -141,6 +185,19 @@ def check_tracer_events():
         )
 
 
+def expand_compact_frame(data: dict[str, Any]) -> dict[str, Any]:
+    """Turns a frame sent in the compact schema into the first one, with event ids."""
+    data = rpc_client.decode_compact_frame(data)
+    ids = [event.id for event in trace.frame.events]
+    for event in data["events"]:
+        event["id"] = ids[event["id"]]
+    data["tracingResult"] = {
+        ids[index]: [ids[source] for source in sources]
+        for index, sources in data["tracingResult"].items()
+    }
+    return data
+
+
 @pytest.fixture
 def check_response(request):
     with responses.RequestsMock() as resp:
@@ -151,8 +208,13 @@ def check_response(request):
             content_type="application/octet-stream",
         )
         yield
+        trace.rpc_client.wait_for_flush()
 
-        response = msgpack.unpackb(resp.calls[0].request.body)
+        response = msgpack.unpackb(
+            get_request_body(resp.calls[0].request), ext_hook=decode_ext
+        )
+        if response.get("version") == 2:
+            response = expand_compact_frame(response)
         frame_name = response["metadata"]["frame_name"]
 
         # Don't check request body on Windows because it has a different format.
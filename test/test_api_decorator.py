@@ -9,3 +9,18 @@ def test_decorator_api(trace, check_golden_file):
         return a + b
 
     assert decorated_func() == 2
+
+
+def test_callee_not_traced(trace, check_golden_file):
+    import sys
+    from types import FunctionType, MethodType
+
+    def has_python_trace_function():
+        return isinstance(sys.gettrace(), (FunctionType, MethodType))
+
+    @trace
+    def call_untraced():
+        return has_python_trace_function()
+
+    # Functions called by the traced function don't call any Python-level tracer.
+    assert call_untraced() is False
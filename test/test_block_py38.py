@@ -28,8 +28,8 @@ def test_continue_in_finally(tracer, check_golden_file):
 
     assert tracer.loops == [
         Loop(
-            start_offset=16,
-            end_offset=get_value({"py38": 32, "default": 24}),
+            start_offset=get_value({"default": 16, "py312": 56}),
+            end_offset=get_value({"py38": 32, "default": 24, "py312": 66}),
             start_lineno=21,
             end_lineno=25,
         )
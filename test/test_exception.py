@@ -195,7 +195,7 @@ def test_for_iter_error(trace, check_golden_file):
 def test_setup_with_error(trace, check_golden_file):
     @trace
     def setup_with_error():
-        with pytest.raises(AttributeError):
+        with pytest.raises((AttributeError, TypeError)):  # TypeError since 3.11
             with 1:  # SETUP_WITH
                 pass
 
@@ -0,0 +1,26 @@
+import os
+import sys
+
+from cyberbrain import set_file_filters, utils
+
+
+def test_file_filters():
+    frame = sys._getframe()
+    # Called from pytest, which is an installed package.
+    pytest_frame = frame.f_back
+    assert not utils.should_exclude(frame)
+    assert utils.should_exclude(pytest_frame)
+
+    try:
+        set_file_filters(exclude=["*" + os.path.basename(__file__)])
+        assert utils.should_exclude(frame)
+
+        # Included files are traced even if they're excluded otherwise.
+        set_file_filters(include=[__file__, "*pytest*"], exclude=["*.py"])
+        assert not utils.should_exclude(frame)
+        assert not utils.should_exclude(pytest_frame)
+    finally:
+        set_file_filters()
+
+    assert not utils.should_exclude(frame)
+    assert utils.should_exclude(pytest_frame)
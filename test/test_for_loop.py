@@ -38,33 +38,51 @@ def test_for_loop(tracer, check_golden_file):
 
     assert tracer.loops == [
         Loop(
-            start_offset=get_value({"default": 16, "py37": 18}),
-            end_offset=get_value({"default": 24, "py37": 26}),
+            start_offset=get_value({"default": 16, "py37": 18, "py312": 56}),
+            end_offset=get_value({"default": 24, "py37": 26, "py312": 66}),
             start_lineno=8,
             end_lineno=9,
         ),
         Loop(
-            start_offset=get_value({"default": 56, "py37": 64, "py310": 48}),
-            end_offset=get_value({"default": 60, "py37": 68, "py310": 52}),
+            start_offset=get_value(
+                {"default": 56, "py37": 64, "py310": 48, "py312": 126}
+            ),
+            end_offset=get_value(
+                {"default": 60, "py37": 68, "py310": 52, "py312": 132}
+            ),
             start_lineno=15,
             end_lineno=16,
         ),
         Loop(
-            start_offset=get_value({"default": 76, "py37": 88, "py310": 62}),
-            end_offset=get_value({"default": 88, "py37": 100, "py310": 76}),
+            start_offset=get_value(
+                {"default": 76, "py37": 88, "py310": 62, "py312": 158}
+            ),
+            end_offset=get_value(
+                {"default": 88, "py37": 100, "py310": 76, "py312": 176}
+            ),
             start_lineno=19,
             end_lineno=21,
         ),
         Loop(
-            start_offset=get_value({"default": 100, "py37": 116, "py310": 86}),
-            end_offset=get_value({"default": 110, "py37": 126, "py310": 102}),
+            start_offset=get_value(
+                {"default": 100, "py37": 116, "py310": 86, "py312": 202}
+            ),
+            end_offset=get_value(
+                {"default": 110, "py37": 126, "py310": 102, "py312": 218}
+            ),
             start_lineno=23,
             # TODO: Correct lineno is 25, see if we can fix this for older versions.
-            end_lineno=get_value({"default": 25, "py37": 24, "py38": 24, "py39": 24}),
+            end_lineno=get_value(
+                {"default": 25, "py37": 24, "py38": 24, "py39": 24, "py312": 24}
+            ),
         ),
         Loop(
-            start_offset=get_value({"default": 148, "py37": 168, "py310": 132}),
-            end_offset=get_value({"default": 152, "py37": 172, "py310": 136}),
+            start_offset=get_value(
+                {"default": 148, "py37": 168, "py310": 132, "py312": 286}
+            ),
+            end_offset=get_value(
+                {"default": 152, "py37": 172, "py310": 136, "py312": 292}
+            ),
             start_lineno=32,
             end_lineno=33,
         ),
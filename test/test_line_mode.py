@@ -0,0 +1,33 @@
+import pytest
+
+
+def test_line_mode(tracer, check_golden_file):
+    a = 1
+    lst = [1]
+    d = {"k": 1}
+
+    tracer.start(mode="line")
+
+    b = a + 1
+    lst.append(b)  # Mutation
+    d["k"] = b  # Mutation
+    for i in range(2):
+        a += i  # Binding, JumpBackToLoopStart
+    del b  # Deletion
+
+    tracer.stop()
+
+
+def test_line_mode_decorator(trace, check_golden_file):
+    @trace(mode="line")
+    def line_mode_func(x):
+        y = [x]
+        y.append(x * 2)
+        return y
+
+    assert line_mode_func(1) == [1, 2]
+
+
+def test_unknown_mode(tracer):
+    with pytest.raises(ValueError):
+        tracer.start(mode="instruction")
@@ -0,0 +1,83 @@
+from cyberbrain import memo
+
+
+def test_memo(tracer, check_golden_file):
+    tracer.start()
+
+    table = tuple(range(40))
+    for _ in range(3):
+        row = table
+
+    tracer.stop()
+
+    value_memo = tracer.frame.value_memo
+    # The JSON of table, for every binding of row. Its repr is short, so not cached.
+    assert value_memo.hits == 3
+    assert value_memo.misses == 1
+
+
+def test_value_memo():
+    value_memo = memo.ValueMemo(max_entries=2)
+    big_tuple = tuple(range(100))
+    encode = lambda value: str(value)
+
+    assert value_memo.get(big_tuple, "json", encode) == encode(big_tuple)
+    assert value_memo.get(big_tuple, "json", encode) == encode(big_tuple)
+    assert (value_memo.hits, value_memo.misses) == (1, 1)
+    assert value_memo.hit_rate == 0.5
+
+    # Mutable values are neither cached nor counted, even if they contain only
+    # immutable values. Neither are small values.
+    big_list = list(big_tuple)
+    value_memo.get(big_list, "json", encode)
+    value_memo.get(big_list, "json", encode)
+    value_memo.get(1, "json", encode)
+    assert (value_memo.hits, value_memo.misses) == (1, 1)
+    assert len(value_memo) == 1
+
+    # A tuple is only immutable if its items are.
+    value_memo.get((big_list,), "json", encode)
+    assert len(value_memo) == 1
+
+    # Least recently used entries are evicted first.
+    value_memo.get(big_tuple, "repr", repr)
+    value_memo.get(big_tuple, "json", encode)
+    value_memo.get("x" * 100, "repr", repr)
+    assert len(value_memo) == 2
+    value_memo.get(big_tuple, "repr", repr)
+    assert (value_memo.hits, value_memo.misses) == (2, 4)
+
+
+def test_value_memo_size():
+    value_memo = memo.ValueMemo(max_bytes=250)
+    for i in range(3):
+        value_memo.get(str(i) * 100, "repr", repr)
+    assert len(value_memo) == 2
+    assert value_memo.num_bytes == 204
+
+    # Texts larger than the memo aren't cached.
+    value_memo.get("x" * 300, "repr", repr)
+    assert len(value_memo) == 2
+
+    # Entries keep their values alive, so their ids can't be reused by other objects.
+    value_memo.clear()
+    value_memo.get("y" * 100, "repr", repr)
+    ((value, _),) = value_memo._entries.values()
+    assert value == "y" * 100
+
+
+def test_interned_texts(tracer):
+    tracer.start()
+
+    for i in range(3):
+        x = 0
+        y = [i % 2]
+
+    tracer.stop()
+
+    # Equal texts are stored once, even if they're encoded again for every event.
+    values = {}
+    for event in tracer.events:
+        if hasattr(event, "value"):
+            assert values.setdefault(event.value, event.value) is event.value
+            assert values.setdefault(event.repr, event.repr) is event.repr
@@ -0,0 +1,39 @@
+import sys
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(sys, "monitoring"), reason="sys.monitoring is new in Python 3.12"
+)
+
+
+def test_other_tools_keep_disabled_locations(tracer):
+    monitoring = sys.monitoring
+    tool_id = next(i for i in range(6) if monitoring.get_tool(i) is None)
+    lines = []
+
+    def on_line(code, lineno):
+        lines.append(lineno)
+        return monitoring.DISABLE
+
+    def f():
+        return 1
+
+    monitoring.use_tool_id(tool_id, "other tool")
+    try:
+        monitoring.register_callback(tool_id, monitoring.events.LINE, on_line)
+        monitoring.set_local_events(tool_id, f.__code__, monitoring.events.LINE)
+        f()
+
+        tracer.start()
+        x = 1
+        tracer.stop()
+
+        # Stopping the tracer doesn't re-enable locations disabled by other tools.
+        f()
+    finally:
+        monitoring.set_local_events(tool_id, f.__code__, 0)
+        monitoring.register_callback(tool_id, monitoring.events.LINE, None)
+        monitoring.free_tool_id(tool_id)
+
+    assert len(lines) == 1
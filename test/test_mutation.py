@@ -1,4 +1,4 @@
-from cyberbrain import InitialValue, Binding, Symbol
+from cyberbrain import InitialValue, Binding, Symbol, purity, register_pure_methods
 
 
 def test_mutation(tracer, check_golden_file):
@@ -9,3 +9,121 @@ def test_mutation(tracer, check_golden_file):
     lower_text = text.lower()  # Test this line does not emit a mutation of `text`.
 
     tracer.stop()
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def increment(self):
+        self.count += 1
+
+    def get(self):
+        return self.count
+
+
+def test_method_effects(tracer, check_golden_file):
+    register_pure_methods(Counter, "get")
+    numbers = [2, 1]
+    mapping = {"a": 1}
+    counter = Counter()
+    counters = [counter]
+
+    tracer.start()
+
+    numbers.sort()  # Mutating, the value is serialized once.
+    numbers.sort()  # Mutating, reported even if the value is unchanged.
+    numbers.count(1)  # Pure, the value is never serialized.
+    mapping.get("a")  # Pure.
+    mapping.update({"b": 2})  # Mutating.
+    counter.increment()  # Unknown, the value is compared.
+    counter.get()  # Pure, registered above.
+    counters[0].increment()  # The receiver is not an identifier, unknown.
+
+    tracer.stop()
+
+
+def test_purity_registry():
+    class MyList(list):
+        def sort(self, *args, **kwargs):
+            pass
+
+    assert purity.method_effect([], "append") is purity.Effect.MUTATING
+    assert purity.method_effect({}, "get") is purity.Effect.PURE
+    # Inherited methods have the effect of the class defining them.
+    assert purity.method_effect(MyList(), "append") is purity.Effect.MUTATING
+    assert purity.method_effect(MyList(), "sort") is purity.Effect.UNKNOWN
+
+    assert purity.is_immutable((1, "a", (None, b"b")))
+    assert not purity.is_immutable((1, []))
+    assert not purity.is_immutable(MyList())
+
+
+def test_mutation_deltas(tracer, check_golden_file):
+    from cyberbrain import Mutation, delta
+
+    numbers = []
+    mapping = {"a": 1}
+
+    tracer.start(keyframe_interval=3)
+
+    for i in range(4):
+        numbers.append(i)
+    numbers.insert(0, -1)
+    numbers.remove(1)
+    mapping.update({"b": 2})
+    mapping.pop("a")
+
+    tracer.stop()
+
+    values = [
+        tracer.frame.value_of(event)
+        for event in tracer.events
+        if isinstance(event, (InitialValue, Binding, Mutation))
+        and event.target.name in {"numbers", "mapping"}
+    ]
+    assert values == [
+        [],
+        [0],
+        [0, 1],
+        [0, 1, 2],
+        [0, 1, 2, 3],
+        [-1, 0, 1, 2, 3],
+        [-1, 0, 2, 3],
+        {"a": 1},
+        {"a": 1, "b": 2},
+        {"b": 2},
+    ]
+    deltas = [
+        event.value
+        for event in tracer.events
+        if isinstance(event, Mutation) and isinstance(event.value, delta.ValueDelta)
+    ]
+    assert len(deltas) == 6
+
+
+def test_delta_diff():
+    from cyberbrain import delta
+
+    assert delta.diff("[1,2]", "[1,2,[3]]") == [["append", "[[3]]"]]
+    assert delta.diff("[1,2,3]", "[1,3]") == [["delitem", 1]]
+    assert delta.diff("[1,2,3]", "[1,true,3]") == [["setitem", 1, "true"]]
+    assert delta.diff('{"a":1,"b":2}', '{"a":1,"b":2.0}') == [["setitem", "b", "2.0"]]
+    # The order of keys would change.
+    assert delta.diff('{"a":1,"b":2}', '{"b":2,"a":1}') is None
+    assert delta.diff("[1,2]", "[3,4]") is None
+    assert delta.diff("1", "2") is None
+
+
+# After the tests with goldens, so that adding assertions doesn't change their lines.
+def test_purity_registry_numpy_pandas():
+    import numpy as np
+    import pandas as pd
+
+    # Methods defined on base classes of DataFrame and Series are registered there.
+    frame = pd.DataFrame({"x": [1, 2]})
+    assert purity.method_effect(frame, "head") is purity.Effect.PURE
+    assert purity.method_effect(frame, "to_numpy") is purity.Effect.PURE
+    assert purity.method_effect(frame["x"], "to_numpy") is purity.Effect.PURE
+    assert purity.method_effect(frame["x"], "nunique") is purity.Effect.PURE
+    assert purity.method_effect(np.zeros(2), "sum") is purity.Effect.PURE
@@ -13,14 +13,14 @@ def test_nested_loop(tracer, check_golden_file):
 
     assert tracer.loops == [
         Loop(
-            start_offset=get_value({"default": 28, "py37": 32}),
-            end_offset=get_value({"default": 40, "py37": 44}),
+            start_offset=get_value({"default": 28, "py37": 32, "py312": 84}),
+            end_offset=get_value({"default": 40, "py37": 44, "py312": 100}),
             start_lineno=9,
             end_lineno=10,
         ),
         Loop(
-            start_offset=get_value({"default": 16, "py37": 18}),
-            end_offset=get_value({"default": 42, "py37": 48}),
+            start_offset=get_value({"default": 16, "py37": 18, "py312": 56}),
+            end_offset=get_value({"default": 42, "py37": 48, "py312": 104}),
             start_lineno=8,
             end_lineno=10,
         ),
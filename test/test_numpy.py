@@ -1,6 +1,6 @@
 import numpy as np
 
-from cyberbrain import Binding, Symbol  # noqa
+from cyberbrain import Binding, EncodingLimits, Symbol  # noqa
 
 
 def test_numpy(tracer, check_golden_file):
@@ -15,3 +15,43 @@ def test_numpy(tracer, check_golden_file):
 
 # Add more tests
 # https://numpy.org/devdocs/user/quickstart.html
+
+
+def test_numpy_binary_capture(tracer, check_golden_file):
+    tracer.start(limits=EncodingLimits(max_value_bytes=40))
+
+    floats = np.array([[0.5, 1.5], [2.5, 3.5]])
+    columns = floats[:, 0]  # Not contiguous.
+    flags = np.array([True, False])
+    large = np.arange(6, dtype=np.int64)  # Summarized.
+    strings = np.array(["a", "b"])  # Encoded by jsonpickle.
+    floats[1, 1] = 0.0
+
+    tracer.stop()
+
+    values = {
+        event.target.name: tracer.frame.value_of(event) for event in tracer.events
+    }
+    for name in ("floats", "columns", "flags"):
+        captured = values[name]
+        array = np.frombuffer(captured.data, dtype=captured.dtype)
+        assert (array.reshape(captured.shape) == locals()[name]).all()
+    assert values["large"].data is None
+    assert values["large"].summary == {
+        "head": [0, 1, 2, 3, 4],
+        "tail": [1, 2, 3, 4, 5],
+        "min": 0,
+        "max": 5,
+        "mean": 2.5,
+    }
+    assert values["strings"]["values"] == ["a", "b"]
+
+
+def test_numpy_big_endian():
+    # Not in a golden test, since the repr of big-endian arrays depends on Numpy.
+    from cyberbrain import arrays
+
+    captured = arrays.capture(np.array([1, 2], dtype=">i4"), max_bytes=100)
+    assert captured.dtype == "<i4"
+    assert captured.shape == (2,)
+    assert np.frombuffer(captured.data, dtype=captured.dtype).tolist() == [1, 2]
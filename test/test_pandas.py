@@ -1,6 +1,7 @@
 import pandas as pd
 
-from cyberbrain import Binding, Symbol  # noqa
+from cyberbrain import Binding, EncodingLimits, Symbol  # noqa
+from cyberbrain.dataframes import DataFrameValue
 
 
 def test_pandas(tracer, check_golden_file):
@@ -21,3 +22,41 @@ def test_pandas(tracer, check_golden_file):
 
 
 # Follow https://bitbucket.org/hrojas/learn-pandas/src/master/ to add more tests.
+
+
+def test_pandas_columnar_capture(tracer, check_golden_file):
+    tracer.start(limits=EncodingLimits(max_value_bytes=100))
+
+    series = pd.Series([0.5, 1.5], index=["a", "b"], name="prices")
+    dates = pd.DataFrame({"day": pd.to_datetime(["2021-01-01"]), "open": [True]})
+    large = pd.DataFrame({"x": range(100), "y": range(100)})  # Sampled.
+    series["a"] = 2.5
+
+    tracer.stop()
+
+    values = {
+        event.target.name: tracer.frame.value_of(event) for event in tracer.events
+    }
+    assert values["series"].is_series
+    assert values["series"].index == ["a", "b"]
+    assert values["dates"].data[0][0].startswith("2021-01-01T00:00:00")
+    assert values["large"].num_rows == 100
+    assert values["large"].step == 17
+    assert values["large"].index == range(0, 100, 17)
+    for value in values.values():
+        assert DataFrameValue.from_ext(value.to_ext().data) == value
+
+
+def test_pandas_string_columns():
+    from cyberbrain import dataframes
+
+    names = pd.DataFrame({"name": ["x" * 200] * 20_000, "id": range(20_000)})
+
+    # Sampled by the packed size of strings, not the size of pointers to them.
+    value = dataframes.capture(names, max_bytes=100_000)
+    assert value.step == 43
+    assert value.size <= 100_000
+    assert len(value.to_ext().data) <= 100_000 + 1000
+
+    # Rows larger than the budget can't be captured.
+    assert dataframes.capture(names, max_bytes=100) is None
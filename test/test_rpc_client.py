@@ -0,0 +1,99 @@
+import msgpack
+import portpicker
+import responses
+
+from cyberbrain import rpc_client
+from utils import get_request_body
+
+
+def test_background_sender(tracer):
+    url = f"http://localhost:{tracer.rpc_client.port}/frame"
+    with responses.RequestsMock() as resp:
+        resp.add(responses.POST, url, status=200)
+
+        tracer.start()
+        x = 1
+        tracer.stop()
+
+        assert tracer.rpc_client.wait_for_flush(timeout=5)
+        assert len(resp.calls) == 1
+        body = msgpack.unpackb(get_request_body(resp.calls[0].request))
+        assert body["metadata"]["frame_name"] == "test_background_sender"
+
+
+def test_sender_survives_connection_errors(tracer, capsys):
+    tracer.start()
+    x = 1
+    tracer.stop()
+    tracer.rpc_client.wait_for_flush()
+    capsys.readouterr()
+
+    # Nothing listens on this port.
+    client = rpc_client.RpcClient(rpc_server_port=portpicker.pick_unused_port())
+    client.send_frame(tracer.frame)
+    client.send_frame(tracer.frame)
+    assert client.wait_for_flush(timeout=5)
+    assert capsys.readouterr().out.count("Can't connect to RPC server") == 2
+
+
+def test_compact_schema(tracer):
+    tracer.start(keyframe_interval=3)
+    squares = []
+    for i in range(4):
+        squares.append(i * i)
+    del i
+    tracer.stop()
+
+    frame = tracer.frame
+    compact = msgpack.unpackb(rpc_client.encode_frame(frame, version=2))
+    assert compact["version"] == 2
+    assert len(compact["strings"]) < len(frame.events)
+    # Equal values and reprs are sent once.
+    assert len(compact["texts"]) < len(frame.events)
+
+    expected = rpc_client._frame_data(frame)
+    ids = [event.id for event in frame.events]
+    decoded = rpc_client.decode_compact_frame(compact)
+    for event in decoded["events"]:
+        event["id"] = ids[event["id"]]
+    decoded["tracingResult"] = {
+        ids[index]: [ids[source] for source in sources]
+        for index, sources in decoded["tracingResult"].items()
+    }
+    assert decoded == expected
+
+
+def test_compression_negotiation(tracer):
+    tracer.start()
+    squares = [i * i for i in range(500)]
+    tracer.stop()
+    tracer.rpc_client.wait_for_flush()
+
+    client = rpc_client.RpcClient(rpc_server_port=portpicker.pick_unused_port())
+    url = f"http://localhost:{client.port}/frame"
+    body = rpc_client.encode_frame(tracer.frame)
+    assert len(body) >= rpc_client.MIN_COMPRESSED_SIZE
+
+    with responses.RequestsMock() as resp:
+        resp.add(responses.POST, url, status=200)
+        client.send_frame(tracer.frame)
+        assert client.wait_for_flush(timeout=5)
+        (call,) = resp.calls
+        assert call.request.headers["Content-Encoding"] == "deflate"
+        assert len(call.request.body) < len(body)
+        assert get_request_body(call.request) == body
+
+    # A server rejecting deflate gets the body again, then only uncompressed bodies.
+    with responses.RequestsMock() as resp:
+        resp.add(
+            responses.POST, url, status=415, headers={"Accept-Encoding": "identity"}
+        )
+        resp.add(responses.POST, url, status=200)
+        resp.add(responses.POST, url, status=200)
+        client.send_frame(tracer.frame)
+        client.send_frame(tracer.frame)
+        assert client.wait_for_flush(timeout=5)
+        assert [
+            call.request.headers.get("Content-Encoding") for call in resp.calls
+        ] == ["deflate", None, None]
+        assert all(call.request.body == body for call in resp.calls[1:])
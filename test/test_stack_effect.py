@@ -0,0 +1,23 @@
+from cyberbrain.code_info import get_code_info
+
+
+def test_combined_stack_effect(tracer, check_golden_file):
+    a = 1
+    lst = [2, 3]
+
+    tracer.start()
+
+    # Pure stack operations between loads and stores are handled as runs.
+    x = (a, -a, lst[0] * 2, {a: "b", "c": lst}, 4, None)
+    x = [a, (1, 2)][a:] + [lst[a] < 3 == a]
+    x = f"{a} {lst}"
+    try:
+        # Raises an exception in the middle of a run.
+        x = (a, 1, 2 + "3", 4)
+    except TypeError:
+        pass
+
+    tracer.stop()
+
+    code_info = get_code_info(test_combined_stack_effect.__code__)
+    assert any(code_info.stack_effects)
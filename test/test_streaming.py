@@ -0,0 +1,48 @@
+import msgpack
+import responses
+
+from cyberbrain import Binding, StreamingOptions, rpc_client
+from utils import get_request_body
+
+
+def test_streaming(tracer):
+    url = f"http://localhost:{tracer.rpc_client.port}/frame/chunk"
+    with responses.RequestsMock() as resp:
+        resp.add(responses.POST, url, status=200)
+
+        tracer.start(streaming=StreamingOptions(max_events=3, interval=60))
+        total = 0
+        for i in range(4):
+            total += i
+        tracer.stop()
+
+        tracer.rpc_client.wait_for_flush()
+        chunks = [
+            msgpack.unpackb(get_request_body(call.request)) for call in resp.calls
+        ]
+
+    frame = tracer.frame
+    assert [chunk["sequence"] for chunk in chunks] == list(range(len(chunks)))
+    assert [chunk["final"] for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+    assert all(len(chunk["events"]) <= 3 for chunk in chunks[:-1])
+    assert chunks[-1]["loops"] == rpc_client._loops(frame)
+
+    # Chunks add up to the whole frame.
+    events = [event for chunk in chunks for event in chunk["events"]]
+    assert [event["id"] for event in events] == [event.id for event in frame.events]
+    values = [event["value"] for event in events if event.get("target") == "total"]
+    assert values == ["0", "0", "1", "3", "6"]
+    assert [
+        identifier for chunk in chunks for identifier in chunk["identifiers"]
+    ] == list(frame.identifier_to_events)
+    tracing_result = {}
+    for chunk in chunks:
+        tracing_result.update(chunk["tracingResult"])
+    assert tracing_result == rpc_client._tracing_result(frame.events, frame)
+
+    # Sent events drop their values, except the latest one of each identifier.
+    bindings = [event for event in frame.events if isinstance(event, Binding)]
+    values = [event.value for event in bindings if event.target.name == "total"]
+    assert values == [None, None, None, None, "6"]
+    # Nor are the texts of sent events interned.
+    assert not frame._interned_texts
@@ -0,0 +1,50 @@
+import io
+import sqlite3
+
+from cyberbrain import register_summarizer, summarizers
+
+
+class Model:
+    def __init__(self, num_weights):
+        self.weights = [0.0] * num_weights
+
+
+class Classifier(Model):
+    pass
+
+
+register_summarizer(Model, lambda model: {"parameters": len(model.weights)})
+
+
+def test_summarizers(tracer, check_golden_file):
+    connection = sqlite3.connect(":memory:")
+
+    tracer.start()
+
+    model = Classifier(1000)  # Subclasses are summarized too.
+    cursor = connection.execute("SELECT 1 AS one, 2 AS two")
+    buffer = io.BytesIO(b"content")
+
+    tracer.stop()
+
+
+def test_summarizer_registry():
+    class Config:
+        pass
+
+    class DerivedConfig(Config):
+        pass
+
+    register_summarizer(Config, lambda config: {}, cost_hint=100)
+    # Only summarized when the full value costs more than the budget.
+    assert summarizers.summarize(Config(), max_bytes=1000) is None
+    assert summarizers.summarize(DerivedConfig(), max_bytes=10) == {
+        "type": "test_summarizers.test_summarizer_registry.<locals>.DerivedConfig",
+        "summary": {},
+    }
+    assert summarizers._summarizer_cache[DerivedConfig].cost_hint == 100
+
+    # Registering again clears the cache, and a failing summarizer is ignored.
+    register_summarizer(DerivedConfig, lambda config: 1 / 0)
+    assert DerivedConfig not in summarizers._summarizer_cache
+    assert summarizers.summarize(DerivedConfig(), max_bytes=10) is None
@@ -10,3 +10,70 @@ def test_repr(tracer, check_golden_file):
     match = re.match("foo", "foobar")
     a = A()
     tracer.stop()
+
+
+def test_builtin_fast_path():
+    from collections import OrderedDict
+
+    import jsonpickle
+
+    from cyberbrain import utils
+
+    # Keys jsonpickle drops, non-string keys, and shared or cyclic references.
+    shared = [1.5, "a/b"]
+    cyclic = [1]
+    cyclic.append(cyclic)
+    values = [
+        None,
+        True,
+        2**70,
+        float("nan"),
+        'é\n"',
+        (1, [2, {3}]),
+        {"a": shared, "b": shared, 1: None, None: 2, True: 3, (1, 2): 4},
+        {"py/object": 1, "py/x": 2},
+        OrderedDict(a=1),
+        frozenset([1]),
+        b"bytes",
+        cyclic,
+    ]
+    for value in values:
+        try:
+            expected = jsonpickle.encode(value, unpicklable=False)
+        except Exception:
+            expected = None
+        if expected is None or expected == "null" and value is not None:
+            expected = '{"repr": "%s"}' % utils.get_repr(value)
+        assert utils.to_json(value) == expected
+
+
+def test_partial_encoding():
+    from cyberbrain import utils
+
+    # Containers keep their first items, followed by the number of omitted items.
+    assert utils.to_json(list(range(100)), 60, 20) == (
+        '[0,1,2,3,4,5,6,7,8,9,10,11,12,13,14,{"...":85}]'
+    )
+    assert utils.to_json({"a": 1, "b": "x" * 100}, 40, 20) == '{"a":1,"...":1}'
+    # Values nested too deep, and other values that don't fit, become their repr.
+    assert utils.to_json([[[1]]], 100, 2) == '[[{"repr":"[1]"}]]'
+    assert utils.to_json("x" * 100, 40, 20).startswith('{"repr":"')
+    # Values that fit are encoded as without limits.
+    value = {"a": [1, "b"], "c": None}
+    assert utils.to_json(value, 100, 20) == utils.to_json(value)
+
+
+def test_encoding_limits(tracer, check_golden_file):
+    from cyberbrain import EncodingLimits
+
+    small = list(range(10))
+    large = list(range(1000))
+
+    tracer.start(limits=EncodingLimits(max_value_bytes=50, max_trace_bytes=120))
+
+    large.append(small)
+    small.append(large)
+
+    tracer.stop()
+
+    assert all(len(event.value) <= 50 for event in tracer.events)
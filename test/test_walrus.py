@@ -32,5 +32,9 @@ def test_walrus_in_while(trace, check_golden_file):
                 value="2",
                 sources={Symbol("i")},
             ),
-            JumpBackToLoopStart(lineno=10, index=4, jump_target=20),
+            JumpBackToLoopStart(
+                lineno=10,
+                index=4,
+                jump_target=20 if sys.version_info < (3, 12) else 26,
+            ),
         ]
@@ -45,20 +45,30 @@ def test_while_loop(tracer, check_golden_file):
 
     assert tracer.loops == [
         Loop(
-            start_offset=get_value({"default": 12, "py37": 14, "py310": 20}),
-            end_offset=get_value({"default": 32, "py37": 34, "py310": 38}),
-            start_lineno=get_value({"default": 9, "py310": 10}),
+            start_offset=get_value(
+                {"default": 12, "py37": 14, "py310": 20, "py312": 48}
+            ),
+            end_offset=get_value({"default": 32, "py37": 34, "py310": 38, "py312": 72}),
+            start_lineno=get_value({"default": 9, "py310": 10, "py312": 10}),
             end_lineno=11,
         ),
         Loop(
-            start_offset=get_value({"default": 54, "py37": 64, "py310": 58}),
-            end_offset=get_value({"default": 70, "py37": 80, "py310": 74}),
+            start_offset=get_value(
+                {"default": 54, "py37": 64, "py310": 58, "py312": 94}
+            ),
+            end_offset=get_value(
+                {"default": 70, "py37": 80, "py310": 74, "py312": 114}
+            ),
             start_lineno=18,
             end_lineno=20,
         ),
         Loop(
-            start_offset=get_value({"default": 78, "py37": 92, "py310": 80}),
-            end_offset=get_value({"default": 102, "py37": 116, "py310": 104}),
+            start_offset=get_value(
+                {"default": 78, "py37": 92, "py310": 80, "py312": 120}
+            ),
+            end_offset=get_value(
+                {"default": 102, "py37": 116, "py310": 104, "py312": 150}
+            ),
             start_lineno=23,
             end_lineno=26,
         ),
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import detect
 import sys
+import zlib
 from functools import lru_cache
 
 
@@ -16,9 +17,13 @@ def get_os_type() -> str:
     return "other"
 
 
-python_version = {(3, 7): "py37", (3, 8): "py38", (3, 9): "py39", (3, 10): "py310"}[
-    sys.version_info[:2]
-]
+python_version = {
+    (3, 7): "py37",
+    (3, 8): "py38",
+    (3, 9): "py39",
+    (3, 10): "py310",
+    (3, 12): "py312",
+}[sys.version_info[:2]]
 os_type = get_os_type()
 
 
@@ -35,3 +40,10 @@ def get_value(value_dict: dict[str, any]):
         return value_dict[os_type]
     else:
         return value_dict["default"]
+
+
+def get_request_body(request) -> bytes:
+    """Returns the body of a request sent by RpcClient, decompressed if needed."""
+    if request.headers.get("Content-Encoding") == "deflate":
+        return zlib.decompress(request.body)
+    return request.body